@@ -0,0 +1 @@
+""" Benchmarks for measuring the performance of the core parts of the project on synthetic vaults. See run_benchmarks.py. """
@@ -0,0 +1,122 @@
+""" Generates synthetic Obsidian vaults (and a matching BetterBibTex .bib file) of a configurable size and shape, for benchmarking.
+
+Example usage:
+    python -m benchmarks.generate_vault PATH/TO/EMPTY/FOLDER --notes 5000 --article-ratio 0.3
+"""
+import os
+import random
+import argparse
+from dataclasses import dataclass, field
+
+WORDS = ("neural", "cortex", "signal", "model", "memory", "learning", "network", "dynamics", "theory", "data",
+         "analysis", "brain", "response", "method", "structure", "effect", "system", "behaviour", "control", "study")
+
+@dataclass
+class VaultSpec:
+    """ Dataclass describing the shape of a synthetic vault. """
+    notes: int = 1000  # number of notes in the vault (articles and other notes)
+    article_ratio: float = 0.3  # fraction of notes which are articles (tagged with an article tag and a citation key)
+    extra_properties: int = 4  # number of scalar properties per note, on top of title, tags and citation key
+    tags_per_note: int = 3  # number of tags in each note's 'tags' list property
+    links_per_note: int = 5  # number of [[links]] to other notes in each note's body
+    body_lines: int = 40  # number of lines of body text per note
+    bib_entries: int = 0  # number of entries in the .bib file. Defaults to the number of articles if smaller
+    excluded_files: int = 0  # number of (ignored) notes to put in an excluded templates folder
+    seed: int = 0
+
+@dataclass
+class GeneratedVault:
+    """ Dataclass describing a vault generated by generate_vault. """
+    vault_path: str
+    bibtex_location: str
+    excluded_folder: str
+    note_names: list[str] = field(default_factory=list)
+    article_names: list[str] = field(default_factory=list)
+    citation_keys: list[str] = field(default_factory=list)
+
+def generate_vault(vault_path: str, spec: VaultSpec = VaultSpec()) -> GeneratedVault:
+    """
+    Writes a synthetic vault to a folder, along with a 'library.bib' file in the root of the vault.
+    The same spec (including the seed) always generates the same vault.
+
+    Args:
+        vault_path (str): The folder to write the vault to. Created if it does not exist.
+        spec (VaultSpec): The size and shape of the vault.
+
+    Returns:
+        GeneratedVault: The paths and names of what was generated.
+    """
+    rng = random.Random(spec.seed)
+    os.makedirs(vault_path, exist_ok=True)
+
+    n_articles = round(spec.notes * spec.article_ratio)
+    n_entries = max(spec.bib_entries, n_articles)
+    generated = GeneratedVault(vault_path, os.path.join(vault_path, 'library.bib'), 'Templates')
+    generated.citation_keys = [f"author{idx}{2000 + idx % 25}{WORDS[idx % len(WORDS)]}" for idx in range(n_entries)]
+    generated.note_names = [f"Note {idx} {WORDS[idx % len(WORDS)]}" for idx in range(spec.notes)]
+    generated.article_names = generated.note_names[:n_articles]
+
+    # Spread notes across a few folders, as in a real vault
+    folders = ['Articles', 'Notes', os.path.join('Notes', 'Projects'), 'Journal']
+    for folder in folders + [generated.excluded_folder]: os.makedirs(os.path.join(vault_path, folder), exist_ok=True)
+
+    for idx, note_name in enumerate(generated.note_names):
+        is_article = idx < n_articles
+        folder = folders[0] if is_article else folders[1 + idx % (len(folders) - 1)]
+        citation_key = generated.citation_keys[idx] if is_article else None
+        with open(os.path.join(vault_path, folder, f"{note_name}.md"), 'w', encoding='utf-8') as file:
+            file.write(_note_text(rng, spec, generated.note_names, note_name, citation_key))
+
+    for idx in range(spec.excluded_files):
+        with open(os.path.join(vault_path, generated.excluded_folder, f"Template {idx}.md"), 'w', encoding='utf-8') as file:
+            file.write(_note_text(rng, spec, generated.note_names, f"Template {idx}", None))
+
+    with open(generated.bibtex_location, 'w', encoding='utf-8') as file:
+        for idx, citation_key in enumerate(generated.citation_keys): file.write(_bib_entry_text(rng, idx, citation_key))
+
+    return generated
+
+def _words(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+def _note_text(rng: random.Random, spec: VaultSpec, note_names: list[str], note_name: str, citation_key: str | None) -> str:
+    """ Builds the full text of a single note. """
+    lines = ['---', f"title: {note_name}"]
+    if citation_key is not None: lines.append(f"citation key: {citation_key}")
+    for idx in range(spec.extra_properties): lines.append(f"property {idx}: {_words(rng, 3)}")
+    lines.append('tags:')
+    if citation_key is not None: lines.append('  - document/article')
+    for _ in range(spec.tags_per_note): lines.append(f"  - topic/{rng.choice(WORDS)}")
+    lines.append('---')
+
+    # Body text, with links scattered through it using the different link forms handled by the renamer
+    link_forms = ("[[{}]]", "[[{}#Heading]]", "[[{}|alias]]", "[[{}#^block]]", "[[Folder/{}]]", "[[{}\\|table alias]]")
+    link_lines = set(rng.sample(range(spec.body_lines), min(spec.links_per_note, spec.body_lines)))
+    for idx in range(spec.body_lines):
+        line = _words(rng, 12)
+        if idx in link_lines: line += ' ' + rng.choice(link_forms).format(rng.choice(note_names))
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def _bib_entry_text(rng: random.Random, idx: int, citation_key: str) -> str:
+    """ Builds a single BetterBibLaTeX-style .bib entry. """
+    return (
+        f"@article{{{citation_key},\n"
+        f"  title = {{{_words(rng, 8).capitalize()}}},\n"
+        f"  author = {{Author{idx}, Alice and Writer, Bob and Scientist, Carol}},\n"
+        f"  date = {{{2000 + idx % 25}}},\n"
+        f"  journaltitle = {{Journal of {rng.choice(WORDS).capitalize()}}},\n"
+        f"  journal = {{Journal of {rng.choice(WORDS).capitalize()}}},\n"
+        f"  doi = {{10.1000/{idx}}},\n"
+        f"  abstract = {{{_words(rng, 60)}}},\n"
+        f"}}\n\n"
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic Obsidian vault and .bib file for benchmarking.")
+    parser.add_argument('vault_path')
+    for name, default in vars(VaultSpec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+    generated = generate_vault(args.pop('vault_path'), VaultSpec(**args))
+    print(f"Generated {len(generated.note_names)} notes ({len(generated.article_names)} articles) and {len(generated.citation_keys)} BibTex entries in '{generated.vault_path}'.")
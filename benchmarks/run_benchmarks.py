@@ -0,0 +1,200 @@
+""" Times the core parts of the project against a synthetic vault, and writes the results as JSON so that runs (e.g. of different releases) can be compared.
+
+Example usage (from the root of the repository):
+    python -m benchmarks.run_benchmarks --notes 5000 --output results.json
+    python -m benchmarks.run_benchmarks --notes 5000 --compare results.json
+
+Each benchmark runs against a freshly generated vault in a temporary folder, so the vault set in constants.py is never touched.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import contextlib
+from dataclasses import asdict
+
+from benchmarks.generate_vault import VaultSpec, GeneratedVault, generate_vault
+import constants as c
+
+class BenchmarkRunner:
+    """ Class which generates the synthetic vault, points constants.py at it, and times each benchmark. """
+
+    def __init__(self, spec: VaultSpec, repeats: int = 3, workdir: str | None = None):
+        self.spec = spec
+        self.repeats = repeats
+        self.workdir = workdir or tempfile.mkdtemp(prefix='obsidian-bench-')
+        self.results: dict[str, dict] = {}
+        self.vault: GeneratedVault | None = None
+
+    def fresh_vault(self) -> GeneratedVault:
+        """ (Re)generates the vault and points the constants at it, clearing any cached data. """
+        vault_path = os.path.join(self.workdir, 'vault')
+        cache_folder = os.path.join(self.workdir, 'cache')
+        shutil.rmtree(vault_path, ignore_errors=True)
+        shutil.rmtree(cache_folder, ignore_errors=True)
+        self.vault = generate_vault(vault_path, self.spec)
+
+        c.vault_path = vault_path
+        c.excluded_folders = [self.vault.excluded_folder]
+        c.bibtext_location = self.vault.bibtex_location
+        c.cache_folder = cache_folder
+        self.clear_bibtex()
+        return self.vault
+
+    def clear_bibtex(self) -> None:
+        """ Forgets the loaded BibTex data, so that the next access goes back through constants.__getattr__. """
+        for name in ('bibdata_entries', 'bibdata'): vars(c).pop(name, None)
+
+    def clear_cache(self) -> None:
+        shutil.rmtree(c.cache_folder, ignore_errors=True)
+
+    def time(self, name: str, func, items: int = 1, setup=None) -> dict:
+        """
+        Times a function, keeping the best and median of several repeats.
+
+        Args:
+            name (str): The name to store the result under.
+            func (callable): The function to time. Called with no arguments.
+            items (int, optional): The number of items (e.g. notes) processed by each call, used to report the time per item.
+            setup (callable, optional): Called (untimed) before each repeat, e.g. to clear caches.
+        """
+        timings = []
+        for _ in range(self.repeats):
+            if setup is not None: setup()
+            with contextlib.redirect_stdout(io.StringIO()):  # hide the 'Finished processing articles!' summaries
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+
+        result = {'best_s': min(timings), 'median_s': statistics.median(timings), 'items': items, 'best_per_item_us': min(timings) / max(items, 1) * 1e6}
+        self.results[name] = result
+        print(f"{name:<36} {result['best_s'] * 1e3:>10.1f} ms  {result['best_per_item_us']:>10.1f} us/item  ({items} items)")
+        return result
+
+    def run(self) -> dict:
+        """ Runs every benchmark, returning the results along with information about the run. """
+        from helpers import ObsidianNote, yield_articles, yield_notes, process_articles, NoteRenamer, load_property_table
+
+        vault = self.fresh_vault()
+        article_paths = [note.filepath for note in yield_articles()]
+        notes = [ObsidianNote(filepath) for filepath in article_paths]
+
+        # ObsidianNote parsing and serialisation
+        self.time('note_parse', lambda: [ObsidianNote(filepath) for filepath in article_paths], len(article_paths))
+        self.time('note_serialise', lambda: [note.file_contents_string for note in notes], len(notes))
+
+        # Scanning the vault for articles, with and without a warm vault index
+        self.time('yield_articles_cold', lambda: sum(1 for _ in yield_articles()), self.spec.notes, setup=self.clear_cache)
+        self.time('yield_articles_warm', lambda: sum(1 for _ in yield_articles()), self.spec.notes)
+        self.time('yield_notes_read_bodies', lambda: sum(len(note.body_text) for note in yield_notes()), self.spec.notes)
+
+        # BibTex loading (with and without the on-disk cache) and lookups
+        def load_bibtex(): return len(c.bibdata_entries)
+        def cold_bibtex():
+            self.clear_bibtex()
+            self.clear_cache()
+        self.time('bibtex_load_cold', load_bibtex, len(vault.citation_keys), setup=cold_bibtex)
+        self.time('bibtex_load_warm', load_bibtex, len(vault.citation_keys), setup=self.clear_bibtex)
+        self.time('bibtex_lookup', lambda: [note.bibtex_data.fields.get('journal') for note in notes], len(notes))
+
+        # process_articles end to end: a no-op pass (nothing written), then a pass which changes every article
+        @process_articles(write=True)
+        def unchanged(note: ObsidianNote): pass
+
+        @process_articles(write=True)
+        def add_journal(note: ObsidianNote):
+            note.properties['journal'] = note.bibtex_data.fields.get('journal') if note.bibtex_data else None
+
+        self.time('process_articles_unchanged', unchanged, len(article_paths))
+        self.time('process_articles_write', add_journal, len(article_paths), setup=self.fresh_vault)
+
+        # The same pass, pipelined so that reads and writes overlap with the function
+        @process_articles(write=True, executor='async', workers=4)
+        def add_journal_pipelined(note: ObsidianNote): add_journal.__wrapped__(note)
+
+        self.time('process_articles_write_async', add_journal_pipelined, len(article_paths), setup=self.fresh_vault)
+
+        # The same pass as a column operation over a property table, joined against the BibTex entries
+        def add_journal_table():
+            table = load_property_table()
+            table.set('journal', table.join_bibtex(['journal'])['journal'])
+            table.write()
+        self.time('property_table_write', add_journal_table, len(article_paths), setup=self.fresh_vault)
+
+        # Renaming a handful of notes, including rewriting every link to them
+        n_renames = min(50, len(vault.note_names))
+        def rename():
+            renamer = NoteRenamer()
+            for note in yield_notes(n_renames):
+                old_name = note.filename.rsplit('.', 1)[0]
+                renamer.add(note.filepath, old_name, f"{old_name} renamed")
+            renamer.rename_files()
+        self.time('rename_files', rename, n_renames, setup=self.fresh_vault)
+
+        return {'meta': self.meta(), 'results': self.results}
+
+    def meta(self) -> dict:
+        """ Information about the run, to make sure that compared results are comparable. """
+        return {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeats': self.repeats,
+            'spec': asdict(self.spec),
+        }
+
+def compare_results(new: dict, old: dict, threshold: float = 0.1) -> list[str]:
+    """
+    Compares two sets of results, printing the relative change of each benchmark.
+
+    Args:
+        new (dict): The results of the current run, as returned by BenchmarkRunner.run.
+        old (dict): The results of a previous run, as loaded from its JSON file.
+        threshold (float, optional): The relative slowdown above which a benchmark counts as a regression.
+
+    Returns:
+        list[str]: The names of the benchmarks which regressed.
+    """
+    if new['meta']['spec'] != old['meta']['spec']:
+        print("Warning: the vault spec differs between the two runs, so the results may not be comparable.")
+
+    regressions = []
+    for name, result in new['results'].items():
+        if name not in old['results']: continue
+        change = result['best_s'] / old['results'][name]['best_s'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  <-- REGRESSION'
+            regressions.append(name)
+        print(f"{name:<36} {change * 100:>+8.1f}%{flag}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the core parts of the project on a synthetic vault.")
+    for name, default in vars(VaultSpec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workdir', help="Folder to generate the vault in (defaults to a temporary folder, deleted afterwards).")
+    parser.add_argument('--output', help="Path to write the results to, as JSON.")
+    parser.add_argument('--compare', help="Path to the JSON results of a previous run, to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Relative slowdown counted as a regression when comparing (default 0.1).")
+    args = parser.parse_args()
+
+    spec = VaultSpec(**{name: getattr(args, name) for name in vars(VaultSpec())})
+    runner = BenchmarkRunner(spec, args.repeats, args.workdir)
+    try:
+        results = runner.run()
+    finally:
+        if args.workdir is None: shutil.rmtree(runner.workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file: json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file: old_results = json.load(file)
+        sys.exit(1 if compare_results(results, old_results, args.threshold) else 0)
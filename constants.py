@@ -1,6 +1,5 @@
 """ Constnats file for 'global' variables to be used across files. Variables will be need to be set manually for each device, as it currently stands. """
-from os.path import join
-from pybtex.database.input import bibtex
+from os.path import join, dirname, abspath
 
 # MANUALLY SET THESE VARIABLES
 # Absoulte path to the vault
@@ -9,6 +8,9 @@ vault_path = r"C:\PATH\TO\OBSIDIAN\VAULT"
 # List of folders where you don't want to search for articles (i.e. template folders). Comma separated. Relative to the root directory of your obsidian vault. 
 excluded_folders = [r"\first\folder", r"\second\folder"]
 
+# List of glob-style patterns for folders or files which should also be skipped (e.g. "*.excalidraw.md", "Attachments/*"). Matched against both the name and the path relative to the vault. The '.obsidian' and '.trash' folders are always skipped.
+excluded_patterns = []
+
 # For some of the functionality, you will need to link to a .bib file, which can be generated automatically using the BetterBibtex plugin in Zotero, and the `export library -> Better BibLaTeX` format.
 # ObsidianNotes can automatically get a reference to their BibLaTeX data, which can make operations easier. Currently, this is only implemented if articles have a property containing the BibTex citation key. If this is not the case for your vault, there are ways to find the correct BibTex entry by searching for e.g. the title of the article.
 relative_bibtex_location = r"PATH\TO\BIBTEX\FILE\library.bib"
@@ -17,8 +19,30 @@ citation_key_property_name = "citation key"
 # List of tags which will be used to identify articles. If a page contains one of these tags, it is treated as an article.
 article_tags = ["document/article", "document/book"]
 
+# How BibTex entries are looked up: "mmap" indexes where each entry is in the .bib file and only parses the entries which are looked up (best for large libraries), while "cache" parses the whole library once and keeps every entry in a cache file.
+bibtex_backend = "mmap"
+
+# Folder used to store caches between runs (e.g. the parsed BibTex library). Defaults to a '.cache' folder next to this file.
+cache_folder = join(dirname(abspath(__file__)), ".cache")
+
+# Whether to keep an index of the properties of every note in the cache folder, so that repeat runs only re-read notes which have changed.
+use_vault_index = True
+
 # AUTOMATIC SUPPORTING VARIABLES
-# Load the bibtex file
 bibtext_location = join(vault_path, relative_bibtex_location)
-bibdata = bibtex.Parser().parse_file(bibtext_location)
-bibdata_entries = bibdata.entries
\ No newline at end of file
+
+# The bibtex file is loaded lazily (see __getattr__ below): `bibdata_entries` is loaded using the bibtex_backend above, from on-disk data which is only rebuilt when the .bib file changes, and `bibdata` (the full pybtex BibliographyData object) is only parsed if it is explicitly asked for.
+def __getattr__(name: str):
+    """ Module-level getter, called only for attributes which have not been set yet. Loads and stores the BibTex data on first access. """
+    if name == "bibdata_entries" and bibtex_backend == "mmap":
+        from helpers.bibtex_index import MappedBibEntries
+        globals()[name] = MappedBibEntries(bibtext_location, cache_folder)
+    elif name == "bibdata_entries":
+        from helpers.bibtex_cache import load_bibdata_entries
+        globals()[name] = load_bibdata_entries(bibtext_location, cache_folder)
+    elif name == "bibdata":
+        from pybtex.database.input import bibtex
+        globals()[name] = bibtex.Parser().parse_file(bibtext_location)
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    return globals()[name]
\ No newline at end of file
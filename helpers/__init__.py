@@ -3,10 +3,20 @@
 # from .[FILE] import [CALLABLE]
 
 from .obsidian_note import ObsidianNote
-from .yield_functions import yield_files, yield_notes, yield_articles
+from .filters import Where, has_property, property_equals, property_is_empty, tag_prefix, path_glob, is_article
+from .yield_functions import walk_vault, yield_files, yield_note_entries, yield_note_paths, yield_note_records, yield_notes, yield_articles, is_note_path
+from .vault_index import VaultIndex
+from .link_graph import LinkGraph, get_link_graph
+from .tag_index import TagIndex, get_tag_index
+from .property_table import PropertyTable, Column, load_property_table
+from .rename_planner import RenamePlan, PlannedRename
 from .note_renamer import NoteRenamer
 from .general_functions import *
 
 from .decorators import process_articles, rename_articles
+from .bibtex_matcher import BibMatch, BibMatcher, get_bib_matcher, backfill_citation_keys
+from .pipeline import Pipeline, Stage
+from .bulk_replace import BulkReplacer, bulk_replace
+from .watcher import VaultWatcher, watch_vault
 
 __all__ = []  # list as strings
\ No newline at end of file
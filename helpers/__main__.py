@@ -0,0 +1,4 @@
+""" Allows the project to be run from the command line, with `python -m helpers` (see helpers/cli.py). """
+from .cli import main
+
+raise SystemExit(main())
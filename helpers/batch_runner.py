@@ -0,0 +1,236 @@
+""" File containing the machinery used by the decorators to run a user function over many notes, either one after another, concurrently using a pool of thread or process workers, or as an asynchronous pipeline which overlaps reading and writing with the function itself. """
+import os
+import time
+import inspect
+import functools
+import logging
+import importlib
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from . import ObsidianNote, instrumentation
+import constants as c
+
+# Constants which are copied into process workers, so that values set at runtime (rather than in constants.py) are respected
+SHARED_CONSTANTS = ('vault_path', 'excluded_folders', 'excluded_patterns', 'bibtext_location', 'bibtex_backend', 'citation_key_property_name', 'article_tags', 'cache_folder')
+EXECUTORS = ('thread', 'process', 'async')
+_DONE = object()  # marks the end of the notes passed between the stages of a pipelined run
+
+@dataclass
+class NoteResult:
+    """ Dataclass representing the outcome of running a function on a single note. """
+    filepath: str
+    written: bool = False
+    error: str | None = None  # formatted traceback if the function (or the write) raised
+    seconds: float = 0.0  # time taken to load (the rest of), process and write the note
+
+def run_on_note(func, note: ObsidianNote | str, write: bool, catch_errors: bool = True) -> NoteResult:
+    """
+    Runs a function on a single note (loading it first if given a filepath) and optionally writes the result.
+    Unless catch_errors is False, any exception is caught and stored on the returned NoteResult, so that one bad note does not abort a whole batch.
+    """
+    filepath = note if isinstance(note, str) else note.filepath
+    start = time.perf_counter()
+    try:
+        if isinstance(note, str): note = ObsidianNote(note)
+        instrumentation.current().user_function(func, note)
+        written = note.write_file() if write else False
+        return NoteResult(filepath, written=written, seconds=time.perf_counter() - start)
+    except Exception:
+        if not catch_errors: raise
+        return NoteResult(filepath, error=traceback.format_exc(), seconds=time.perf_counter() - start)
+
+def run_serial(func, notes, write: bool, on_result=None):
+    """ Runs a function across notes one at a time, yielding a NoteResult for each note (also passed to on_result, if given). Exceptions are not caught, so the first failing note stops the run. """
+    for note in notes:
+        result = run_on_note(func, note, write, catch_errors=False)
+        if on_result is not None: on_result(result)
+        yield result
+
+def run_parallel(func, notes, write: bool, workers: int, executor: str = 'thread', on_result=None):
+    """
+    Runs a function across notes using a pool of workers, yielding a NoteResult for each note.
+
+    Args:
+        func (callable): The function to run on each note.
+        notes (Iterable[ObsidianNote | str]): Notes (or filepaths of notes, which are then loaded by the workers).
+        write (bool): Whether to write each note after running the function.
+        workers (int): The number of workers in the pool.
+        executor (str): Either 'thread' or 'process'. Process workers sidestep the GIL for CPU-heavy functions, but require `func` to be defined at the top level of a module (and, on Windows, the calling script to be guarded by `if __name__ == '__main__':`).
+        on_result (callable, optional): Function called with each NoteResult as soon as its note is finished, in whatever order the notes finish (e.g. to record progress, including for notes which finish after the run is interrupted). Called from the pool's threads, so it must be thread-safe.
+
+    Yields:
+        NoteResult: The result for each note, in the same order as the input notes regardless of the order in which they finish.
+    """
+    if executor not in ('thread', 'process'):
+        raise ValueError(f"Unknown executor '{executor}'. Must be one of ('thread', 'process'); use run_pipelined for 'async'.")
+
+    if executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # imports multiprocessing, so only when it is used
+        func = _PicklableFunction(func)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker, initargs=_process_worker_state())
+
+    with pool:
+        # Only keep a bounded number of notes in flight, so the vault is streamed rather than loaded all at once
+        pending = deque()
+        for note in notes:
+            pending.append(pool.submit(run_on_note, func, note, write))
+            if on_result is not None: pending[-1].add_done_callback(functools.partial(_report_finished, on_result))
+            if len(pending) >= workers * 4: yield pending.popleft().result()
+        while pending: yield pending.popleft().result()
+
+def _report_finished(on_result, future) -> None:
+    # Done callback of a note's future: futures which did not finish (e.g. cancelled, or interrupted by Ctrl+C) have no result
+    if not future.cancelled() and future.exception() is None: on_result(future.result())
+
+def run_pipelined(func, notes, write: bool, workers: int = 1, on_result=None) -> list[NoteResult]:
+    """
+    Runs a function across notes as a pipeline of three stages connected by bounded queues, so that reading and writing files overlaps with running the function:
+        - A reader stage walks the vault and reads each note in full (up to `workers` notes at once) in a pool of I/O threads.
+        - A processor stage runs the function on each note in turn, in a single thread of its own, so the function never runs concurrently with itself.
+        - A writer stage writes each note behind the processor, in the pool of I/O threads.
+    This mostly helps on slow storage (e.g. network-mounted or encrypted vaults), where the time spent waiting for the disk is otherwise added to the time spent in the function. On a fast local disk, the overhead of the pipeline can outweigh the gain.
+    At most `workers * 4` notes are held between each pair of stages, so memory use does not grow with the size of the vault. Exceptions are caught for each note, as with run_parallel.
+
+    Args:
+        func (callable): The function to run on each note.
+        notes (Iterable[ObsidianNote | str]): Notes (or filepaths of notes, which are then loaded by the reader stage).
+        write (bool): Whether to write each note after running the function.
+        workers (int, optional): The number of notes which can be read at once.
+        on_result (callable, optional): Function called with each NoteResult as soon as its note is finished (e.g. to record progress), rather than once the whole run has finished.
+
+    Returns:
+        list[NoteResult]: The result for each note, in the same order as the input notes.
+    """
+    import asyncio  # only imported for pipelined runs, as it is slow to import
+    pipeline = _run_pipeline(func, notes, write, max(workers, 1), on_result)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(pipeline)
+
+    # Called from inside a running event loop (e.g. a notebook), so run the pipeline's own loop in another thread
+    with ThreadPoolExecutor(max_workers=1) as pool: return pool.submit(asyncio.run, pipeline).result()
+
+async def _run_pipeline(func, notes, write: bool, workers: int, on_result=None) -> list[NoteResult]:
+    """ The coroutine behind run_pipelined. """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    read_queue, write_queue = asyncio.Queue(maxsize=workers * 4), asyncio.Queue(maxsize=workers * 4)
+    results = []
+
+    async def reader(io_pool):
+        # Walking the vault is blocking too, so each step of it is run in the pool. Reads are queued as futures, so several can be in flight at once.
+        iterator = iter(notes)
+        try:
+            while (note := await loop.run_in_executor(io_pool, next, iterator, _DONE)) is not _DONE:
+                filepath = note if isinstance(note, str) else note.filepath
+                await read_queue.put((filepath, time.perf_counter(), loop.run_in_executor(io_pool, _read_note, note)))
+        finally:
+            await read_queue.put(_DONE)
+
+    async def processor(func_pool):
+        try:
+            while (item := await read_queue.get()) is not _DONE:
+                filepath, queued, read = item
+                try:
+                    note = await read
+                    start = time.perf_counter()
+                    await loop.run_in_executor(func_pool, instrumentation.current().user_function, func, note)
+                    await write_queue.put((filepath, note, None, time.perf_counter() - start))
+                except Exception:
+                    await write_queue.put((filepath, None, traceback.format_exc(), time.perf_counter() - queued))
+        finally:
+            await write_queue.put(_DONE)
+
+    async def writer(io_pool):
+        while (item := await write_queue.get()) is not _DONE:
+            filepath, note, error, seconds = item
+            written, start = False, time.perf_counter()
+            if error is None and write:
+                try:
+                    written = await loop.run_in_executor(io_pool, note.write_file)
+                except Exception:
+                    error = traceback.format_exc()
+            results.append(NoteResult(filepath, written=written, error=error, seconds=seconds + time.perf_counter() - start))
+            if on_result is not None: on_result(results[-1])
+
+    with ThreadPoolExecutor(max_workers=workers + 2) as io_pool, ThreadPoolExecutor(max_workers=1) as func_pool:
+        stages = [asyncio.create_task(reader(io_pool)), asyncio.create_task(processor(func_pool)), asyncio.create_task(writer(io_pool))]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages: stage.cancel()
+    return results
+
+def _read_note(note: ObsidianNote | str) -> ObsidianNote:
+    # Reads a note in full: accessing the body text of a lazily loaded note reads it from the file
+    if isinstance(note, str): return ObsidianNote(note)
+    note.body_text
+    return note
+
+def report_results(results: list[NoteResult], write: bool) -> None:
+    """ Logs the tracebacks of any failed notes (in the order the notes were processed), then prints a summary of the run. """
+    for result in results:
+        instrumentation.current().note_finished(result.filepath, result.seconds)
+        if result.error is None: continue
+        logging.error(f"Error: failed to process '{result.filepath}':\n{result.error}")
+
+    failed = sum(result.error is not None for result in results)
+    written = sum(result.written for result in results)
+    instrumentation.current().count('notes_processed', len(results) - failed)
+    if write: instrumentation.current().count('written', written)
+    if failed: instrumentation.current().count('failed', failed)
+    summary = [f"{len(results) - failed} processed"]
+    if write: summary.append(f"{written} written, {len(results) - failed - written} unchanged")
+    if failed: summary.append(f"{failed} failed")
+    print(f"Finished processing articles! ({', '.join(summary)})")
+
+class _PicklableFunction:
+    """
+    Wrapper allowing a user function to be sent to process workers.
+    Functions decorated with process_articles cannot be pickled directly (their module-level name now refers to the decorated wrapper), so the function is pickled by reference and unwrapped again in the worker.
+    """
+    def __init__(self, func):
+        if '<locals>' in func.__qualname__:
+            raise ValueError(f"Function '{func.__qualname__}' must be defined at the top level of a module to be used with process workers.")
+        self.func = func
+
+    def __call__(self, note): return self.func(note)
+    def __getstate__(self): return (self.func.__module__, self.func.__qualname__)
+
+    def __setstate__(self, state):
+        module_name, qualname = state
+        func = importlib.import_module(module_name)
+        for attribute in qualname.split('.'): func = getattr(func, attribute)
+        self.func = inspect.unwrap(func)
+
+def _process_worker_state() -> tuple:
+    """ Collects the state which must be sent to each process worker when it starts. """
+    settings = {name: getattr(c, name) for name in SHARED_CONSTANTS}
+
+    # If the parent has already loaded the BibTex entries from the cache, send them on directly.
+    # Otherwise, make sure the on-disk cache (or offset index) is up to date so each worker can load it in milliseconds, instead of every worker re-reading the .bib file.
+    if 'bibdata_entries' in vars(c):
+        from .bibtex_cache import CachedBibEntries
+        raw_entries = c.bibdata_entries.raw_entries() if isinstance(c.bibdata_entries, CachedBibEntries) else None
+    else:
+        raw_entries = None
+        if os.path.exists(c.bibtext_location) and c.bibtex_backend == 'mmap':
+            from .bibtex_index import load_offset_index
+            load_offset_index(c.bibtext_location, c.cache_folder)
+        elif os.path.exists(c.bibtext_location):
+            from .bibtex_cache import load_raw_entries
+            load_raw_entries(c.bibtext_location, c.cache_folder)
+    return (settings, raw_entries)
+
+def _init_process_worker(settings: dict, raw_entries: dict | None) -> None:
+    """ Initialiser run once in each process worker, which copies over the parent's constants and BibTex lookup. """
+    for name, value in settings.items(): setattr(c, name, value)
+    if raw_entries is not None:
+        from .bibtex_cache import CachedBibEntries
+        c.bibdata_entries = CachedBibEntries(raw_entries)
@@ -0,0 +1,100 @@
+""" File for caching the parsed BibTex library on disk. Parsing a large .bib file with pybtex can take many seconds, so the parsed entries are stored in a compact pickle file keyed by the path, size and modification time of the .bib file, and only re-parsed when the .bib file changes. """
+import os
+import hashlib
+from collections.abc import Mapping
+
+from .cache_files import file_key, read_cache, write_cache
+
+# Bump this whenever the layout of the cached data changes, so that old caches are rebuilt
+CACHE_VERSION = 1
+
+class CachedBibEntries(Mapping):
+    """
+    Read-only, dict-like view of the entries of a BibTex library, as loaded from the cache.
+
+    Entries are stored as plain tuples of strings, and only converted into pybtex Entry objects when they are first accessed (afterwards they are memoised). This means that looking up a handful of entries does not require building thousands of Entry and Person objects.
+    Citation keys are case-insensitive, as they are in pybtex: lookups ignore case, while iterating gives the keys as spelled in the .bib file.
+    """
+
+    def __init__(self, raw_entries: dict[str, tuple]):
+        self._raw_entries = {citation_key.casefold(): raw_entry for citation_key, raw_entry in raw_entries.items()}
+        self._keys = {citation_key.casefold(): citation_key for citation_key in raw_entries}  # the spelling of each key in the .bib file
+        self._entries: dict = {}
+
+    def __getitem__(self, citation_key: str):
+        folded_key = citation_key.casefold()
+        entry = self._entries.get(folded_key)
+        if entry is None:
+            if folded_key not in self._raw_entries: raise KeyError(citation_key)
+            entry = _entry_from_raw(self._raw_entries[folded_key])
+            self._entries[folded_key] = entry
+        return entry
+
+    def __contains__(self, citation_key) -> bool: return isinstance(citation_key, str) and citation_key.casefold() in self._raw_entries
+    def __iter__(self): return iter(self._keys.values())
+    def __len__(self) -> int: return len(self._raw_entries)
+    def __repr__(self): return f"CachedBibEntries({len(self)} entries)"
+
+    def raw_entries(self) -> dict[str, tuple]:
+        """ Returns the raw (tuple) form of the entries, keyed by their citation keys as spelled in the .bib file (the form taken by the constructor). """
+        return {self._keys[folded_key]: raw_entry for folded_key, raw_entry in self._raw_entries.items()}
+
+def load_bibdata_entries(bibtex_location: str, cache_folder: str) -> CachedBibEntries:
+    """
+    Loads the entries of a BibTex file, using the on-disk cache if it is still valid and (re)building it otherwise.
+
+    Args:
+        bibtex_location (str): Path to the .bib file.
+        cache_folder (str): Folder in which to store the cache file. Created if it does not exist.
+
+    Returns:
+        CachedBibEntries: A dict-like object mapping citation keys to pybtex Entry objects.
+    """
+    return CachedBibEntries(load_raw_entries(bibtex_location, cache_folder))
+
+def load_raw_entries(bibtex_location: str, cache_folder: str) -> dict[str, tuple]:
+    """ Returns the raw (tuple) form of the entries of a BibTex file, reading from the cache where possible. """
+    bibtex_location = os.path.abspath(bibtex_location)
+    cache_key = (CACHE_VERSION,) + file_key(bibtex_location)
+    cache_path = cache_path_for(bibtex_location, cache_folder)
+
+    raw_entries = read_cache(cache_path, cache_key)
+    if raw_entries is not None: return raw_entries
+
+    # Cache is missing or stale, so parse the .bib file and store the result for the next run
+    raw_entries = _parse_raw_entries(bibtex_location)
+    write_cache(cache_path, cache_key, raw_entries)
+    return raw_entries
+
+def cache_path_for(bibtex_location: str, cache_folder: str) -> str:
+    """ Returns the path of the cache file used for a given .bib file. """
+    path_hash = hashlib.sha1(os.path.abspath(bibtex_location).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_folder, f"bibtex-{path_hash}.pickle")
+
+def _parse_raw_entries(bibtex_location: str) -> dict[str, tuple]:
+    """ Parses the .bib file with pybtex and converts every entry into its raw tuple form. """
+    from pybtex.database.input import bibtex
+    bibdata = bibtex.Parser().parse_file(bibtex_location)
+    return {citation_key: _raw_from_entry(entry) for citation_key, entry in bibdata.entries.items()}
+
+def _raw_from_entry(entry) -> tuple:
+    """ Converts a pybtex Entry into a tuple of (type, fields, persons) made only of strings, tuples and dicts. """
+    fields = tuple(entry.fields.items())
+    persons = {
+        role: tuple(
+            (' '.join(person.first_names), ' '.join(person.middle_names), ' '.join(person.prelast_names),
+             ' '.join(person.last_names), ' '.join(person.lineage_names))
+            for person in people)
+        for role, people in entry.persons.items()
+    }
+    return (entry.type, fields, persons)
+
+def _entry_from_raw(raw_entry: tuple):
+    """ Converts a raw tuple back into a pybtex Entry. """
+    from pybtex.database import Entry, Person
+    entry_type, fields, persons = raw_entry
+    return Entry(entry_type, fields=list(fields), persons={
+        role: [Person(first=first, middle=middle, prelast=prelast, last=last, lineage=lineage)
+               for first, middle, prelast, last, lineage in people]
+        for role, people in persons.items()
+    })
@@ -0,0 +1,159 @@
+""" File for looking up BibTex entries without parsing the whole library. The .bib file is scanned once (memory-mapped, so it is never read into memory as a whole) for the byte offsets of its entries, and the resulting index is cached on disk, keyed by the path, size and modification time of the .bib file. Each entry is then only parsed by pybtex when it is looked up. """
+import os
+import re
+import mmap
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from .cache_files import file_key, read_cache, write_cache
+
+# Bump this whenever the layout of the cached index changes, so that old indexes are rebuilt
+INDEX_VERSION = 3
+
+# Start of an entry: '@type{key' (or '@type(key') at the start of a line. Text between entries is ignored, as it is by BibTex itself.
+_ENTRY_PATTERN = re.compile(rb'^[ \t]*@[ \t]*([A-Za-z]+)[ \t\r\n]*([{(])[ \t\r\n]*([^,\s{}()"=]*)', re.MULTILINE)
+_CLOSING_DELIMITERS = {b'{': b'}', b'(': b')'}
+
+class MappedBibEntries(Mapping):
+    """
+    Read-only, dict-like view of the entries of a BibTex library, which parses each entry only when it is first looked up.
+
+    Looked up entries are pybtex Entry objects, exactly as they would be if the whole library had been parsed, so `entry.fields` and `entry.persons` work as before.
+    The most recently used entries are kept (up to max_cached_entries), so memory use does not depend on the size of the library.
+    If the .bib file changes (e.g. it is re-exported by Zotero), the index is rebuilt on the next lookup (or membership test, or iteration).
+    Citation keys are case-insensitive, as they are in pybtex (and BibTex): lookups ignore case, while iterating gives the keys as spelled in the .bib file.
+
+    Args:
+        bibtex_location (str): Path to the .bib file.
+        cache_folder (str): Folder in which to store the offset index. Created if it does not exist.
+        max_cached_entries (int, optional): The number of parsed entries to keep.
+    """
+
+    def __init__(self, bibtex_location: str, cache_folder: str, max_cached_entries: int = 1024):
+        self.bibtex_location = os.path.abspath(bibtex_location)
+        self.cache_folder = cache_folder
+        self.max_cached_entries = max_cached_entries
+        self._entries: OrderedDict = OrderedDict()  # casefolded citation key -> Entry, least recently used first
+        self._lock = threading.Lock()  # thread workers share the same entries
+        self._load_index()
+
+    def __getitem__(self, citation_key: str):
+        folded_key = citation_key.casefold()
+        with self._lock:
+            self._check_file()
+            entry = self._entries.get(folded_key)
+            if entry is not None:
+                self._entries.move_to_end(folded_key)
+                return entry
+
+            if folded_key not in self._offsets: raise KeyError(citation_key)
+            start, end = self._offsets[folded_key]
+            entry = self._parse_entry(self._keys[folded_key], self._read_span(start, end))
+            self._entries[folded_key] = entry
+            if len(self._entries) > self.max_cached_entries: self._entries.popitem(last=False)
+            return entry
+
+    # Every access checks the .bib file first (as __getitem__ does), so that a changed file is never answered from the old index
+    def __contains__(self, citation_key) -> bool:
+        with self._lock:
+            self._check_file()
+            return isinstance(citation_key, str) and citation_key.casefold() in self._offsets
+
+    def __iter__(self):
+        with self._lock:
+            self._check_file()
+            return iter(list(self._keys.values()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._check_file()
+            return len(self._offsets)
+
+    def __repr__(self): return f"MappedBibEntries({len(self)} entries)"
+
+    def _load_index(self) -> None:
+        self._file_key = file_key(self.bibtex_location)
+        offsets, self._string_spans = load_offset_index(self.bibtex_location, self.cache_folder)
+        self._offsets = {citation_key.casefold(): span for citation_key, span in offsets.items()}
+        self._keys = {citation_key.casefold(): citation_key for citation_key in offsets}  # the spelling of each key in the .bib file
+        self._strings = ''.join(self._read_span(start, end) for start, end in self._string_spans)  # @string macros, which entries may refer to
+        self._entries.clear()
+
+    def _check_file(self) -> None:
+        # The offsets are only valid for the file they were taken from
+        if file_key(self.bibtex_location) != self._file_key:
+            logging.info(f"'{self.bibtex_location}' has changed... re-indexing.")
+            self._load_index()
+
+    def _read_span(self, start: int, end: int) -> str:
+        # Entries are read with a plain positioned read rather than through a lasting memory map, so the file is not held open (which on Windows would stop Zotero from re-exporting it)
+        with open(self.bibtex_location, 'rb') as file:
+            file.seek(start)
+            return file.read(end - start).decode('utf-8', errors='replace')
+
+    def _parse_entry(self, citation_key: str, text: str):
+        from pybtex.database.input import bibtex
+        bibdata = bibtex.Parser().parse_string(self._strings + text)
+        return bibdata.entries[citation_key]
+
+def load_offset_index(bibtex_location: str, cache_folder: str) -> tuple[dict[str, tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Returns the offset index of a BibTex file, reading from the cache where possible.
+
+    Returns:
+        tuple: A tuple containing:
+            - A dictionary mapping each citation key to the (start, end) byte offsets of its entry.
+            - The (start, end) byte offsets of each @string definition.
+    """
+    bibtex_location = os.path.abspath(bibtex_location)
+    cache_key = (INDEX_VERSION,) + file_key(bibtex_location)
+    cache_path = index_path_for(bibtex_location, cache_folder)
+
+    index = read_cache(cache_path, cache_key)
+    if index is not None: return index
+
+    # Index is missing or stale, so scan the .bib file and store the result for the next run
+    index = build_offset_index(bibtex_location)
+    write_cache(cache_path, cache_key, index)
+    return index
+
+def index_path_for(bibtex_location: str, cache_folder: str) -> str:
+    """ Returns the path of the offset index used for a given .bib file. """
+    path_hash = hashlib.sha1(os.path.abspath(bibtex_location).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_folder, f"bibtex-index-{path_hash}.pickle")
+
+def build_offset_index(bibtex_location: str) -> tuple[dict[str, tuple[int, int]], list[tuple[int, int]]]:
+    """ Scans a BibTex file for the byte offsets of its entries. See load_offset_index. """
+    offsets, string_spans, folded_keys = {}, [], set()
+    with open(bibtex_location, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0: return offsets, string_spans
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # Each entry runs until the start of the next one (or the end of the file). A line starting with '@' only starts a new entry once
+            # the delimiters of the previous entry are balanced, since it may be the continuation line of a field value (e.g. '{first line\n@ second line}')
+            previous, depth, scanned_to = None, 0, 0
+            for match in _ENTRY_PATTERN.finditer(mapped):
+                if previous is not None:
+                    chunk = mapped[scanned_to:match.start()]
+                    depth += chunk.count(previous[3]) - chunk.count(_CLOSING_DELIMITERS[previous[3]])
+                    scanned_to = match.start()
+                    if depth > 0: continue
+                    _add_entry(offsets, string_spans, folded_keys, *previous[:3], match.start(), bibtex_location)
+                previous, depth, scanned_to = (match.group(1).lower(), match.group(3), match.start(), match.group(2)), 0, match.start(2)
+            if previous is not None: _add_entry(offsets, string_spans, folded_keys, *previous[:3], len(mapped), bibtex_location)
+    return offsets, string_spans
+
+def _add_entry(offsets: dict, string_spans: list, folded_keys: set, entry_type: bytes, citation_key: bytes, start: int, end: int, bibtex_location: str) -> None:
+    # Adds an entry found by build_offset_index to the index, skipping comments and preambles
+    if entry_type == b'string': string_spans.append((start, end))
+    if entry_type in (b'string', b'comment', b'preamble'): return
+
+    citation_key = citation_key.decode('utf-8', errors='replace')
+    # Keys differing only in case are the same key to BibTex
+    if citation_key.casefold() in folded_keys:
+        logging.warning(f"Warning: '{bibtex_location}' has more than one entry with the citation key '{citation_key}'... using the first.")
+        return
+    folded_keys.add(citation_key.casefold())
+    offsets[citation_key] = (start, end)
@@ -0,0 +1,252 @@
+""" File for matching notes to BibTex entries when they do not have a citation key property, using their title, DOI, authors and year.
+
+Rather than comparing every note against every entry, the normalised title, DOI, first author and year of each entry are computed once (and cached on disk, keyed by the .bib file), and the entries are indexed by DOI, exact title and title word. A note is then matched by looking at the handful of entries sharing its rarest title words.
+
+Example usage:
+    match = obsidian_note.match_bibtex_entry()
+    if match is not None and match.confidence > 0.9:
+        obsidian_note.properties['citation key'] = match.citation_key
+
+    backfill_citation_keys(write=False)  # report what would be back-filled across the vault
+"""
+import os
+import re
+import hashlib
+import difflib
+import unicodedata
+from dataclasses import dataclass
+from collections.abc import Mapping
+
+from .cache_files import file_key, read_cache, write_cache
+import constants as c
+
+# Bump this whenever the normalisation (or the layout of the cached keys) changes, so that old caches are rebuilt
+MATCHER_VERSION = 1
+
+# Common words, which are not indexed as they would match almost every entry
+STOPWORDS = frozenset(('a', 'an', 'and', 'are', 'as', 'at', 'by', 'for', 'from', 'in', 'is', 'of', 'on', 'or', 'the', 'to', 'with'))
+
+_LATEX_COMMAND_PATTERN = re.compile(r"\\[A-Za-z]+\s*|\\.")
+_NON_ALPHANUMERIC_PATTERN = re.compile(r"[^0-9a-z]+")
+
+@dataclass
+class BibMatch:
+    """
+    Dataclass representing the BibTex entry matched to a note.
+
+    Attributes:
+        citation_key (str): The citation key of the matched entry.
+        confidence (float): How sure the match is, from 0 to 1. An exact DOI match scores 1, an exact title match with the same year and first author scores close to 1, and ambiguous matches (another entry scoring almost as well) score at most 0.5.
+        method (str): How the entry was matched: 'doi', 'title' (exact normalised title) or 'fuzzy'.
+    """
+    citation_key: str
+    confidence: float
+    method: str
+
+class BibMatcher:
+    """
+    Class indexing the entries of a BibTex library for matching notes against them.
+
+    Args:
+        entry_keys (dict[str, tuple]): For each citation key, its (normalised title, normalised DOI, normalised first author surname, year). See entry_keys_from_entries.
+    """
+
+    def __init__(self, entry_keys: dict[str, tuple[str, str, str, str]]):
+        self.entry_keys = entry_keys
+        self._by_doi: dict[str, str] = {}
+        self._by_title: dict[str, list[str]] = {}
+        self._by_word: dict[str, list[str]] = {}
+        self._title_words: dict[str, frozenset[str]] = {}
+
+        for citation_key, (title, doi, _, _) in entry_keys.items():
+            if doi: self._by_doi.setdefault(doi, citation_key)
+            if not title: continue
+            self._by_title.setdefault(title, []).append(citation_key)
+            words = title_words(title)
+            self._title_words[citation_key] = words
+            for word in words: self._by_word.setdefault(word, []).append(citation_key)
+
+    @classmethod
+    def from_bibtex(cls, bibtex_location: str, cache_folder: str, bibdata_entries: Mapping | None = None) -> 'BibMatcher':
+        """
+        Creates a matcher for a .bib file, reading the normalised keys of its entries from the cache where possible.
+
+        Args:
+            bibtex_location (str): Path to the .bib file.
+            cache_folder (str): Folder in which to cache the normalised keys.
+            bibdata_entries (Mapping, optional): The entries of the .bib file. Only used if the cache is missing or stale, in which case every entry is looked at. Defaults to a single parse of the whole .bib file with pybtex (or constants.bibdata, if it has been loaded already), which for a large library takes a few seconds and holds every entry in memory until the keys are computed. This is much quicker than going through the 'mmap' backend, which parses each entry on its own.
+        """
+        bibtex_location = os.path.abspath(bibtex_location)
+        cache_key = (MATCHER_VERSION,) + file_key(bibtex_location)
+        path_hash = hashlib.sha1(bibtex_location.encode('utf-8')).hexdigest()[:16]
+        cache_path = os.path.join(cache_folder, f"bibtex-match-{path_hash}.pickle")
+
+        entry_keys = read_cache(cache_path, cache_key)
+        if entry_keys is None:
+            entry_keys = entry_keys_from_entries(_parse_all_entries(bibtex_location) if bibdata_entries is None else bibdata_entries)
+            write_cache(cache_path, cache_key, entry_keys)
+        return cls(entry_keys)
+
+    def match(self, title: str | None = None, doi: str | None = None, author: str | None = None, year: str | None = None, max_candidates: int = 50) -> BibMatch | None:
+        """
+        Finds the entry best matching the given details.
+
+        Args:
+            title (str, optional): The title of the article.
+            doi (str, optional): The DOI of the article. If it matches an entry exactly, that entry is returned.
+            author (str, optional): The (first) author of the article, in any of the usual forms (e.g. 'Doe, Jane' or 'Jane Doe').
+            year (str, optional): The year of publication (anything starting with a four digit year, e.g. a date, also works).
+            max_candidates (int, optional): The number of entries sharing title words with the note to compare it against.
+
+        Returns:
+            BibMatch | None: The best match, or None if no entry shares any title words with the note (and the DOI did not match).
+        """
+        doi = normalise_doi(doi)
+        if doi and doi in self._by_doi: return BibMatch(self._by_doi[doi], 1.0, 'doi')
+
+        title = normalise_title(title)
+        if not title: return None
+        author, year = normalise_author(author), normalise_year(year)
+
+        # Compare against entries with the exact same title, or else the entries sharing the most of the note's rarest words
+        method, candidates = 'title', self._by_title.get(title, [])
+        if not candidates:
+            method, candidates = 'fuzzy', self._candidates(title_words(title), max_candidates)
+        scores = sorted(((self._score(title, author, year, citation_key), citation_key) for citation_key in candidates), reverse=True)
+        if not scores: return None
+
+        confidence, citation_key = scores[0]
+        if len(scores) > 1 and scores[1][0] >= confidence - 0.02: confidence = min(confidence, 0.5)  # ambiguous
+        return BibMatch(citation_key, round(confidence, 3), method)
+
+    def match_note(self, obsidian_note) -> BibMatch | None:
+        """ Finds the entry best matching a note, from its 'title' (or, failing that, file name), 'doi', 'author(s)' and 'year' (or 'date') properties. """
+        properties = obsidian_note.properties
+        title = properties.get('title') or obsidian_note.filename.rsplit('.', 1)[0]
+        author = _first_value(properties.get('authors') or properties.get('author'))
+        year = _first_value(properties.get('year') or properties.get('date'))
+        return self.match(_first_value(title), _first_value(properties.get('doi')), author, year)
+
+    def _candidates(self, words: frozenset[str], max_candidates: int) -> list[str]:
+        # Rank the entries sharing the note's three rarest words by how many of the note's words they contain
+        postings = sorted((self._by_word[word] for word in words if word in self._by_word), key=len)[:3]
+        candidates = {citation_key for posting in postings for citation_key in posting}
+        return sorted(candidates, key=lambda citation_key: len(words & self._title_words[citation_key]), reverse=True)[:max_candidates]
+
+    def _score(self, title: str, author: str, year: str, citation_key: str) -> float:
+        entry_title, _, entry_author, entry_year = self.entry_keys[citation_key]
+        score = 1.0 if title == entry_title else difflib.SequenceMatcher(None, title, entry_title).ratio()
+        score *= 0.9
+
+        # The year and first author confirm (or count against) a title match, when both sides have them
+        if year and entry_year: score += 0.05 if year == entry_year else -0.1
+        if author and entry_author: score += 0.05 if author == entry_author else -0.1
+        return max(score, 0.0)
+
+_bib_matcher: BibMatcher | None = None
+
+def get_bib_matcher(refresh: bool = False) -> BibMatcher:
+    """
+    Returns the shared matcher for the .bib file in constants.py, building it if it has not been built yet.
+
+    Args:
+        refresh (bool, optional): If True, rebuild the matcher (e.g. after the .bib file has changed).
+    """
+    global _bib_matcher
+    if refresh or _bib_matcher is None: _bib_matcher = BibMatcher.from_bibtex(c.bibtext_location, c.cache_folder)
+    return _bib_matcher
+
+def reset_bib_matcher() -> None:
+    """ Drops the shared matcher, so that it is rebuilt the next time it is needed (e.g. after the .bib file has changed). """
+    global _bib_matcher
+    _bib_matcher = None
+
+def backfill_citation_keys(limit: int = -1, min_confidence: float = 0.9, write: bool = True) -> list[tuple[str, BibMatch | None]]:
+    """
+    Adds the citation key property to every article which does not have one, by matching it to an entry of the .bib file.
+
+    Entries which are already the citation key of another note are never used, and the same entry is never given to two notes in one run.
+
+    Args:
+        limit (int, optional): The number of articles to process. If negative, will process all articles.
+        min_confidence (float, optional): The confidence below which a match is reported, but not used.
+        write (bool, optional): Whether to write the notes. If False, only report what would be back-filled.
+
+    Returns:
+        list[tuple[str, BibMatch | None]]: The filepath of each article without a citation key, with its best match (or None).
+    """
+    from .decorators import process_articles
+    from .yield_functions import yield_note_records
+
+    matcher = get_bib_matcher()
+    claimed_keys = {record.properties.get(c.citation_key_property_name) for _, record in yield_note_records()}
+    matches, filled = [], 0
+
+    @process_articles(limit=limit, write=write)
+    def backfill(obsidian_note):
+        nonlocal filled
+        if obsidian_note.properties.get(c.citation_key_property_name): return
+        match = matcher.match_note(obsidian_note)
+        matches.append((obsidian_note.filepath, match))
+        if match is None or match.confidence < min_confidence or match.citation_key in claimed_keys: return
+        claimed_keys.add(match.citation_key)
+        obsidian_note.properties[c.citation_key_property_name] = match.citation_key
+        filled += 1
+
+    backfill()
+    print(f"Back-filled {filled} of {len(matches)} articles without a citation key ({len(matches) - filled} unmatched, ambiguous or already used).")
+    return matches
+
+""" NORMALISATION. """
+def normalise_title(title: str | None) -> str:
+    """ Lowercases a title and strips it of LaTeX commands, braces, accents and punctuation, so that e.g. '{DNA} in {\\"U}ber-Cells' and 'DNA in Über cells' are equal. """
+    if not title: return ''
+    title = _LATEX_COMMAND_PATTERN.sub('', title).replace('{', '').replace('}', '')
+    title = ''.join(char for char in unicodedata.normalize('NFKD', title) if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC_PATTERN.sub(' ', title.lower()).strip()
+
+def normalise_doi(doi: str | None) -> str:
+    """ Lowercases a DOI and strips any 'https://doi.org/' or 'doi:' prefix. """
+    if not doi: return ''
+    doi = doi.strip().lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:'):
+        if doi.startswith(prefix): return doi[len(prefix):].strip()
+    return doi
+
+def normalise_author(author: str | None) -> str:
+    """ Returns the normalised surname of an author given as 'Surname, First', 'First Surname' or an Obsidian link such as '[[First Surname]]'. """
+    if not author: return ''
+    author = author.strip().strip('[]')
+    surname = author.split(',', 1)[0] if ',' in author else author.split()[-1] if author.split() else ''
+    return normalise_title(surname)
+
+def normalise_year(year) -> str:
+    """ Returns the four digit year at the start of a year or date, or '' if there is none. """
+    year = str(year or '').strip()
+    return year[:4] if year[:4].isdigit() else ''
+
+def title_words(title: str) -> frozenset[str]:
+    """ Returns the words of a normalised title, without stopwords. """
+    return frozenset(word for word in title.split() if word not in STOPWORDS)
+
+def entry_keys_from_entries(bibdata_entries: Mapping) -> dict[str, tuple[str, str, str, str]]:
+    """ Computes the (normalised title, normalised DOI, normalised first author surname, year) of every entry. This looks at every entry, so it is cached by BibMatcher.from_bibtex, and should be given fully parsed entries rather than the 'mmap' backend (which would parse each entry separately). """
+    entry_keys = {}
+    for citation_key in bibdata_entries:
+        entry = bibdata_entries[citation_key]
+        authors = entry.persons.get('author', [])
+        author = normalise_title(' '.join(authors[0].last_names)) if authors else ''
+        year = normalise_year(entry.fields.get('year') or entry.fields.get('date'))
+        entry_keys[citation_key] = (normalise_title(entry.fields.get('title')), normalise_doi(entry.fields.get('doi')), author, year)
+    return entry_keys
+
+def _parse_all_entries(bibtex_location: str) -> Mapping:
+    # The entries of the whole .bib file from one pybtex parse, for when every entry is needed. The parse is only kept if constants.bibdata is loaded anyway.
+    if 'bibdata' in vars(c) and os.path.abspath(c.bibtext_location) == bibtex_location: return c.bibdata.entries
+    from pybtex.database.input import bibtex
+    return bibtex.Parser().parse_file(bibtex_location).entries
+
+def _first_value(value) -> str | None:
+    # Properties can be lists (e.g. of authors), in which case the first value is used
+    if isinstance(value, list): return value[0] if value else None
+    return value
@@ -0,0 +1,147 @@
+""" File for replacing many terms at once in the body text of notes, e.g. normalising hundreds of journal abbreviations or author spellings across a vault.
+
+Rather than calling str.replace once per term (which goes over the text once for each term), every term is compiled into a single regular expression, built from a trie of the terms so that terms sharing a prefix share the work of matching it. Each body is then rewritten in one pass, at each position taking the longest term which matches there.
+The same pass skips over the parts of a note which should not be rewritten: code blocks, inline code, the targets of [[links]] and [markdown](links), and URLs. Only the body is ever rewritten, never the properties.
+
+Example usage:
+    bulk_replace({'J. Biol. Chem.': 'Journal of Biological Chemistry', 'Nat. Commun.': 'Nature Communications'})
+
+    replacer = BulkReplacer(abbreviations)
+    pipeline = Pipeline([replacer, update_journals])   # also usable as a stage of a pipeline
+    pipeline.run()
+    print(replacer.report())
+"""
+import re
+import hashlib
+import threading
+from collections import Counter
+from collections.abc import Mapping
+
+# Parts of a note which are never rewritten, matched before any term at the same position
+_CODE_PATTERNS = [
+    r"^[ \t]*(?P<fence>`{3,}|~{3,}).*?(?:^[ \t]*(?P=fence)[ \t]*$|\Z)",  # fenced code block (to the end of the note if it is never closed)
+    r"(?P<ticks>`+)[^\n]*?(?P=ticks)",  # inline code
+]
+_LINK_PATTERNS = [
+    r"\[\[[^\]|\n]*",  # the target of a [[link]] or ![[embed]], up to any '|alias' (which is rewritten)
+    r"\]\([^)\n]*\)",  # the target of a [markdown](link)
+    r"\b[a-z][a-z0-9+.-]*://[^\s)\]>]+",  # a URL
+]
+
+class BulkReplacer:
+    """
+    Class replacing many terms at once in the body text of notes. Call it on a note (e.g. as a function passed to process_articles, or as a stage of a Pipeline) to rewrite the note's body.
+
+    The number of replacements made for each term is counted across every note the replacer is called on (except when run with process workers, whose counts stay in the workers).
+
+    Args:
+        replacements (Mapping[str, str]): The text to put in place of each term.
+        whole_words (bool, optional): Whether terms only match as whole words, e.g. so that 'Nat' does not match inside 'Nature'.
+        ignore_case (bool, optional): Whether terms match whatever their case. The replacement is the same whatever the case of the matched text.
+        skip_code (bool, optional): Whether to leave code blocks and inline code untouched.
+        skip_links (bool, optional): Whether to leave the targets of links and embeds, and URLs, untouched (link aliases are still rewritten).
+    """
+    __name__ = 'bulk_replace'  # so that the replacer can be reported like a function, e.g. as a pipeline stage
+
+    def __init__(self, replacements: Mapping[str, str], whole_words: bool = True, ignore_case: bool = False, skip_code: bool = True, skip_links: bool = True):
+        self.replacements = {term: replacement for term, replacement in replacements.items() if term}
+        self.ignore_case = ignore_case
+        self._lookup = {_fold(term, ignore_case): term for term in self.replacements}  # matched text (folded if ignoring case) -> term
+        self.hits: Counter = Counter()  # term -> number of replacements
+        self.notes_changed = 0
+        self._lock = threading.Lock()  # thread workers share the counts
+
+        term_pattern = trie_pattern(self._lookup)
+        if whole_words: term_pattern = rf"(?<!\w)(?:{term_pattern})(?!\w)"
+        skip_patterns = (_CODE_PATTERNS if skip_code else []) + (_LINK_PATTERNS if skip_links else [])
+        pattern = '|'.join([f"(?:{skip_pattern})" for skip_pattern in skip_patterns] + [f"(?P<term>{term_pattern})"])
+        self.pattern = re.compile(pattern, re.MULTILINE | re.DOTALL | (re.IGNORECASE if ignore_case else 0))
+
+        # Identifies the replacer in the journal of a run (see run_journal.py), so that a run with other replacements or options is never resumed as this one
+        settings = (sorted(self.replacements.items()), whole_words, ignore_case, skip_code, skip_links)
+        self.run_key = (__name__, 'BulkReplacer', hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()[:16])
+
+    def __call__(self, obsidian_note) -> None:
+        """ Rewrites the body text of a note. The note is left untouched (so it is not rewritten) if no term was found. """
+        if not self.replacements or not obsidian_note.body_text: return
+        new_body, hits = self.replace('\n'.join(obsidian_note.body_text))
+        if not hits: return
+        obsidian_note.body_text = new_body.split('\n')
+        with self._lock:
+            self.hits.update(hits)
+            self.notes_changed += 1
+
+    # Pickled (e.g. to send to process workers) without the lock, which cannot be pickled
+    def __getstate__(self): return {name: value for name, value in self.__dict__.items() if name != '_lock'}
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def replace(self, text: str) -> tuple[str, Counter]:
+        """ Replaces every term in a piece of text, in a single pass. Returns the new text, and the number of replacements made for each term. """
+        hits = Counter()
+
+        def replace_match(match) -> str:
+            if match.group('term') is None: return match.group(0)  # skipped part of the note
+            term = self._lookup.get(_fold(match.group('term'), self.ignore_case))
+            if term is None: return match.group(0)
+            hits[term] += 1
+            return self.replacements[term]
+
+        return self.pattern.sub(replace_match, text), hits
+
+    def report(self) -> str:
+        """ Returns a table of the number of replacements made for each term found, most frequent first. """
+        width = max([len(term) for term in self.hits] + [4]) + 2
+        lines = [f"{'Term':<{width}}{'Replacements':>12}"]
+        lines += [f"{term:<{width}}{count:>12}" for term, count in self.hits.most_common()]
+        lines.append(f"{sum(self.hits.values())} replacements of {len(self.hits)} of {len(self.replacements)} terms, in {self.notes_changed} notes.")
+        return '\n'.join(lines)
+
+def bulk_replace(replacements: Mapping[str, str], limit: int = -1, write: bool = True, yield_all_files: bool = False, workers: int = 1, where=None, **options) -> BulkReplacer:
+    """
+    Replaces many terms at once in the body text of every article (or every note), then prints the number of replacements made for each term.
+
+    Args:
+        replacements (Mapping[str, str]): The text to put in place of each term.
+        limit, write, yield_all_files, workers, where: As for process_articles (only the thread executor is used, so that the counts are collected).
+        **options: Passed to BulkReplacer (whole_words, ignore_case, skip_code, skip_links).
+
+    Returns:
+        BulkReplacer: The replacer, holding the counts.
+    """
+    from .decorators import process_articles
+    replacer = BulkReplacer(replacements, **options)
+    process_articles(limit=limit, write=write, yield_all_files=yield_all_files, workers=workers, where=where)(replacer)()
+    print(replacer.report())
+    return replacer
+
+def trie_pattern(terms) -> str:
+    """
+    Returns a regular expression matching any of the given terms, built from a trie of the terms so that each shared prefix is only matched once, e.g. ['cat', 'car', 'cart'] gives 'ca(?:t|rt?)'.
+
+    At each position, the pattern matches the longest term which matches there (as long as whatever follows the pattern also matches).
+    """
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for char in term: node = node.setdefault(char, {})
+        node[''] = True  # marks the end of a term
+
+    def node_pattern(node: dict) -> str:
+        is_end = '' in node
+        branches = [re.escape(char) + node_pattern(child) for char, child in node.items() if char]
+        if not branches: return ''
+        # Single characters are grouped into a class, e.g. '[st]' rather than '(?:s|t)'
+        single_chars = [branch for branch in branches if len(branch) == 1 or (len(branch) == 2 and branch[0] == '\\')]
+        if len(single_chars) > 1:
+            branches = [branch for branch in branches if branch not in single_chars] + [f"[{''.join(single_chars)}]"]
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if is_end: pattern = f"{pattern}?" if len(branches) > 1 or len(pattern) == 1 else f"(?:{pattern})?"
+        return pattern
+
+    return node_pattern(trie) or r"(?!)"  # no terms: never match
+
+def _fold(text: str, ignore_case: bool) -> str:
+    # Lowercased rather than casefolded, to match how the pattern itself ignores case
+    return text.lower() if ignore_case else text
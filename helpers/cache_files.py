@@ -0,0 +1,33 @@
+""" File for reading and writing the cache files kept in the cache folder (e.g. the parsed BibTex library, its offset index and the keys of the BibTex matcher). Each cache file starts with a key identifying what the cached data was built from, such as the path, size and modification time of the .bib file, so that a stale cache is rejected without loading the data itself. """
+import os
+import pickle
+import logging
+
+def file_key(filepath: str) -> tuple:
+    """ Returns a key which changes whenever the file changes: its path, size and modification time. Raises an OSError if the file does not exist. """
+    stat = os.stat(filepath)
+    return (filepath, stat.st_size, stat.st_mtime_ns)
+
+def read_cache(cache_path: str, cache_key: tuple):
+    """ Reads a cache file if it exists and matches the given key. Returns None otherwise. """
+    if not os.path.exists(cache_path): return None
+    try:
+        with open(cache_path, 'rb') as file:
+            # The key is stored as a separate pickle before the data, so stale caches can be rejected without loading them
+            if pickle.load(file) != cache_key: return None
+            return pickle.load(file)
+    except Exception as error:
+        logging.warning(f"Warning: could not read cache file '{cache_path}' ({error})... rebuilding.")
+        return None
+
+def write_cache(cache_path: str, cache_key: tuple, data) -> None:
+    """ Atomically writes a cache file (via a temporary file), so an interrupted run cannot leave a corrupt cache. """
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump(cache_key, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as error:
+        logging.warning(f"Warning: could not write cache file '{cache_path}' ({error}).")
@@ -0,0 +1,225 @@
+""" Command line interface of the project, run with `python -m helpers` from the root of the repository. Settings which would otherwise be edited in constants.py (the vault, excluded folders, .bib file, ...) can be given as options or in a config file, and processor functions are named as `module:function` rather than being run from main.py.
+
+Heavy modules (pybtex, regex, asyncio, ...) are only imported by the commands which use them, so commands which only look at the vault index (e.g. `tags`) start quickly.
+
+Example usage:
+    python -m helpers --vault ~/Vault --bib ~/Zotero/library.bib run my_functions:update_journals --workers 4
+    python -m helpers --config vault.toml run my_functions:update_journals --workers 4 --resume   # after a run with --checkpoint was interrupted
+    python -m helpers --config vault.toml tags document --descendants
+    python -m helpers --config vault.toml properties --all-notes
+    python -m helpers --config vault.toml rename-tag topic/bio topic/biology --dry-run
+    python -m helpers --config vault.toml replace abbreviations.json
+    python -m helpers --config vault.toml watch my_functions:update_journals my_functions:reorder_properties
+
+A config file is a JSON or TOML file whose keys are the names of settings in constants.py, e.g.:
+    vault_path = "/home/me/Vault"
+    bibtext_location = "/home/me/Zotero/library.bib"
+    excluded_folders = ["Templates"]
+    article_tags = ["document/article", "document/book"]
+Options given on the command line take precedence over the config file, which takes precedence over constants.py.
+"""
+import os
+import sys
+import json
+import argparse
+import importlib
+import importlib.util
+
+import constants as c
+
+# Settings from constants.py which can be set in a config file
+SETTINGS = ('vault_path', 'excluded_folders', 'excluded_patterns', 'relative_bibtex_location', 'bibtext_location', 'citation_key_property_name', 'article_tags', 'bibtex_backend', 'cache_folder', 'use_vault_index')
+
+def main(argv: list[str] | None = None) -> int:
+    """ Runs the command line interface with the given arguments (defaulting to sys.argv), returning the exit code. """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        settings = load_config(args.config) if args.config else {}
+    except (OSError, ValueError) as error:
+        parser.error(f"could not read config file '{args.config}' ({error})")
+    settings.update({name: value for name, value in (
+        ('vault_path', args.vault), ('bibtext_location', args.bib), ('excluded_folders', args.exclude),
+        ('excluded_patterns', args.exclude_pattern), ('article_tags', args.article_tag), ('cache_folder', args.cache_folder),
+    ) if value is not None})
+    if args.no_index: settings['use_vault_index'] = False
+
+    try:
+        apply_settings(settings)
+    except ValueError as error:
+        parser.error(str(error))
+    if not os.path.isdir(c.vault_path): parser.error(f"vault '{c.vault_path}' does not exist (set it with --vault, a config file or constants.py)")
+    return args.command(args) or 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """ Returns the parser for the command line arguments. Each subcommand stores its handler as `command`. """
+    parser = argparse.ArgumentParser(prog='python -m helpers', description="Run functions over the notes of an Obsidian vault.")
+    parser.add_argument('--config', help="JSON or TOML file of settings, named as in constants.py.")
+    parser.add_argument('--vault', help="Path to the vault.")
+    parser.add_argument('--bib', help="Path to the .bib file.")
+    parser.add_argument('--exclude', action='append', metavar='FOLDER', help="Folder (relative to the vault) to skip. Can be given several times.")
+    parser.add_argument('--exclude-pattern', action='append', metavar='GLOB', help="Glob-style pattern of folders or files to skip. Can be given several times.")
+    parser.add_argument('--article-tag', action='append', metavar='TAG', help="Tag identifying articles. Can be given several times.")
+    parser.add_argument('--cache-folder', help="Folder to keep caches (e.g. the vault index) in.")
+    parser.add_argument('--no-index', action='store_true', help="Do not load or save the vault index.")
+    subparsers = parser.add_subparsers(title='commands', required=True)
+
+    run = subparsers.add_parser('run', help="Run a function over the articles (or notes) of the vault, as process_articles.")
+    run.add_argument('function', help="The function to run, as 'module:function' (the module can also be a path to a .py file, though not with the process executor).")
+    _add_run_arguments(run)
+    run.add_argument('--workers', type=int, default=1, help="Number of notes to process at once (default 1).")
+    run.add_argument('--executor', choices=('thread', 'process', 'async'), default='thread', help="Type of worker pool to use when workers > 1 (default thread).")
+    run.add_argument('--instrument', action='store_true', help="Print a breakdown of where the time was spent.")
+    run.add_argument('--stats', metavar='PATH', help="Write the collected statistics to a JSON file.")
+    run.add_argument('--checkpoint', action='store_true', help="Record the progress of the run, so that it can be resumed with --resume if it is interrupted.")
+    run.add_argument('--resume', action='store_true', help="Continue the previous run of the function (with the same options) where it stopped, if it was interrupted and run with --checkpoint.")
+    run.set_defaults(command=_run_command)
+
+    watch = subparsers.add_parser('watch', help="Keep running, applying functions to notes as they are created or modified.")
+    watch.add_argument('functions', nargs='+', metavar='function', help="The functions to run, as 'module:function', in order.")
+    watch.add_argument('--dry-run', action='store_true', help="Run the functions without writing any notes.")
+    watch.add_argument('--debounce', type=float, default=1.0, help="Seconds without a change before a batch of notes is processed (default 1).")
+    watch.add_argument('--backend', choices=('auto', 'inotify', 'poll'), default='auto', help="How changes are picked up (default auto).")
+    watch.set_defaults(command=_watch_command)
+
+    tags = subparsers.add_parser('tags', help="List the tags of the vault (under a prefix), with the number of notes with each.")
+    tags.add_argument('prefix', nargs='?', default='', help="Only list this tag and the tags nested under it.")
+    tags.add_argument('--descendants', action='store_true', help="Count notes with nested tags towards each tag.")
+    tags.set_defaults(command=_tags_command)
+
+    properties = subparsers.add_parser('properties', help="List the properties of the articles (or notes), with the number of notes with each, flagging properties which are lists in some notes and single values in others.")
+    properties.add_argument('--all-notes', action='store_true', help="Look at every note, not only articles.")
+    properties.set_defaults(command=_properties_command)
+
+    rename_tag = subparsers.add_parser('rename-tag', help="Rename (or merge) tags, and the tags nested under them, in every note.")
+    rename_tag.add_argument('old_tags', nargs='+', metavar='old_tag', help="The tags to rename.")
+    rename_tag.add_argument('new_tag', help="The new name of the tags.")
+    rename_tag.add_argument('--dry-run', action='store_true', help="Only report how many notes would be rewritten.")
+    rename_tag.set_defaults(command=_rename_tag_command)
+
+    replace = subparsers.add_parser('replace', help="Replace many terms at once in the body text of notes.")
+    replace.add_argument('mapping', help="JSON file of {term: replacement}, or a CSV/TSV file with a term and its replacement on each line.")
+    _add_run_arguments(replace)
+    replace.add_argument('--ignore-case', action='store_true', help="Match terms whatever their case.")
+    replace.add_argument('--partial-words', action='store_true', help="Also match terms inside longer words.")
+    replace.set_defaults(command=_replace_command)
+    return parser
+
+def _add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--limit', type=int, default=-1, help="Number of notes to process (default all).")
+    parser.add_argument('--dry-run', action='store_true', help="Run without writing any notes.")
+    parser.add_argument('--all-notes', action='store_true', help="Run on every note, not only articles.")
+
+""" SETTINGS. """
+def load_config(path: str) -> dict:
+    """ Reads a JSON or TOML (.toml) config file of settings. """
+    if path.lower().endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as file: return tomllib.load(file)
+    with open(path, 'r', encoding='utf-8') as file: return json.load(file)
+
+def apply_settings(settings: dict) -> None:
+    """ Sets the given settings in constants.py for this run. If the vault is changed but the .bib file is not, the .bib file is looked for at the same relative location in the new vault. Raises a ValueError for unknown settings. """
+    unknown = [name for name in settings if name not in SETTINGS]
+    if unknown: raise ValueError(f"unknown settings {unknown}; must be among {SETTINGS}")
+    for name, value in settings.items():
+        if name in ('vault_path', 'bibtext_location', 'cache_folder'): value = os.path.expanduser(value)
+        setattr(c, name, value)
+    if 'bibtext_location' not in settings and ({'vault_path', 'relative_bibtex_location'} & settings.keys()):
+        c.bibtext_location = os.path.join(c.vault_path, c.relative_bibtex_location)
+
+def load_function(name: str):
+    """ Imports a function given as 'module:function', where the module is either importable (from the current folder) or a path to a .py file. """
+    module_name, separator, function_name = name.rpartition(':')
+    if not separator or not module_name or not function_name: raise ValueError(f"'{name}' is not in the form 'module:function'")
+    if module_name.endswith('.py') or os.path.sep in module_name:
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(module_name))[0], module_name)
+        if spec is None: raise ImportError(f"cannot load '{module_name}'")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        if os.getcwd() not in sys.path: sys.path.insert(0, os.getcwd())
+        module = importlib.import_module(module_name)
+    function = module
+    for attribute in function_name.split('.'): function = getattr(function, attribute)
+    return function
+
+""" COMMANDS. """
+def _run_command(args) -> int:
+    import inspect
+    from .decorators import process_articles
+    function = _load_or_exit(args.function)
+
+    # A function already decorated with @process_articles is run with the options given here instead, but keeps its filters
+    yield_all_files = args.all_notes or not getattr(function, 'articles_only', True)
+    where = getattr(function, 'where', None)
+    process_articles(
+        limit=args.limit, write=not args.dry_run, yield_all_files=yield_all_files, workers=args.workers, executor=args.executor,
+        instrument=args.instrument, stats_path=args.stats, where=where, resume=args.resume, checkpoint=args.checkpoint,
+    )(inspect.unwrap(function))()
+    return 0
+
+def _watch_command(args) -> int:
+    from .watcher import VaultWatcher
+    watcher = VaultWatcher([_load_or_exit(name) for name in args.functions], debounce=args.debounce, backend=args.backend, write=not args.dry_run)
+    watcher.run()
+    return 0
+
+def _tags_command(args) -> int:
+    from .tag_index import get_tag_index
+    counts = get_tag_index().tag_counts(args.prefix, descendants=args.descendants)
+    if not counts:
+        print(f"No tags under '{args.prefix}'." if args.prefix else "No tags in the vault.")
+        return 1
+    width = max(len(tag) for tag in counts) + 2
+    for tag in sorted(counts):
+        if counts[tag]: print(f"{tag:<{width}}{counts[tag]:>8}")
+    return 0
+
+def _properties_command(args) -> int:
+    from .property_table import load_property_table
+    table = load_property_table(yield_all_files=args.all_notes)
+    counts, mixed = table.counts(), table.mixed_kinds()
+    if not counts:
+        print("No properties in the vault.")
+        return 1
+    width = max(len(label) for label in counts) + 2
+    for label, count in counts.items():
+        kinds = f"  (a list in {mixed[label]['list']} notes, a single value in {mixed[label]['scalar']})" if label in mixed else ''
+        print(f"{label:<{width}}{count:>8}{kinds}")
+    return 0
+
+def _rename_tag_command(args) -> int:
+    from .tag_index import get_tag_index
+    get_tag_index().merge_tags(args.old_tags, args.new_tag, write=not args.dry_run)
+    return 0
+
+def _replace_command(args) -> int:
+    from .bulk_replace import bulk_replace
+    try:
+        replacements = _read_mapping(args.mapping)
+    except (OSError, ValueError) as error:
+        print(f"Error: could not read '{args.mapping}' ({error}).", file=sys.stderr)
+        return 2
+    bulk_replace(replacements, limit=args.limit, write=not args.dry_run, yield_all_files=args.all_notes, ignore_case=args.ignore_case, whole_words=not args.partial_words)
+    return 0
+
+def _read_mapping(path: str) -> dict[str, str]:
+    # A JSON object, or a CSV/TSV file of (term, replacement) rows
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as file: mapping = json.load(file)
+        if not isinstance(mapping, dict): raise ValueError("the JSON file must contain an object of {term: replacement}")
+        return {str(term): str(replacement) for term, replacement in mapping.items()}
+
+    import csv
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        rows = list(csv.reader(file, delimiter='\t' if path.lower().endswith('.tsv') else ','))
+    bad_rows = [number for number, row in enumerate(rows, start=1) if row and len(row) != 2]
+    if bad_rows: raise ValueError(f"rows {bad_rows[:5]} do not have exactly two columns")
+    return {row[0]: row[1] for row in rows if row}
+
+def _load_or_exit(name: str):
+    try:
+        return load_function(name)
+    except (ValueError, ImportError, AttributeError, OSError) as error:
+        raise SystemExit(f"Error: could not load function '{name}' ({error}).")
@@ -4,12 +4,27 @@ Currently contains two decorators:
     - process_articles: Decorator to run a function across all Obsidian article files in a vault.
     - rename_articles: Decorator to rename articles in a vault according to a defined set of rules.
 """
-from . import yield_articles, yield_notes, ObsidianNote, NoteRenamer
+import functools
+
+from . import yield_articles, yield_notes, yield_note_paths, ObsidianNote, NoteRenamer
+from .batch_runner import EXECUTORS, run_serial, run_parallel, run_pipelined, report_results
+from . import instrumentation
+from .filters import Where
+from .instrumentation import Instrumentation, instrumented
+from .run_journal import RunJournal
 
 def process_articles(
         limit: int = -1,
         write: bool = True,
         yield_all_files: bool = False,
+        workers: int = 1,
+        executor: str = 'thread',
+        instrument: bool = False,
+        profile: str | None = None,
+        stats_path: str | None = None,
+        where: Where | None = None,
+        resume: bool = False,
+        checkpoint: bool = False,
         ):
     """ Decorator factory to run a function across all Obsidian article files in a vault.
 
@@ -18,35 +33,99 @@ def process_articles(
         - Return statements can be given, but will be ignored. The decorated function will return None.
 
     Example usage:
-        @process_articles(limit=-1, exclude_subfolders=False, write=True)
+        @process_articles(limit=-1, write=True, where=has_property('journal'), workers=4)
         def delete_journal_property(obsidian_note: ObsidianNote):
             if 'journal' in obsidian_note.properties:
                 del obsidian_note.properties['journal']
+
+        @process_articles(checkpoint=True)    # a long run which can be resumed if it is interrupted, with resume=True
+        def update_journals(obsidian_note: ObsidianNote):
+            ...
     
     Args:
         limit (int): The number of files to process. If negative, will process all files.
-        write (bool): Whether to automatically write the new file after processing. If false, obsidian_file.write_file() must be called manually within the function.
+        write (bool): Whether to automatically write the new file after processing. If false, obsidian_file.write_file() must be called manually within the function. Notes which the function did not change are not rewritten.
+        yield_all_files (bool): Whether to run the function on every note in the vault, rather than only on articles.
+        workers (int): The number of notes to process concurrently. If 1 (the default), notes are processed one at a time and any exception stops the run. If greater than 1, notes are loaded, processed and written by a pool of workers; a failing note is reported at the end instead of stopping the run, and notes are still reported in vault order.
+        executor (str): The type of worker pool to use when workers > 1, either 'thread' or 'process'. Process workers require the function to be defined at the top level of a module.
+            Alternatively 'async', to run the notes through a pipeline which reads notes ahead of the function and writes them behind it, overlapping disk access with the function (which still runs on one note at a time). Useful for slow (e.g. network-mounted) vaults. Here workers is the number of notes which can be read at once, and failing notes are reported at the end as with a pool. See batch_runner.run_pipelined.
+        instrument (bool): Whether to time each phase of the run (walking the vault, reading, parsing, BibTex lookups, the function itself and writing), count files and bytes, and track the slowest notes. A summary table is printed at the end of the run. With process workers, only the time spent in the main process is broken down by phase.
+        profile (str): Either 'cprofile' or 'tracemalloc', to also profile the function's calls or the memory allocated during the run. Implies instrument=True.
+        stats_path (str): Path of a JSON file to write the collected statistics to. Implies instrument=True.
+        where (Where): Filter restricting the notes the function runs on, e.g. `where=property_is_empty('journal')` (see helpers/filters.py). The filter is tested on the indexed properties of each note, before the note is loaded. The limit counts only notes passing the filter.
+        resume (bool): Whether to continue the previous run of this function (with the same options) where it stopped, if it was interrupted (by an exception, Ctrl+C, ...) and was run with checkpoint=True, skipping the notes it had already processed. The limit counts the notes processed by both runs. Notes which failed are processed again. Implies checkpoint=True.
+        checkpoint (bool): Whether to record the progress of the run in a journal (see helpers/run_journal.py), so that it can be resumed if it is interrupted. The journal is deleted once the run finishes. Off by default, so that every run processes every note: a journal left by an interrupted run is only used when resume=True is given.
     
     Returns:
         function: A function which takes the same arguments as the supplied function and runs it on each file.
     """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}'. Must be one of {EXECUTORS}.")
+
     def decorator(func):
         """ This is the 'decorator' function which takes in the function to be decorated, and returns the 'wrapper' function which does the same thing but with the added logic. """
+        @functools.wraps(func)
         def wrapper():
             """ This is the wrapper function which will be run when we call the decorated function (after it has been decorated). It contains the decorated function, plus the additional logic. """
-            yield_func = yield_notes if yield_all_files else yield_articles
+            stats = Instrumentation(profile=profile) if (instrument or profile or stats_path) else None
+            with instrumented(stats):
+                if not (checkpoint or resume):
+                    run_notes(None)
+                else:
+                    with RunJournal('process', _run_key(func, write, yield_all_files, limit, where), resume) as journal: run_notes(journal)
+            report_stats(stats, stats_path)
+
+        def run_notes(journal: RunJournal | None):
+            run_limit, run_where = limit, where
+            if journal is not None and journal.done:
+                # Notes processed by the interrupted run are skipped before being read, and no longer count towards the limit
+                print(f"Resuming the interrupted run: skipping {len(journal.done)} notes already processed.")
+                run_where = journal.skip_done(where)
+                if limit > 0: run_limit = limit - len(journal.done)
+                if limit > 0 and run_limit <= 0: return report_results([], write)
+
+            # Each note is recorded in the journal as soon as it is finished, so that an interruption loses as little as possible
+            on_result = journal.record_result if journal is not None else None
+            if executor == 'async':
+                notes = yield_note_paths(run_limit, where=run_where) if yield_all_files else yield_articles(run_limit, where=run_where)
+                results = run_pipelined(func, notes, write, workers, on_result)
+            elif workers > 1:
+                # Pass filepaths rather than notes when all files are processed, so that the notes are also loaded by the workers
+                notes = yield_note_paths(run_limit, where=run_where) if yield_all_files else yield_articles(run_limit, where=run_where)
+                results = list(run_parallel(func, notes, write, workers, executor, on_result))
+            else:
+                yield_func = yield_notes if yield_all_files else yield_articles
+                results = list(run_serial(func, yield_func(run_limit, where=run_where), write, on_result))
+            report_results(results, write)
 
-            for note in yield_func(limit):
-                note: ObsidianNote
-                func(note)
-                if write: note.write_file()
-            print("Finished processing articles!")
+        # Remember which notes the function should run on, so that it can also be used as a stage of a Pipeline
+        wrapper.articles_only = not yield_all_files
+        wrapper.where = where
         return wrapper
     return decorator
 
+def report_stats(stats: Instrumentation | None, stats_path: str | None) -> None:
+    """ Prints the summary table of an instrumented run, and writes its statistics to a JSON file if a path is given. """
+    if stats is None: return
+    print(stats.summary())
+    if stats_path is not None: stats.dump_json(stats_path)
+
+def _run_key(func, *options) -> tuple:
+    # Identifies a run in its journal: the same function with the same options
+    # Callable objects whose behaviour depends on their own settings (e.g. a BulkReplacer and its replacements) give a run_key attribute which includes them
+    run_key = getattr(func, 'run_key', None)
+    if run_key is None: run_key = (getattr(func, '__module__', None), getattr(func, '__qualname__', getattr(func, '__name__', type(func).__name__)))
+    return tuple(run_key) + tuple(str(option) for option in options)
+
 def rename_articles(
     limit: int = -1,
     yield_all_files: bool = False,
+    instrument: bool = False,
+    profile: str | None = None,
+    stats_path: str | None = None,
+    dry_run: bool = False,
+    skip_invalid: bool = False,
+    resume: bool = False,
     ):
     """ Decorator factory to rename articles in a vault.
 
@@ -54,8 +133,10 @@ def rename_articles(
         - Take an ObsidianNote object as an argument, with no other arguments.
         - Return statements MUST be in the form of a str "new_name", OR None to skip renaming the file.
 
+    No note is moved until the function has run on every article, and the whole batch of renames is then validated (see helpers/rename_planner.py) before any note is moved: if any rename has a problem (e.g. an invalid name, or two notes renamed to the same name), nothing is renamed. Notes are moved without being rewritten, and only the notes linking to a renamed note are rewritten.
+
     Example usage:
-        @rename_articles(limit=-1, exclude_subfolders=False)
+        @rename_articles(limit=-1, dry_run=True)   # prints what would be renamed; run again without dry_run to rename
         def change_ands_to_ampersands(obsidian_article: ObsidianNote):
             if ' and ' in obsidian_article.filename:
                 new_name = obsidian_article.filename.replace(' and ', ' & ')
@@ -65,36 +146,66 @@ def rename_articles(
 
     Args:
         limit (int): The number of files to process. If negative, will process all files.
+        instrument, profile, stats_path: As for process_articles. Renaming files and rewriting links are reported as separate phases.
+        dry_run (bool): If True, only print what would be renamed (and any problems), without moving any notes or rewriting any links.
+        skip_invalid (bool): If True, carry out the valid renames when some have problems (which are reported), rather than renaming nothing.
+        resume (bool): If True, continue the previous run of this function (with the same options) where it stopped, if it was interrupted: whether it was still collecting the new names, moving the notes or rewriting the links to them. Every step is recorded in a journal as it is made (see helpers/run_journal.py).
     
     Returns:
         function: A function which takes the same arguments as the supplied function and runs it on each file.
     """
     def decorator(func):
 
+        @functools.wraps(func)
         def wrapper():
-            # First we initialise the renamer
-            renamer = NoteRenamer() 
-
-            # 'input' wrapper defined here so that we can call the function with the process_articles decorator
-            @process_articles(limit=limit, write=False, yield_all_files=yield_all_files)
+            stats = Instrumentation(profile=profile) if (instrument or profile or stats_path) else None
+            with instrumented(stats):
+                rename_notes()
+            report_stats(stats, stats_path)
+
+        def rename_notes():
+            with RunJournal('rename', _run_key(func, limit, yield_all_files, dry_run, skip_invalid), resume) as journal:
+                # First we initialise the renamer, with any renames collected by an interrupted run
+                renamer = NoteRenamer(skip_invalid)
+                for filepath, old_name, new_name in journal.renames: renamer.add(filepath, old_name, new_name)
+                if journal.moves is None: collect_renames(renamer, journal)
+                else: print("Resuming the interrupted run: finishing moving the notes and rewriting the links to them.")
+                if dry_run:
+                    print(renamer.report())
+                    return
+
+                # Move every file at once, now that the vault is no longer being walked, then rewrite the links to them
+                with instrumentation.current().phase('rename'):
+                    renamer.move_files(journal)
+                with instrumentation.current().phase('rewrite_links'):
+                    notes_rewritten = renamer.rename_files(journal)
+            instrumentation.current().count('notes_renamed', len(renamer.notes_to_rename))
+            instrumentation.current().count('notes_relinked', notes_rewritten)
+
+        def collect_renames(renamer: NoteRenamer, journal: RunJournal):
+            run_limit = limit
+            if journal.done:
+                print(f"Resuming the interrupted run: skipping {len(journal.done)} notes already processed.")
+                if limit > 0: run_limit = limit - len(journal.done)
+                if limit > 0 and run_limit <= 0: return
+
+            # 'input' wrapper defined here so that we can call the function with the process_articles decorator (whose own journal is not needed, as the notes are recorded here with their renames)
+            @process_articles(limit=run_limit, write=False, yield_all_files=yield_all_files, where=journal.skip_done(None), checkpoint=False)
             def input_func_wrapper(note: ObsidianNote):
                 # Call the decorated function: if it returns something, rename the file to this, otherwise do nothing.
                 new_name = func(note)
                 if new_name is not None:
                     new_name: str
 
-                    # Strip the file extensions
-                    old_name, new_name = note.filename.rsplit('.', 1)[0], new_name.rsplit('.', 1)[0]
-
-                    # Strip the file extension from the new name
+                    # Strip the file extension from the old name (the new name keeps any dots in it, and loses its extension when it is added to the plan)
+                    old_name = note.filename.rsplit('.', 1)[0]
                     renamer.add(note.filepath, old_name, new_name)
+                    journal.record_rename(note.filepath, old_name, new_name)
+                journal.record_done(note.filepath)
             
             # Call our wrapped function which will add a list of desired files to the renamer
             input_func_wrapper()
 
-            # Rename all the files by calling the function once in the renamer, on the list of files to rename
-            renamer.rename_files()
-
         return wrapper
     return decorator
 
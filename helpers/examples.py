@@ -10,7 +10,7 @@ def add_journal_property_to_article(article: ObsidianNote):
     if article.properties.get('journal') is None:
         citation_key = article.properties['citation key']
         journal = get_value_from_bibtex_entry(citation_key, c.bibdata_entries, 'journal')
-        article.insert_property_at_location('journal', journal, 2)
+        article.insert_property_at_location('journal', journal, 2, override_existing=True)
 
     elif article.properties['journal'] == '':
         citation_key = article.properties['citation key']
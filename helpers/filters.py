@@ -0,0 +1,101 @@
+""" File for filters on notes, which can be passed as `where=` to process_articles and the yield functions.
+
+Filters are tested on each note's path and (indexed) properties before the note itself is loaded, so a run only pays to load the notes it will actually process. Filters on the path alone are tested before the note is even read.
+
+Filters can be combined with & (and), | (or) and ~ (not).
+
+Example usage:
+    @process_articles(where=property_is_empty('journal') & path_glob('Articles/*'))
+    def add_journal(obsidian_note: ObsidianNote):
+        ...
+
+    for note in yield_notes(where=tag_prefix('project') & ~has_property('status')):
+        ...
+"""
+import os
+import fnmatch
+from collections.abc import Callable, Mapping
+
+from .obsidian_note import normalise_tag, note_tags, properties_are_article
+import constants as c
+
+class Where:
+    """
+    Class representing a filter on notes: a test of a note's path (relative to the vault) and properties.
+
+    Use the functions below (e.g. has_property) to create filters, rather than creating them directly.
+
+    Args:
+        test (Callable[[str, Mapping], bool]): Function taking the path of a note relative to the vault (with '/' separators) and its properties (None for filters on the path alone), and returning whether the note passes.
+        description (str): Description of the filter, used when it is printed.
+        path_only (bool, optional): Whether the test only looks at the path, so that it can be tested before the note is read.
+    """
+    __slots__ = ('test', 'description', 'path_only', '_parts', '_combine')
+
+    def __init__(self, test: Callable[[str, Mapping | None], bool], description: str, path_only: bool = False):
+        self.test, self.description, self.path_only = test, description, path_only
+        self._parts, self._combine = (), None
+
+    def __call__(self, filepath: str, properties: Mapping) -> bool:
+        """ Returns whether the note at the given (absolute) filepath, with the given properties, passes the filter. """
+        return self.test(_relative_path(filepath), properties)
+
+    def prefilter(self, filepath: str) -> bool:
+        """ Returns False if the note at the given filepath fails the filter whatever its properties are, so that it does not need to be read. """
+        return self._prefilter(_relative_path(filepath))
+
+    def _prefilter(self, relative_path: str) -> bool:
+        if self.path_only: return self.test(relative_path, None)
+        if self._combine == 'and': return all(part._prefilter(relative_path) for part in self._parts)
+        if self._combine == 'or': return any(part._prefilter(relative_path) for part in self._parts)
+        if self._combine == 'not' and self._parts[0].path_only: return not self._parts[0].test(relative_path, None)
+        return True  # depends on the properties
+
+    def __and__(self, other: 'Where') -> 'Where':
+        return _combined('and', (self, other), lambda path, properties: self.test(path, properties) and other.test(path, properties), f"({self} & {other})")
+
+    def __or__(self, other: 'Where') -> 'Where':
+        return _combined('or', (self, other), lambda path, properties: self.test(path, properties) or other.test(path, properties), f"({self} | {other})")
+
+    def __invert__(self) -> 'Where':
+        return _combined('not', (self,), lambda path, properties: not self.test(path, properties), f"~{self}")
+
+    def __repr__(self): return self.description
+
+def _combined(combine: str, parts: tuple['Where', ...], test, description: str) -> Where:
+    where = Where(test, description, path_only=all(part.path_only for part in parts))
+    where._parts, where._combine = parts, combine
+    return where
+
+def _relative_path(filepath: str) -> str:
+    return os.path.relpath(filepath, c.vault_path).replace('\\', '/')
+
+""" FILTERS. """
+def has_property(label: str) -> Where:
+    """ Notes which have the given property (whatever its value). """
+    return Where(lambda path, properties: label in properties, f"has_property({label!r})")
+
+def property_equals(label: str, value) -> Where:
+    """ Notes whose given property is equal to the value or, for list properties, contains it. """
+    def test(path, properties):
+        values = properties.get(label)
+        return value in values if isinstance(values, list) else values == value
+    return Where(test, f"property_equals({label!r}, {value!r})")
+
+def property_is_empty(label: str) -> Where:
+    """ Notes which do not have the given property, or where it has no value. """
+    return Where(lambda path, properties: properties.get(label) in (None, '', []), f"property_is_empty({label!r})")
+
+def tag_prefix(prefix: str) -> Where:
+    """ Notes with the given tag or one nested under it, e.g. tag_prefix('document') matches 'document' and 'document/article' (but not 'documents'). Tags are compared as Obsidian does, ignoring case and any leading '#'. """
+    prefix = normalise_tag(prefix)
+    return Where(lambda path, properties: any(tag == prefix or tag.startswith(f"{prefix}/") for tag in note_tags(properties)), f"tag_prefix({prefix!r})")
+
+def path_glob(pattern: str) -> Where:
+    """ Notes whose path relative to the vault matches a glob-style pattern, e.g. 'Articles/*' or '*/Drafts/*.md'. Note that '*' also matches '/', so 'Articles/*' includes subfolders of 'Articles'. """
+    pattern = pattern.replace('\\', '/')
+    return Where(lambda path, properties: fnmatch.fnmatch(path, pattern), f"path_glob({pattern!r})", path_only=True)
+
+def is_article() -> Where:
+    """ Notes with one of the article tags in constants.py. """
+    return Where(lambda path, properties: properties_are_article(properties), "is_article()")
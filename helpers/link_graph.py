@@ -0,0 +1,67 @@
+""" File for the link graph of a vault, which maps each note name to the files which link to it. Used so that operations such as renaming only need to open the notes which actually reference a given note. """
+from . import VaultIndex
+from .yield_functions import yield_note_records
+import constants as c
+
+class LinkGraph:
+    """
+    Class storing the links between the notes in a vault.
+
+    The outgoing links of each note are taken from the vault index, so they are only read from notes which have changed since the index was last saved. The graph is built once (on the first call to refresh) and afterwards only updated for notes whose links have changed.
+
+    Link names are the 'true link' portion of each link (see helpers/links.py), so links to headings, blocks, renamed links, links in tables and absolute links all count as links to the note itself.
+    """
+
+    def __init__(self):
+        self._outlinks: dict[str, list[str]] = {}  # filepath -> names of the notes it links to
+        self._backlinks: dict[str, set[str]] = {}  # note name -> filepaths of the notes linking to it
+        self.is_built = False
+
+    def refresh(self) -> None:
+        """ Walks the vault and brings the graph up to date with the current contents of every note. """
+        vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+        seen_filepaths = set()
+        for filepath, record in yield_note_records(vault_index=vault_index):
+            seen_filepaths.add(filepath)
+            outlinks = vault_index.outlinks(filepath, record)
+            if self._outlinks.get(filepath) != outlinks: self.update_file(filepath, outlinks)
+
+        # Remove any notes which have been deleted or moved since the last refresh
+        for filepath in [filepath for filepath in self._outlinks if filepath not in seen_filepaths]:
+            self.remove_file(filepath)
+        self.is_built = True
+
+    def update_file(self, filepath: str, outlinks: list[str]) -> None:
+        """ Sets the outgoing links of a single note, updating the backlinks of the notes it (used to) link to. """
+        self.remove_file(filepath)
+        self._outlinks[filepath] = list(outlinks)
+        for link_name in outlinks: self._backlinks.setdefault(link_name, set()).add(filepath)
+
+    def remove_file(self, filepath: str) -> None:
+        """ Removes a note and its outgoing links from the graph. """
+        for link_name in self._outlinks.pop(filepath, []):
+            backlinks = self._backlinks.get(link_name)
+            if backlinks is None: continue
+            backlinks.discard(filepath)
+            if not backlinks: del self._backlinks[link_name]
+
+    def backlinks_to(self, note_name: str) -> set[str]:
+        """ Returns the filepaths of the notes linking to the note with the given name (without its file extension). """
+        return set(self._backlinks.get(note_name, ()))
+
+    def outlinks_from(self, filepath: str) -> list[str]:
+        """ Returns the names of the notes linked to from the note at the given filepath. """
+        return list(self._outlinks.get(filepath, ()))
+
+# A single graph shared by all notes, built the first time it is needed
+_link_graph = LinkGraph()
+
+def get_link_graph(refresh: bool = False) -> LinkGraph:
+    """
+    Returns the shared link graph for the vault, building it if it has not been built yet.
+
+    Args:
+        refresh (bool, optional): If True, bring the graph up to date with any changes made to the vault since it was built (only changed notes are re-read).
+    """
+    if refresh or not _link_graph.is_built: _link_graph.refresh()
+    return _link_graph
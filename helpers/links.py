@@ -0,0 +1,31 @@
+""" File containing the patterns used to find links between notes (i.e. text in the form [[...]]). """
+import functools
+
+# Full link pattern is a simple pattern that matches any text in the form [[...]], including the brackets.
+#
+# Link name pattern is a complex pattern attempting to match the 'true link' portion of linked text (referred to as 'l'):
+#     - This includes cases of links to headings ('l#'), links to blocks ('l#^'), links with renames ('l|'), links in tables ('l\|'), and absolute links ('/l').
+#     - The link has three main parts. First is a lookbehind matching either '[[' or '/' (the start of a link).
+#     - Second is the actual link name, which is any text that is not '#', '|', '/' or '\' (the end of a link).
+#     - Finally, there is a lookahead matching either ']]', '|', '#', or '\' (the end of a link).
+#
+# The patterns need the regex module (the variable width lookbehind is not supported by re), which is slow to import, so they are only compiled when they are first used (see __getattr__ below).
+@functools.cache
+def _compile_patterns():
+    import regex
+    return regex.compile(r"\[\[.*?\]\]"), regex.compile(r"(?<=\[\[|\/)[^#|\/\\]*(?=\]\]|\||#|\\)")
+
+def __getattr__(name: str):
+    """ Module-level getter, called only for attributes which have not been set yet. Compiles the patterns on first access. """
+    if name == "FULL_LINK_PATTERN": return _compile_patterns()[0]
+    if name == "LINK_NAME_PATTERN": return _compile_patterns()[1]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+def outlinks_from_text(text: str) -> list[str]:
+    """ Returns the names of the notes linked to in a piece of text, in order of first appearance and without duplicates. """
+    outlinks = {}
+    full_link_pattern, link_name_pattern = _compile_patterns()
+    for full_link in full_link_pattern.finditer(text):
+        link_name = link_name_pattern.search(full_link.group(0))
+        if link_name is not None: outlinks[link_name.group(0)] = None
+    return list(outlinks)
@@ -1,8 +1,10 @@
 """ File allowing the batch renaming of notes. This is difficult to do normally because links are not updated if files are renamed outside of Obsidian. Includes the note renamer class and a special decorator to process all articles in a vault. """
-import regex
-
+import logging
+import functools
 from dataclasses import dataclass
-from . import yield_notes, ObsidianNote
+from . import ObsidianNote, get_link_graph, links
+from .links import outlinks_from_text
+from .rename_planner import RenamePlan, PlannedRename, resume_moves
 
 @dataclass
 class FileRef:
@@ -12,61 +14,104 @@ class FileRef:
     new_name: str
 
 class NoteRenamer:
-    def __init__(self):
+    # Patterns used to find links and the 'true link' portion of each link. See helpers/links.py for an explanation of both. Looked up when first used, as compiling them imports the (slow to import) regex module.
+    @functools.cached_property
+    def full_link_pattern(self): return links.FULL_LINK_PATTERN
+    @functools.cached_property
+    def link_name_pattern(self): return links.LINK_NAME_PATTERN
+
+    def __init__(self, skip_invalid: bool = False):
+        """
+        Args:
+            skip_invalid (bool, optional): Whether to carry out the valid renames when some renames have problems (see RenamePlan.validate), rather than renaming nothing.
+        """
         self.notes_to_rename: dict = {}
+        self.plan = RenamePlan()
+        self.skip_invalid = skip_invalid
+        self.renames_made: list[PlannedRename] | None = None  # filled in once the notes have been moved
+        self.relinks_failed: list[str] = []  # notes whose links could not be rewritten (e.g. as they were modified while being rewritten)
 
     def add(self, filepath: str, old_name: str, new_name: str):
-        """ Adds a new renaming to the list of renamings. """
-        # First, move the file to a different location
-        obsidian_note = ObsidianNote(filepath)
-        obsidian_note.replace_file(filepath.replace(old_name, new_name))
-
-        # Then add the renaming to the dictionary
+        """ Adds a new renaming to the list of renamings. The note itself is only moved by move_files (or rename_files), once every renaming has been added and the whole batch has been validated. """
+        self.plan.add(filepath, new_name)
         self.notes_to_rename[old_name] = new_name
 
+    def report(self) -> str:
+        """ Returns a report of the renamings which would be made, and any problems with them, without touching any files. """
+        return self.plan.report()
+
+    def move_files(self, journal=None) -> list[PlannedRename]:
+        """ Validates the whole batch of renamings and moves the notes to their new names, without reading or rewriting them (see RenamePlan). Called by rename_files, if it has not been called already. Returns the renamings which were made.
+
+        If given a RunJournal, each move is recorded in it, and if the journal is of an interrupted run which had started moving notes, the moves it had still to make are made instead (the renamings added to this renamer are then not used).
+        """
+        if self.renames_made is None:
+            if journal is not None and journal.moves is not None: self.renames_made = resume_moves(journal)
+            else: self.renames_made = self.plan.execute(self.skip_invalid, journal)
+            self.notes_to_rename = {rename.old_name: rename.new_name for rename in self.renames_made}
+        return self.renames_made
+
     def replace_link(self, link: str):
         """ Checks if a given link is in the dictionary and replaces it with the new name. """
         if link in self.notes_to_rename:
             return self.notes_to_rename[link]
         return link
         
-    def rename_files(self):
-        """ Called once all files are accumulated. Time efficient because it checks every link in every file only once, against the dictionary (constant lookup time). """
-
-        for obsidian_note in yield_notes(-1, exclude_subfolders=False):
-            obsidian_note: ObsidianNote
-
-            """ First we can define the regex patterns which will be used:
-                - Full link pattern is a simple pattern that matches any text in the form [[...]], including the brackets
-
-                - Link name pattern is a complex pattern attempting to match the 'true link' portion of linked text (referred to as 'l'):
-                    - This includes cases of links to headings ('l#'), links to blocks ('l#^'), links with renames ('l|'), links in tables ('l\|'), and absolute links ('/l').
-                    - The link has three main parts. First is a lookbehind matching either '[[' or '/' (the start of a link).
-                    - Second is the actual link name, which is any text that is not '#', '|', '/' or '\' (the end of a link).
-                    - Finally, there is a lookahead matching either ']]', '|', '#', or '\' (the end of a link).
-             """
-            full_link_pattern = regex.compile(r"\[\[.*?\]\]")
-            link_name_pattern = regex.compile(r"(?<=\[\[|\/)[^#|\/\\]*(?=\]\]|\||#|\\)")
-
-            # Iterate through each line of the note and check links
-            for idx in range(len(obsidian_note.body_text)):
-                full_links = regex.findall(full_link_pattern, obsidian_note.body_text[idx])
-                
-                # For each link, including the brackets
-                for full_link in full_links:
-                    # we have to pull out the link name, accounting for all possible phrasings (absolute links, links to headings, links with renames, etc.)
-                    # This can be done using the link_name_pattern - can put this into regex101.com to see how it works
-                    link_name = regex.search(link_name_pattern, full_link).group(0)
-
-                    # Get the 'new' link name (replaces old name with new name if it exists, otherwise just returns the old name)
-                    new_link_name = self.replace_link(link_name)
-
-                    # Sub the new link name into the full link only at the occurrences given by the link_name_pattern
-                    new_full_link = regex.sub(link_name_pattern, new_link_name, full_link)
-                    
-                    # Replace the full link in the text with the new full link
-                    if new_full_link != full_link:
-                        obsidian_note.body_text[idx] = obsidian_note.body_text[idx].replace(full_link, new_full_link)
-            
-            # Write the file
-            obsidian_note.write_file()
\ No newline at end of file
+    def rename_files(self, journal=None) -> int:
+        """ Called once all files are accumulated. Moves the notes to their new names (see move_files), then rewrites every link to a renamed note, and returns the number of notes which were rewritten.
+
+        The vault's link graph is used to find the notes which link to any of the renamed notes, so only those notes are opened.
+        Each of them is then checked in a single pass over its links, looking up each link name in the dictionary (constant lookup time).
+        Only the 'true link' portion of each affected link is changed, and only notes which contained an affected link are written.
+
+        If given a RunJournal, each rewritten note is recorded in it, and notes already rewritten by an interrupted run are skipped (rewriting a note twice is not safe, e.g. when two notes swap names).
+        Notes which could not be written are reported, listed in relinks_failed, and not counted.
+        """
+        self.move_files(journal)
+        if not self.notes_to_rename: return 0
+
+        # Bring the link graph up to date (the renamed notes have just been moved), then collect every note linking to an old name
+        link_graph = get_link_graph(refresh=True)
+        if journal is not None and journal.links is not None:
+            filepaths = journal.links
+        else:
+            filepaths = set()
+            for old_name in self.notes_to_rename: filepaths |= link_graph.backlinks_to(old_name)
+            filepaths = sorted(filepaths)
+            if journal is not None: journal.record_links(filepaths)
+
+        notes_rewritten = 0
+        for filepath in filepaths:
+            if journal is not None and journal.is_relinked(filepath): continue
+            obsidian_note = ObsidianNote(filepath, lazy_body=True)
+
+            new_body, links_replaced = self.replace_links('\n'.join(obsidian_note.body_text))
+            if links_replaced == 0: continue
+
+            obsidian_note.body_text = new_body.split('\n')
+            if not obsidian_note.write_file():
+                logging.warning(f"Warning: could not rewrite the links in '{filepath}'... they still point to the old names of the renamed notes.")
+                self.relinks_failed.append(filepath)
+                continue
+            link_graph.update_file(filepath, outlinks_from_text(new_body))
+            if journal is not None: journal.record_relinked(filepath)
+            notes_rewritten += 1
+        return notes_rewritten
+
+    def replace_links(self, text: str) -> tuple[str, int]:
+        """ Replaces the link name of every link to a renamed note in a piece of text. Returns the new text, and the number of links which were replaced. """
+        links_replaced = 0
+
+        def replace_full_link(full_link_match) -> str:
+            nonlocal links_replaced
+            full_link = full_link_match.group(0)
+
+            # Pull out the link name, accounting for all possible phrasings (absolute links, links to headings, links with renames, etc.)
+            link_name = self.link_name_pattern.search(full_link)
+            if link_name is None or link_name.group(0) not in self.notes_to_rename: return full_link
+
+            # Splice the new name into the link, leaving the rest of the link (headings, renames, etc.) untouched
+            links_replaced += 1
+            return full_link[:link_name.start()] + self.notes_to_rename[link_name.group(0)] + full_link[link_name.end():]
+
+        return self.full_link_pattern.sub(replace_full_link, text), links_replaced
@@ -1,10 +1,102 @@
 """ File for the ObsidianNote class. """
 import os
+import re
+import shutil
+import weakref
+import hashlib
 import logging
-from pybtex.database import Entry
+import contextlib
+from typing import TYPE_CHECKING
 
+from . import instrumentation
+from .property_store import PropertyStore, PropertyOrder
 import constants as c
 
+# pybtex is slow to import, so it is only imported when BibTex data is first looked up (and here for type hints)
+if TYPE_CHECKING: from pybtex.database import Entry
+
+def properties_contain_value(properties: PropertyStore | dict, property: str, value: str) -> bool:
+    """ Identify if a given value is associated with a given property in a properties dictionary. See ObsidianNote.property_contains_value. """
+    if not properties: return False
+    values = properties.get(property)
+    if values is None and not isinstance(properties, PropertyStore):
+        # Plain dictionaries are searched case-insensitively too
+        values = next((values for label, values in properties.items() if label.lower() == property.lower()), None)
+    if values is None: return False
+
+    value = value.lower()
+    if isinstance(values, str): return value in values.lower()
+    return any(item is not None and item.lower() == value for item in values)
+
+# Tags cannot contain spaces or commas, so a string of tags is split on them
+_TAG_SEPARATOR_PATTERN = re.compile(r'[,\s]+')
+
+def normalise_tag(tag: str) -> str:
+    """ Normalises a tag as Obsidian compares them: without a leading '#' or surrounding '/', and case-insensitively. """
+    return tag.strip().lstrip('#').strip('/').lower()
+
+def note_tags(properties: PropertyStore | dict) -> tuple[str, ...]:
+    """ Returns the normalised tags in the 'tags' property of a properties dictionary, without duplicates. The property can be a list, or a string of one or more tags (e.g. 'a, b' or '[a, b]', which are not parsed as lists). """
+    tags = split_tags(properties.get('tags') if properties else None)
+    return tuple(dict.fromkeys(normalise_tag(tag) for tag in tags if isinstance(tag, str) and normalise_tag(tag)))
+
+def split_tags(tags: list | str | None) -> list:
+    """ Returns the value of a 'tags' property as a list, splitting a string of tags into its separate tags. """
+    if isinstance(tags, str): return [tag for tag in _TAG_SEPARATOR_PATTERN.split(tags.strip().removeprefix('[').removesuffix(']')) if tag]
+    return list(tags or ())
+
+def properties_are_article(properties: PropertyStore | dict) -> bool:
+    """ Identify if a properties dictionary belongs to an article, i.e. has one of the article tags in constants.py (compared as normalised tags). """
+    return not {normalise_tag(tag) for tag in c.article_tags}.isdisjoint(note_tags(properties))
+
+class _TrackedList(list):
+    """ List which tells the note owning it whenever it is modified, so that the note can cache its serialised contents until then. """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner: 'ObsidianNote', iterable=()):
+        super().__init__(iterable)
+        self._owner = weakref.ref(owner)
+
+    def _changed(self):
+        owner = self._owner()
+        if owner is None: return
+        owner._invalidate()
+        if self is owner._body_lines: owner._body_dirty = True
+
+    # Pickle (e.g. to send to process workers) and copy as a plain list. The owning note re-tracks its containers when it is unpickled.
+    def __reduce_ex__(self, protocol): return (list, (list(self),))
+
+class _NoteProperties(PropertyStore):
+    """ PropertyStore which tells the note owning it whenever it is modified. See _TrackedList. """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner: 'ObsidianNote', items=()):
+        self._owner = weakref.ref(owner)
+        super().__init__(items)
+
+    def _changed(self, new_values=()):
+        owner = self._owner()
+        if owner is None: return
+        owner._invalidate()
+
+        # A list which the note did not create itself may still be modified through other references, without the note knowing. In that case the note stops caching its serialised contents.
+        for value in new_values:
+            if isinstance(value, list) and not (isinstance(value, _TrackedList) and value._owner() is owner):
+                owner._cache_enabled = False
+
+def _tracked_mutator(base: type, name: str):
+    """ Wraps a mutating method of a list or dictionary so that it notifies the owning note. """
+    method = getattr(base, name)
+    def mutator(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
+        return result
+    mutator.__name__ = name
+    return mutator
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_TrackedList, _name, _tracked_mutator(list, _name))
+
 class ObsidianNote():
     """
     Class to store data about a single obsidian file.
@@ -16,35 +108,55 @@ class ObsidianNote():
     
     Body text:
         - The body text of the file (everything following the properties) is stored as a list of strings, and can be accessed and modified directly.
+        - If the note is loaded with lazy_body=True, the body text is only read from the file when it is first accessed.
+
+    Memory use:
+        - Notes use __slots__, and keep the properties section and body text as single strings until they are needed: the properties are only parsed when first accessed, and the body text is only split into lines when first accessed.
+        - The serialised contents of the note (file_contents_string) are cached until the properties or body text are modified.
+
+    Writing:
+        - If only the properties have been modified, writing the note back to its own file only renders the properties section: the body is copied through byte for byte from the file, without being decoded (or even read into memory).
+        - Files are written atomically, via a temporary file which replaces the original.
     """
+    __slots__ = ('filepath', '_has_properties', '_header_text', '_properties', '_body_offset', '_body_after_newline', '_file_state', '_newline',
+                 '_body_string', '_body_lines', '_body_dirty', '_read_hash', '_serialized', '_cache_enabled', '__weakref__')
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, lazy_body: bool = False):
         """
         Initialize an ObsidianNote object with the contents of a file.
 
         Args:
             filepath (str): The path to the file to be loaded.
+            lazy_body (bool, optional): If True, only the properties section at the top of the file is read, and the body text is read the first time it is accessed. Makes checking the properties of many notes much cheaper.
 
         Attributes:
             filepath (str): Path to the file associated with this object.
-            properties_dict (dict[str, str | list[str]]): Dictionary to store properties in key-value form.
-            body_text (list[str]): List of strings representing the body text of the file.
+            properties (PropertyStore): Ordered dictionary of the properties in key-value form. Labels are looked up case-insensitively when there is no exact match (see helpers/property_store.py).
+            body_text (list[str]): List of strings representing the body text of the file. Class property (read from the file on first access if lazy_body is True).
             file_contents_list (list[str]): List of strings representing the contents of the file. Class property (read-only).
             file_contents_string (str): String representing the contents of the file. Used to write to the file. Class property (read-only).
+            bibtex_data (Entry | dict): The BibTex entry for this note, or an empty dict if there is none. Looked up lazily on access. Class property (read-only).
+            outlinks (list[str]): Names of the notes linked to from the body text. Class property (read-only).
+            backlinks (list[str]): Filepaths of the notes which link to this note, from the shared link graph of the vault. Class property (read-only).
 
         The method reads the file from the given filepath, splits its contents into
         properties and body text, and initializes the corresponding attributes.
         """
-        # Access file and store full contents as a list of strings
-        self.filepath: str = filepath
-        file_contents: list[str] = self._contents_list_from_filepath(filepath)
-
-        # Split contents into properties and body text
-        # Note that assigning to self.flat_properties will also update self.properties_dict
-        self.properties, self.body_text, self.has_properties = self._split_file_contents(file_contents)
+        # Access file and read the properties section (including the '---' lines), plus the body text unless it is loaded lazily
+        header_lines, body_offset, body_after_newline, body_string, file_state, newline = self._read_file(filepath, lazy_body)
+        self._init_from_header(filepath, header_lines, body_offset, body_after_newline, file_state, newline)
+        if body_string is not None: self._set_read_body(body_string)
 
-        # Get a reference to the relevant BibTex data for this file
-        self.bibtex_data = self._get_bibtex_data()
+    @classmethod
+    def from_header(cls, filepath: str, header_lines: list[str], body_offset: int, body_after_newline: bool, file_state: tuple[int, int] | None = None, newline: str = os.linesep) -> 'ObsidianNote':
+        """
+        Creates a lazily-loaded ObsidianNote from a properties section which has already been read (e.g. stored in the vault index), without opening the file.
+        The arguments are as returned by ObsidianNote._read_file. The body text is read from the file when it is first accessed.
+        If file_state is not given, writes of the note always render the whole file.
+        """
+        obsidian_note = cls.__new__(cls)
+        obsidian_note._init_from_header(filepath, header_lines, body_offset, body_after_newline, file_state, newline)
+        return obsidian_note
 
     """ USER FUNCTIONS. """    
     def insert_property_at_location(self, property: str, value, location: int = -1, override_existing: bool = False):
@@ -66,10 +178,10 @@ class ObsidianNote():
         """ Insert a property near to another property. Defaults to after, but can  be set to before. """
         if self._check_existing_property(property_label, override_existing) is True: return
 
-        # Get the location
-        nearby_location = list(self.properties.keys()).index(property_near)
-        new_location = nearby_location + 1 if insert_after else nearby_location
-        self._insert_property(property_label, property_value, new_location)
+        # Insert next to the other property, without rebuilding the properties
+        properties = self._store_properties()
+        if insert_after: properties.insert_after(property_label, property_value, property_near)
+        else: properties.insert_before(property_label, property_value, property_near)
 
     def property_contains_value(self, property: str, value: str) -> bool:
         """
@@ -86,32 +198,32 @@ class ObsidianNote():
             - The search is case-insensitive.
             - Returns false if the property does not exist or if the value does not exist for the property.
         """
-        if not self.properties: return False
-        if self.properties.get(property) is None: return False
-
-        property, value = property.lower(), value.lower()
-        if property not in self.properties: return False
-        if value not in self.properties[property]: return False
-        return True
+        return properties_contain_value(self.properties, property, value)
     
-    def reorder_properties_from_list(self, ordered_property_labels: list[str]) -> None:
+    def match_bibtex_entry(self):
+        """
+        Finds the BibTex entry best matching this note from its title, DOI, authors and year, for notes without a citation key property. See helpers/bibtex_matcher.py.
+
+        Returns:
+            BibMatch | None: The citation key of the best matching entry and the confidence of the match (from 0 to 1), or None if no entry is similar.
+        """
+        from .bibtex_matcher import get_bib_matcher
+        with instrumentation.current().phase('bibtex'):
+            return get_bib_matcher().match_note(self)
+
+    def reorder_properties_from_list(self, ordered_property_labels: list[str] | PropertyOrder) -> None:
         """
         Reorders the properties of an Obsidian article in a specified order.
 
         Args:
-            ordered_property_labels (list[str]): An ordered list of property labels.
+            ordered_property_labels (list[str] | PropertyOrder): An ordered list of property labels. When reordering many notes, build a PropertyOrder from the list once and pass that instead.
                 - All property labels not in this list will be moved to the end of the properties list, though remain in their order relative to one another.
                 - Ordered property labels can contain properties not currently in the file, which will be ignored.
 
         Returns:
             None
         """
-        # Generate dictionaries of ordered properties (listed in ordered_property_labels) and unlisted properties (in their original order)
-        ordered_properties = {label: self.properties[label] for label in ordered_property_labels if label in self.properties.keys()}
-        unlisted_properties = {label: values for label, values in self.properties.items() if label not in ordered_property_labels}
-
-        # Assign to properties_dict
-        self.properties = ordered_properties | unlisted_properties  # self.flat_properties will also be updated
+        self._store_properties().reorder(ordered_property_labels)
 
     def replace_file(self, filepath: str):
         """Deletes the original file associated with this object, and writes to a new filepath. Can be used simply to rename the file, or to move it to a new location. Also updates the self.filepath attribute.
@@ -122,28 +234,64 @@ class ObsidianNote():
         Returns:
             None
         """
-        os.remove(self.filepath)  # delete the original file
-        self.write_file(filepath)  # write to the new filepath
-        self.filepath = filepath  # update the filepath attribute
-
-    def write_file(self, filepath: str = None, copy: bool = False):
+        # Write the new file before deleting the original, as the body of a lazily loaded note is read from the original file
+        old_filepath = self.filepath
+        self.write_file(filepath, force=True)
+        if filepath != old_filepath:
+            # On a case-insensitive file system, a name differing only in case is the same file, which was just written: only its name changes
+            if os.path.exists(filepath) and os.path.samefile(old_filepath, filepath): os.rename(old_filepath, filepath)
+            else: os.remove(old_filepath)
+
+        # Update the filepath attribute, and record the new file as the one the note was read from
+        self.filepath = filepath
+        self._after_write(self._render_header(), self._body_has_lines())
+        self._read_hash = self._hash_contents(self.file_contents_string)
+
+    def write_file(self, filepath: str = None, copy: bool = False, force: bool = False, in_place: bool = False) -> bool:
         """Writes class contents to file.
 
         If copy is True, appends '_copy' to the filename.
+        If writing back to the note's own file and the contents are identical to what was last read (or written), the write is skipped.
+        If writing back to the note's own file and the body text has not been modified, only the properties section is rendered, and the body is copied through from the file untouched.
+        If the note's own file has been modified since it was read (e.g. in Obsidian), it is not written over, so that those changes are not lost: a warning is logged and False is returned.
+        Lines are written with the line endings of the file the note was read from ('\r\n' or '\n').
 
         Args:
             filepath: str, optional. If None, will use self.filepath.
             copy: bool, optional. If True, will append '_copy' to the filename.
+            force: bool, optional. If True, will write the file even if its contents have not changed.
+            in_place: bool, optional. If True, and the rendered properties section is exactly as long as the one in the file, overwrite it in place instead of rewriting the whole file.
+                Much cheaper for long notes, but not atomic: an interrupted write can leave the properties section half-written.
 
         Returns:
-            None
+            bool: True if the file was written, False if the write was skipped because nothing changed.
         """
         # Assign correct filepath given arguments
         if filepath is None: filepath = self.filepath
         if copy: filepath = filepath.replace('.md', '_copy.md')
 
-        with open(filepath, 'w', encoding='utf-8') as file:
-            file.writelines(self.file_contents_string)
+        # If only the properties may have changed, splice the new properties section in front of the body already in the file
+        if filepath == self.filepath and not self._body_dirty:
+            header_text = self._render_header()
+            if not force and header_text == self._header_text: return False
+            if self._file_state is not None:
+                if self._file_state != self._stat_file_state(filepath): return self._skip_modified_file()
+                self._splice_header(header_text, in_place)
+                return True
+
+        # Skip the write if the note would be written back to its own file unchanged
+        file_contents_string = self.file_contents_string
+        contents_hash = self._hash_contents(file_contents_string)
+        if not force and filepath == self.filepath and contents_hash == self._read_hash: return False
+        if filepath == self.filepath and self._file_state is not None and self._file_state != self._stat_file_state(filepath): return self._skip_modified_file()
+
+        with instrumentation.current().phase('write'):
+            bytes_written = self._write_atomically(filepath, self._with_newlines(file_contents_string).encode('utf-8'))
+            instrumentation.current().count('bytes_written', bytes_written)
+        if filepath == self.filepath:
+            self._after_write(self._render_header(), self._body_has_lines())
+            self._read_hash = contents_hash
+        return True
 
     """ INTERNAL FUNCTIONS AND PROPERTIES. """
     # Define file_contents getter which will return the properties and body text as a single list
@@ -152,7 +300,67 @@ class ObsidianNote():
         if not self.has_properties: return self.body_text
         return ['---'] + self._flat_properties_from_dict(self.properties) + ['---'] + self.body_text
     @property
-    def file_contents_string(self) -> str: return ('\n'.join(self.file_contents_list))
+    def file_contents_string(self) -> str:
+        # Equivalent to '\n'.join(self.file_contents_list), but built from the unsplit body text where possible, and cached until the note is modified
+        if self._serialized is not None: return self._serialized
+        if self._body_lines is None and self._body_string is None: self._load_body()
+
+        body_string = self._body_string if self._body_lines is None else '\n'.join(self._body_lines)
+        if not self.has_properties: contents = body_string
+        else: contents = self._join_contents('\n'.join(['---'] + self._flat_properties_from_dict(self.properties) + ['---']), body_string, self._body_has_lines())
+
+        if self._cache_enabled: self._serialized = contents
+        return contents
+    @property
+    def properties(self) -> PropertyStore:
+        # Properties are parsed from the properties section the first time they are accessed
+        if self._properties is None:
+            with instrumentation.current().phase('parse'):
+                properties = self._properties_dict_from_flat(self._header_text.split('\n')[1:-1])
+                self._properties = _NoteProperties(self, ((label, _TrackedList(self, values) if isinstance(values, list) else values) for label, values in properties.items()))
+        return self._properties
+    @properties.setter
+    def properties(self, properties: PropertyStore | dict[str, str | list[str]]):
+        self._invalidate()
+        self._properties = properties
+        # A dictionary created elsewhere may still be modified through other references, so stop caching the serialised contents
+        if not (isinstance(properties, _NoteProperties) and properties._owner() is self): self._cache_enabled = False
+    @property
+    def has_properties(self) -> bool: return self._has_properties
+    @has_properties.setter
+    def has_properties(self, has_properties: bool):
+        self._invalidate()
+        self._has_properties = has_properties
+    @property
+    def body_text(self) -> list[str]:
+        # The body text is split into lines the first time it is accessed
+        if self._body_lines is None:
+            if self._body_string is None: self._load_body()
+            self._body_lines = _TrackedList(self, self._body_string.split('\n') if self._body_has_lines() else [])
+            self._body_string = None
+        return self._body_lines
+    @body_text.setter
+    def body_text(self, body_text: list[str]):
+        # The original body is still read first, so that the hash of the original contents is known
+        if self._read_hash is None: self._load_body()
+        self._invalidate()
+        self._body_lines, self._body_string = body_text, None
+        self._body_dirty = True
+        if not (isinstance(body_text, _TrackedList) and body_text._owner() is self): self._cache_enabled = False
+    @property
+    def bibtex_data(self) -> 'Entry | dict':
+        # BibTex data is only looked up when accessed, so notes which never use it do not require the library to be loaded
+        return self._get_bibtex_data()
+    @property
+    def outlinks(self) -> list[str]:
+        # Names of the notes linked to from the (current) body text
+        from .links import outlinks_from_text
+        return outlinks_from_text('\n'.join(self.body_text))
+    @property
+    def backlinks(self) -> list[str]:
+        # Filepaths of the notes linking to this note, taken from the shared link graph of the vault (built on first use)
+        from .link_graph import get_link_graph
+        return sorted(get_link_graph().backlinks_to(self.filename.rsplit('.', 1)[0]))
     @property
     def folderpath(self) -> str: return os.path.dirname(self.filepath)
     @property
@@ -160,64 +368,231 @@ class ObsidianNote():
 
     def __repr__(self): return f"ObsidianNote(filename='{self.filename}')"
 
+    # Tracked containers refer back to their note, so they are pickled as plain containers and re-tracked when unpickled
+    def __getstate__(self) -> dict:
+        state = {name: getattr(self, name) for name in self.__slots__ if name != '__weakref__'}
+        state['_serialized'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items(): object.__setattr__(self, name, value)
+        if self._properties is not None: self._replace_properties(self._properties)
+        if isinstance(self._body_lines, list): self._body_lines = _TrackedList(self, self._body_lines)
+
     # Define internal methods, mostly related to the processing of the file properties
-    def _contents_list_from_filepath(self, filepath: str) -> list:
+    def _init_from_header(self, filepath: str, header_lines: list[str], body_offset: int, body_after_newline: bool, file_state: tuple[int, int] | None = None, newline: str = os.linesep) -> None:
+        """ Initialises the attributes of the note from its properties section. The properties are parsed, and the body text loaded, when first accessed. """
+        self.filepath: str = filepath
+        self._has_properties: bool = bool(header_lines)
+        self._header_text: str = '\n'.join(header_lines)
+        self._properties: PropertyStore | None = None
+        self._body_offset, self._body_after_newline = body_offset, body_after_newline
+        self._file_state: tuple[int, int] | None = file_state  # (size, mtime_ns) of the file when it was read, to check it has not changed before splicing
+        self._newline: str = newline  # the line endings of the file, which are kept when it is written
+        self._body_string: str | None = None  # the body text as read, until it is split into lines
+        self._body_lines: list[str] | None = None
+        self._body_dirty: bool = False  # whether the body text may have been modified since it was read
+        self._read_hash: bytes | None = None
+        self._serialized: str | None = None
+        self._cache_enabled: bool = True
+
+    def _invalidate(self) -> None:
+        # Called whenever the note is modified, to clear the cached serialised contents
+        self._serialized = None
+
+    def _replace_properties(self, items) -> None:
+        # Replaces the properties with new (tracked) ones, given as a dictionary or (label, value) pairs
+        self._invalidate()
+        self._properties = _NoteProperties(self, items)
+
+    def _body_has_lines(self) -> bool:
+        # An empty body is only an (empty) line if it follows the closing '---' line's newline, matching file.readlines()
+        if self._body_lines is not None: return bool(self._body_lines)
+        if self._body_string is not None: return bool(self._body_string) or self._body_after_newline
+        if self._file_state is not None: return self._file_state[0] > self._body_offset or self._body_after_newline
+        self._load_body()
+        return bool(self._body_string) or self._body_after_newline
+
+    def _render_header(self) -> str:
+        # The properties section as it would be written, including the '---' lines (or nothing, if the note has no properties)
+        if not self.has_properties: return ''
+        return '\n'.join(['---'] + self._flat_properties_from_dict(self.properties) + ['---'])
+
+    def _splice_header(self, header_text: str, in_place: bool) -> None:
+        """ Writes a new properties section to the note's own file, followed by the body bytes already in the file. """
+        body_has_lines = self._body_has_lines()
+        header_bytes = self._with_newlines(f"{header_text}\n" if header_text and body_has_lines else header_text).encode('utf-8')
+
+        with instrumentation.current().phase('write'):
+            if in_place and self._header_text and len(header_bytes) == self._body_offset:
+                with open(self.filepath, 'r+b') as file: file.write(header_bytes)
+                instrumentation.current().count('writes_in_place')
+                bytes_written = len(header_bytes)
+            else:
+                bytes_written = self._write_atomically(self.filepath, header_bytes, body_offset=self._body_offset)
+                instrumentation.current().count('writes_spliced')
+            instrumentation.current().count('bytes_written', bytes_written)
+
+        self._after_write(header_text, body_has_lines)
+        # The hash of the new contents is only known if the body has been read (otherwise it is hashed when the body is read)
+        self._read_hash = None if self._body_string is None and self._body_lines is None else self._hash_contents(self.file_contents_string)
+
+    def _after_write(self, header_text: str, body_has_lines: bool) -> None:
+        # Records where the body now starts in the file, so that later writes (and lazy body reads) use the new layout
+        # The properties are parsed first if need be, as they are parsed from the properties section which is about to be replaced
+        if self._properties is None: self.properties
+        self._header_text = header_text
+        self._body_offset = len(self._with_newlines(f"{header_text}\n" if header_text and body_has_lines else header_text).encode('utf-8'))
+        self._body_after_newline = body_has_lines  # an empty body still counts as a line, as it did before the write
+        self._file_state = self._stat_file_state(self.filepath)
+        self._body_dirty = False
+
+    def _with_newlines(self, text: str) -> str:
+        # Text rendered with '\n' line endings, converted to those of the file
+        return text if self._newline == '\n' else text.replace('\n', self._newline)
+
+    @staticmethod
+    def _stat_file_state(filepath: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _write_atomically(filepath: str, contents: bytes, body_offset: int | None = None) -> int:
         """
-        Read and return the contents of a file as a list of strings.
+        Writes a file atomically, via a temporary file which then replaces it, so an interrupted write cannot leave a half-written note.
 
         Args:
-            filepath (str, optional): The path to the file to be read.
+            filepath (str): The path of the file to write.
+            contents (bytes): The bytes to write.
+            body_offset (int, optional): If given, the bytes of the existing file from this offset onwards are copied after the contents.
 
         Returns:
-            list: A list of strings representing the lines of the file, with trailing newline characters removed.
-
-        Raises:
-            FileNotFoundError: If the file specified by filepath does not exist.
+            int: The number of bytes written.
         """
-        with open(filepath, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            if lines and lines[-1].endswith('\n'):
-                lines.append('')
-            return [line.rstrip('\n') for line in lines]
-
-    def _split_file_contents(self, file_contents: list[str]) -> tuple[dict, list]:
+        temp_path = f"{filepath}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(contents)
+                if body_offset is not None:
+                    with open(filepath, 'rb') as original:
+                        original.seek(body_offset)
+                        shutil.copyfileobj(original, file)
+                bytes_written = file.tell()
+            if os.path.exists(filepath): shutil.copymode(filepath, temp_path)
+            os.replace(temp_path, filepath)
+        except BaseException:
+            with contextlib.suppress(OSError): os.remove(temp_path)
+            raise
+        return bytes_written
+
+    @staticmethod
+    def _join_contents(header_text: str, body_string: str, body_has_lines: bool) -> str:
+        # Joins the properties section and the body text with a newline, as '\n'.join() would join their lines
+        if not header_text: return body_string
+        return f"{header_text}\n{body_string}" if body_has_lines else header_text
+
+    @classmethod
+    def _read_file(cls, filepath: str, lazy_body: bool) -> tuple[list[str], int, bool, str | None, tuple[int, int], str]:
         """
-        Splits the contents of the file into a dictionary of properties and a list of body text.
+        Reads the properties section at the top of a file and, unless lazy_body is True, the body text which follows it.
+        The file is read line by line only until the closing '---' line, so that the properties of long notes can be read cheaply.
 
         Args:
-            file_contents (list[str]): The contents of the file as a list of strings.
+            filepath (str): The path to the file to be read.
+            lazy_body (bool): If True, stop reading once the properties section has been read.
 
         Returns:
-            tuple[list, list]: A tuple containing two lists. The first list contains the 'flat' properties
-                and the second list contains the body text.
+            tuple: A tuple containing:
+                - The lines of the properties section, including both '---' lines (empty if the file has no properties).
+                - The byte offset in the file at which the body text starts.
+                - Whether the body text follows a closing '---' line ending in a newline (in which case even an empty body is one empty line).
+                - The body text as a single string with '\n' line endings, or None if it was not read.
+                - The (size, mtime_ns) of the file when it was read.
+                - The line ending of the file, taken from its first line ('\r\n' or '\n', or os.linesep if the file has a single line).
+
+        Raises:
+            FileNotFoundError: If the file specified by filepath does not exist.
         """
-        default = ({}, file_contents, False)  # default return value
-        if not file_contents or not file_contents[0].startswith("---"): return default
-
-        # Find indexes for first two instances of '---' line to identify properties
-        for line_idx, line in enumerate(file_contents):
-            if line_idx == 0: continue
-            if line.startswith("---"): break
-        else: 
-            return default  # return default if properties are not found (no closing '---' line)
-        
-        # If properties found, return the properties and body text (excluding '---' lines)
-        return self._properties_dict_from_flat(file_contents[1: line_idx]), file_contents[line_idx+1:], True
-    
+        with instrumentation.current().phase('read'), open(filepath, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            header_lines = []
+            first_line = file.readline()
+            newline = '\r\n' if first_line.endswith(b'\r\n') else '\n' if first_line.endswith(b'\n') else os.linesep
+
+            # Properties start with a '---' line and end with the next '---' line
+            if first_line.startswith(b'---'):
+                header_lines.append(first_line)
+                for line in iter(file.readline, b''):
+                    header_lines.append(line)
+                    if line.startswith(b'---'): break
+                else:
+                    header_lines = []  # no closing '---' line, so the whole file is body text
+
+            body_offset = file.tell() if header_lines else 0
+            body_after_newline = bool(header_lines) and header_lines[-1].endswith(b'\n')
+            body_string = None
+            if not lazy_body:
+                file.seek(body_offset)
+                body_string = cls._body_string_from_bytes(file.read())
+            instrumentation.current().count('bytes_read', file.tell())
+
+        header_lines = [line.decode('utf-8').rstrip('\r\n') for line in header_lines]
+        return header_lines, body_offset, body_after_newline, body_string, (stat.st_size, stat.st_mtime_ns), newline
+
+    def _load_body(self) -> None:
+        """ Reads the body text from the file, for notes loaded with lazy_body=True. """
+        with instrumentation.current().phase('read'), open(self.filepath, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if self._file_state is None or self._file_state == (stat.st_size, stat.st_mtime_ns):
+                file.seek(self._body_offset)
+                self._set_read_body(self._body_string_from_bytes(file.read()))
+                instrumentation.current().count('bytes_read', file.tell() - self._body_offset)
+                return
+
+        # The file has been modified since its properties were read, so the body may no longer start at the recorded offset: read the whole file again, and take the body from it
+        # The note keeps the state of the file as first read, so it is still not written over the changes (see write_file)
+        self._set_read_body(self._read_file(self.filepath, lazy_body=False)[3])
+
+    def _skip_modified_file(self) -> bool:
+        # Called instead of writing the note's own file if the file has been modified since it was read
+        logging.warning(f"Warning: '{self.filepath}' was modified after it was read, so it was not written (to keep the changes made to it).")
+        return False
+
+    def _set_read_body(self, body_string: str) -> None:
+        # Remember a hash of what was read, so that writing an unchanged note can be skipped
+        self._body_string = body_string
+        self._read_hash = self._hash_contents(self._join_contents(self._header_text, body_string, self._body_has_lines()))
+
+    @staticmethod
+    def _hash_contents(file_contents_string: str) -> bytes:
+        # A short, stable hash (unlike hash(), it is the same across processes)
+        return hashlib.blake2b(file_contents_string.encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def _body_string_from_bytes(body_bytes: bytes) -> str:
+        """ Decodes the raw bytes of the body text, converting all line endings to '\n' (as reading in text mode would). """
+        return body_bytes.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
     def _check_existing_property(self, property_label: str, override_existing):
         # Checks if property exists. If overwriting, returns the old property value
-        if (property in self.properties):
+        if (property_label in self.properties):
             if not override_existing:
-                logging.warning(f"Warning: '{self.filepath}' already has a property named '{property}'.")
+                logging.warning(f"Warning: '{self.filepath}' already has a property named '{property_label}'.")
                 return True
-            return {property_label: self.properties.pop(property)}
+            return {property_label: self.properties.pop(property_label)}
         return False
     
     def _insert_property(self, property_label: str, property_value: str, location: int):
-        # Convert the dictionary to a list, insert the new property, and convert back to a dictionary
-        temp_properties_list = list(self.properties.items())
-        temp_properties_list.insert(location, (property_label, property_value)) # note when using list.insert, -1 is the last element of the list
-        self.properties = dict(temp_properties_list)  # will also update flat properties
+        # Note that as with list.insert, -1 inserts before the last property
+        self._store_properties().insert_at(property_label, property_value, location)
+
+    def _store_properties(self) -> PropertyStore:
+        # Returns the properties as a PropertyStore, converting them if a plain dictionary was assigned to self.properties
+        if not isinstance(self.properties, PropertyStore): self._replace_properties(self.properties)
+        return self._properties
     
     def _properties_dict_from_flat(self, flat_properties: list[str]) -> dict[str, str | list[str]]:
         # Initialise properties dictionary
@@ -263,12 +638,13 @@ class ObsidianNote():
     def _get_bibtex_data(self) -> dict[str, str]:
         """ Attempts to retrieve the BibTex data for the article from the global BibData object. Defaults to using the citation key as the key for the BibData dictionary.
         """
-        if (self.properties.get('citation key') is None) or \
-           (self.properties['citation key'] not in c.bibdata_entries):
-            return {}
-        
-        entry: Entry = c.bibdata_entries[self.properties['citation key']]
-        return entry
+        with instrumentation.current().phase('bibtex'):
+            if (self.properties.get('citation key') is None) or \
+               (self.properties['citation key'] not in c.bibdata_entries):
+                return {}
+            
+            entry: Entry = c.bibdata_entries[self.properties['citation key']]
+            return entry
 
     def _flat_properties_from_dict(self, properties_dict: dict[str, str | list[str]]) -> list[str]:
         """Converts a properties dictionary to a list of 'flat' properties.
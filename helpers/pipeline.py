@@ -0,0 +1,157 @@
+""" File for pipelines, which run several note functions over a vault in a single pass. Each note is read once, passed through every stage in order, and written (at most) once, instead of once per function.
+
+Example usage:
+    pipeline = Pipeline([
+        Stage(update_journals),                       # articles only (the default)
+        Stage(reorder_tags, articles_only=False),     # every note
+        reorder_properties,                           # a function decorated with @process_articles keeps its own filter
+    ])
+    pipeline.run()
+"""
+import time
+import inspect
+import logging
+import traceback
+from dataclasses import dataclass, field
+from collections.abc import Callable, Iterable
+
+from . import ObsidianNote, VaultIndex, instrumentation
+from .obsidian_note import properties_are_article
+from .filters import Where
+from .yield_functions import yield_note_records
+from .instrumentation import Instrumentation, instrumented
+import constants as c
+
+@dataclass
+class Stage:
+    """
+    Dataclass representing one stage of a pipeline.
+
+    Attributes:
+        func (Callable): The function to run on each note. Takes an ObsidianNote, and may modify it. Functions decorated with @process_articles can be given directly.
+        articles_only (bool): Whether to only run the stage on articles (notes with one of the article tags in constants.py), or on every note.
+        name (str): Name used when reporting the stage. Defaults to the name of the function.
+        where (Where): Filter restricting the notes the stage runs on (see helpers/filters.py), tested on the indexed properties of each note.
+    """
+    func: Callable
+    articles_only: bool = True
+    name: str | None = None
+    where: Where | None = None
+
+    # Statistics, filled in while the pipeline runs
+    notes_run: int = field(default=0, init=False)
+    seconds: float = field(default=0.0, init=False)
+    errors: list[tuple[str, str]] = field(default_factory=list, init=False)  # (filepath, traceback)
+
+    def __post_init__(self):
+        self.func = inspect.unwrap(self.func)  # accept functions decorated with @process_articles
+        if self.name is None: self.name = self.func.__name__
+
+class Pipeline:
+    """
+    Class running an ordered list of stages over the notes of a vault in one pass.
+
+    Notes which no stage applies to are never loaded. If a stage raises an exception, the error is reported against that stage, the remaining stages are skipped for that note and the note is not written, so a note is never left half-processed on disk.
+    """
+
+    def __init__(self, stages: list[Stage | Callable], limit: int = -1, write: bool = True):
+        """
+        Args:
+            stages (list[Stage | Callable]): The stages to run, in order. Plain functions are converted to stages, keeping the filters of functions decorated with @process_articles (yield_all_files=True means every note, and where= is kept) and otherwise only running on articles.
+            limit (int, optional): The number of notes to process. If negative, will process all notes.
+            write (bool, optional): Whether to write each note after all the stages have run (notes which were not changed are not rewritten).
+        """
+        self.stages = [stage if isinstance(stage, Stage) else Stage(stage, getattr(stage, 'articles_only', True), where=getattr(stage, 'where', None)) for stage in stages]
+        self.limit = limit
+        self.write = write
+        self.notes_written = 0
+        self.notes_unchanged = 0
+        self.notes_failed = 0
+
+    def run(self, instrument: bool = False, stats_path: str | None = None) -> None:
+        """
+        Runs the pipeline over the vault, then prints a report of each stage.
+
+        Args:
+            instrument (bool, optional): Whether to also collect the statistics described in process_articles (each stage is reported as its own phase).
+            stats_path (str, optional): Path of a JSON file to write the collected statistics to. Implies instrument=True.
+        """
+        stats = Instrumentation() if (instrument or stats_path) else None
+        with instrumented(stats):
+            idx = 0
+            for filepath, record in yield_note_records():
+                stages = self._stages_for(filepath, record.properties)
+                if not stages: continue
+
+                # Limit number of files
+                if self.limit > 0 and idx >= self.limit: break
+                idx += 1
+
+                self._run_note(record.to_note(filepath), stages)
+
+        print(self.report())
+        if stats is not None:
+            print(stats.summary())
+            if stats_path is not None: stats.dump_json(stats_path)
+
+    def run_files(self, filepaths: Iterable[str], vault_index: VaultIndex | None = None) -> list[str]:
+        """
+        Runs the pipeline over the given notes only (e.g. notes which have just changed), in the same way as run but without printing a report. Notes which no longer exist are skipped.
+
+        Args:
+            filepaths (Iterable[str]): The filepaths of the notes.
+            vault_index (VaultIndex, optional): The index to read the properties of the notes from. Defaults to the index in the cache folder, which is saved afterwards.
+
+        Returns:
+            list[str]: The filepaths of the notes which were written.
+        """
+        save_index = vault_index is None
+        if vault_index is None: vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+        written_filepaths = []
+        for filepath in filepaths:
+            try:
+                record = vault_index.get(filepath)
+            except OSError:
+                continue  # deleted (or moved) since it changed
+            stages = self._stages_for(filepath, record.properties)
+            if stages and self._run_note(record.to_note(filepath), stages): written_filepaths.append(filepath)
+        if save_index: vault_index.save()
+        return written_filepaths
+
+    def report(self) -> str:
+        """ Returns a table of the number of notes, time taken and errors of each stage, followed by the number of notes written. """
+        lines = [f"{'Stage':<30}{'Notes':>8}{'Seconds':>10}{'Errors':>8}"]
+        lines += [f"{stage.name:<30}{stage.notes_run:>8}{stage.seconds:>10.3f}{len(stage.errors):>8}" for stage in self.stages]
+        summary = f"Finished pipeline! ({self.notes_written} written, {self.notes_unchanged} unchanged"
+        if self.notes_failed: summary += f", {self.notes_failed} failed"
+        return '\n'.join(lines + [summary + ")"])
+
+    def _stages_for(self, filepath: str, properties) -> list[Stage]:
+        """ Returns the stages which apply to a note, from its (indexed) properties. """
+        is_article = properties_are_article(properties)
+        return [stage for stage in self.stages if (is_article or not stage.articles_only) and (stage.where is None or stage.where(filepath, properties))]
+
+    def _run_note(self, obsidian_note: ObsidianNote, stages: list[Stage]) -> bool:
+        """ Runs the given stages on a single note, then writes it. Returns whether the note was written. """
+        start = time.perf_counter()
+        for stage in stages:
+            stage_start = time.perf_counter()
+            try:
+                with instrumentation.current().phase(f"stage:{stage.name}"):
+                    stage.func(obsidian_note)
+            except Exception:
+                stage.errors.append((obsidian_note.filepath, traceback.format_exc()))
+                logging.error(f"Error: stage '{stage.name}' failed on '{obsidian_note.filepath}' (note not written):\n{stage.errors[-1][1]}")
+                self.notes_failed += 1
+                return False
+            finally:
+                stage.notes_run += 1
+                stage.seconds += time.perf_counter() - stage_start
+
+        written = False
+        if self.write:
+            written = obsidian_note.write_file()
+            if written: self.notes_written += 1
+            else: self.notes_unchanged += 1
+        instrumentation.current().note_finished(obsidian_note.filepath, time.perf_counter() - start)
+        return written
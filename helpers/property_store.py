@@ -0,0 +1,252 @@
+""" File for the PropertyStore class, the ordered container holding the properties of a note.
+
+Example usage:
+    properties = PropertyStore([('title', 'A paper'), ('tags', ['document/article'])])
+    properties.insert_after('journal', 'Nature', 'title')   # cheap, however many properties there are
+    properties.move_before('tags', 'title')
+    properties['Tags']                                       # case-insensitive lookup, returns ['document/article']
+
+    order = PropertyOrder(['title', 'journal', 'tags'])      # build once, reuse for every note
+    properties.reorder(order)
+"""
+from collections.abc import Iterable, Mapping, MutableMapping
+
+_END = object()  # sentinel marking both ends of the linked list of labels
+
+class PropertyOrder:
+    """
+    Class representing a precomputed order of property labels, for PropertyStore.reorder.
+
+    Build it once and reuse it for every note, rather than passing a list of labels each time.
+
+    Args:
+        labels (Iterable[str]): The property labels, in order. Matching is case-insensitive, and repeated labels keep their first position.
+    """
+    __slots__ = ('labels', 'rank')
+
+    def __init__(self, labels: Iterable[str]):
+        self.labels: list[str] = list(labels)
+        self.rank: dict[str, int] = {}
+        for label in self.labels: self.rank.setdefault(_fold(label), len(self.rank))
+
+    def __repr__(self): return f"PropertyOrder({self.labels!r})"
+
+class PropertyStore(MutableMapping):
+    """
+    Ordered mapping of property labels to values, used for ObsidianNote.properties.
+
+    It behaves like a dictionary (and compares equal to a dictionary with the same items), with some additions:
+        - The order of the labels is kept in a linked list, so inserting or moving a property before or after another one does not rebuild the mapping.
+        - Labels are looked up case-insensitively when there is no exact match (as in Obsidian, where 'Tags' and 'tags' are the same property). The label keeps the spelling it was first given.
+          The items it is created from are kept exactly as given, so a note with both 'Tags' and 'tags' keeps both (and looking up 'TAGS' finds the first).
+        - reorder() puts the labels in a given order in a single pass.
+    """
+    __slots__ = ('_values', '_folded', '_prev', '_next')
+
+    def __init__(self, items: Mapping | Iterable[tuple[str, object]] = ()):
+        self._values: dict[str, object] = {}
+        self._folded: dict[str, str] = {}  # casefolded label -> first label with that casefolding
+        self._prev: dict = {_END: _END}
+        self._next: dict = {_END: _END}
+        if isinstance(items, Mapping): items = items.items()
+        for label, value in items: self._set_exact(label, value)
+        self._changed(self._values.values())
+
+    def _changed(self, new_values: Iterable = ()) -> None:
+        """ Called after every modification, with any values which were added. Does nothing, but can be overridden. """
+        pass
+
+    """ MAPPING FUNCTIONS. """
+    def __getitem__(self, label: str):
+        return self._values[self.resolve(label)]
+
+    def __setitem__(self, label: str, value) -> None:
+        self._set(label, value)
+        self._changed((value,))
+
+    def __delitem__(self, label: str) -> None:
+        label = self.resolve(label)
+        del self._values[label]
+        self._unlink(label)
+        self._unfold(label)
+        self._changed()
+
+    def __contains__(self, label) -> bool:
+        return label in self._values or (isinstance(label, str) and _fold(label) in self._folded)
+
+    def __iter__(self):
+        label = self._next[_END]
+        while label is not _END:
+            following = self._next[label]
+            yield label
+            label = following
+
+    def __reversed__(self):
+        label = self._prev[_END]
+        while label is not _END:
+            preceding = self._prev[label]
+            yield label
+            label = preceding
+
+    def __len__(self) -> int: return len(self._values)
+
+    def get(self, label: str, default=None):
+        # Faster than the Mapping default, which goes through __getitem__ and catches the KeyError
+        if label in self._values: return self._values[label]
+        if not isinstance(label, str): return default
+        label = self._folded.get(_fold(label))
+        return default if label is None else self._values[label]
+
+    def clear(self) -> None:
+        self._values.clear()
+        self._folded.clear()
+        self._prev, self._next = {_END: _END}, {_END: _END}
+        self._changed()
+
+    def copy(self) -> 'PropertyStore': return PropertyStore(self.items())
+
+    def __or__(self, other: Mapping) -> 'PropertyStore':
+        if not isinstance(other, Mapping): return NotImplemented
+        merged = self.copy()
+        merged.update(other)
+        return merged
+
+    def __ror__(self, other: Mapping) -> 'PropertyStore':
+        if not isinstance(other, Mapping): return NotImplemented
+        merged = PropertyStore(other)
+        merged.update(self)
+        return merged
+
+    def __ior__(self, other: Mapping) -> 'PropertyStore':
+        self.update(other)
+        return self
+
+    def __repr__(self): return f"PropertyStore({dict(self.items())!r})"
+
+    # Pickled (e.g. in the vault index, or to send to process workers) as a plain PropertyStore of its items
+    def __reduce__(self): return (PropertyStore, (list(self.items()),))
+
+    """ ORDERING FUNCTIONS. """
+    def resolve(self, label: str) -> str:
+        """ Returns the label as it is spelt in the store, matching case-insensitively if there is no exact match. Returns the label unchanged if it is not in the store. """
+        if label in self._values or not isinstance(label, str): return label
+        return self._folded.get(_fold(label), label)
+
+    def index(self, label: str) -> int:
+        """ Returns the position of a property. Raises a KeyError if it does not exist. """
+        label = self.resolve(label)
+        if label not in self._values: raise KeyError(label)
+        for location, existing_label in enumerate(self):
+            if existing_label == label: return location
+
+    def insert_at(self, label: str, value, location: int) -> None:
+        """
+        Inserts a property at a position, with the same meaning of location as list.insert (so -1 inserts before the last property). An existing property with the same label is moved there, and its value replaced.
+
+        Args:
+            label (str): The label of the property.
+            value (str | list[str] | None): The value of the property.
+            location (int): The position to insert the property at.
+        """
+        label = self.resolve(label)
+        if label in self._values: self._unlink(label)
+        else: self._folded[_fold(label)] = label
+        self._values[label] = value
+
+        # Find the label currently at the location (walking from the nearer end of the list) and insert before it
+        length = len(self._values) - 1
+        if location < 0: location = max(location + length, 0)
+        if location >= length: anchor = _END
+        elif location <= length // 2: anchor = next(existing for position, existing in enumerate(self) if position == location)
+        else: anchor = next(existing for position, existing in enumerate(reversed(self)) if position == length - 1 - location)
+        self._link_before(label, anchor)
+        self._changed((value,))
+
+    def insert_before(self, label: str, value, anchor: str) -> None:
+        """ Inserts a property immediately before another one (which must exist). An existing property with the same label is moved there, and its value replaced. """
+        self._insert_next_to(label, value, anchor, after=False)
+
+    def insert_after(self, label: str, value, anchor: str) -> None:
+        """ Inserts a property immediately after another one (which must exist). An existing property with the same label is moved there, and its value replaced. """
+        self._insert_next_to(label, value, anchor, after=True)
+
+    def move_before(self, label: str, anchor: str) -> None:
+        """ Moves an existing property to immediately before another one. """
+        self._insert_next_to(label, self[label], anchor, after=False)
+
+    def move_after(self, label: str, anchor: str) -> None:
+        """ Moves an existing property to immediately after another one. """
+        self._insert_next_to(label, self[label], anchor, after=True)
+
+    def move_to_end(self, label: str, last: bool = True) -> None:
+        """ Moves an existing property to the end (or, if last is False, the start) of the properties. """
+        label = self.resolve(label)
+        if label not in self._values: raise KeyError(label)
+        self._unlink(label)
+        self._link_before(label, _END if last else self._next[_END])
+        self._changed()
+
+    def reorder(self, order: PropertyOrder | Iterable[str]) -> None:
+        """
+        Reorders the properties in a single pass over them.
+
+        Args:
+            order (PropertyOrder | Iterable[str]): The order of the labels. Build a PropertyOrder once if the same order is applied to many notes.
+                - Properties not in the order are moved to the end of the properties, though remain in their order relative to one another.
+                - The order can contain labels which are not in the store, which are ignored.
+        """
+        if not isinstance(order, PropertyOrder): order = PropertyOrder(order)
+        ordered_labels, unlisted_labels = [[] for _ in order.rank], []
+        for label in self:
+            rank = order.rank.get(_fold(label))
+            if rank is None: unlisted_labels.append(label)
+            else: ordered_labels[rank].append(label)  # labels differing only in case share a position
+
+        self._prev, self._next = {_END: _END}, {_END: _END}
+        for labels in ordered_labels + [unlisted_labels]:
+            for label in labels: self._link_before(label, _END)
+        self._changed()
+
+    """ INTERNAL FUNCTIONS. """
+    def _set(self, label: str, value) -> None:
+        self._set_exact(self.resolve(label), value)
+
+    def _set_exact(self, label: str, value) -> None:
+        # Sets the property with exactly this label, without matching case-insensitively
+        if label not in self._values:
+            self._folded.setdefault(_fold(label), label)
+            self._link_before(label, _END)
+        self._values[label] = value
+
+    def _unfold(self, label: str) -> None:
+        # After a label is removed, another label differing from it only in case takes over its case-insensitive lookups
+        folded = _fold(label)
+        if self._folded.get(folded) != label: return
+        del self._folded[folded]
+        if len(self._folded) == len(self._values): return  # no labels differ only in case
+        other = next((other for other in self if _fold(other) == folded), None)
+        if other is not None: self._folded[folded] = other
+
+    def _insert_next_to(self, label: str, value, anchor: str, after: bool) -> None:
+        label, anchor = self.resolve(label), self.resolve(anchor)
+        if anchor not in self._values: raise KeyError(anchor)
+        if label == anchor:
+            self._values[label] = value
+        else:
+            if label in self._values: self._unlink(label)
+            else: self._folded[_fold(label)] = label
+            self._values[label] = value
+            self._link_before(label, self._next[anchor] if after else anchor)
+        self._changed((value,))
+
+    def _link_before(self, label: str, anchor) -> None:
+        preceding = self._prev[anchor]
+        self._prev[label], self._next[label] = preceding, anchor
+        self._next[preceding] = self._prev[anchor] = label
+
+    def _unlink(self, label: str) -> None:
+        preceding, following = self._prev.pop(label), self._next.pop(label)
+        self._next[preceding], self._prev[following] = following, preceding
+
+def _fold(label) -> str:
+    return label.casefold() if isinstance(label, str) else label
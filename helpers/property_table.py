@@ -0,0 +1,351 @@
+""" File for the property table: the properties of many notes held in memory as columns, one per property, for operations over the properties of a whole vault at once. E.g. filling a missing property from BibTex, counting how often each property is used, finding properties whose values are sometimes a list and sometimes a single value, or reordering the properties of every article.
+
+The table is loaded from the vault index, so only notes which have changed since the index was last saved are read. Changes are made to a whole column (or a selection of rows) at a time, and only the notes whose properties actually changed are written back, with only their properties section rewritten.
+
+Example usage:
+    table = load_property_table()                              # every article; yield_all_files and where as for process_articles
+    table.counts()                                             # {'title': 50, 'citation key': 48, 'journal': 31, ...}
+    table.mixed_kinds()                                        # {'authors': Counter({'list': 40, 'scalar': 3})}
+
+    bibtex = table.join_bibtex(['journal', 'year'])            # columns of BibTex fields, aligned with the rows of the table
+    table.fill('journal', bibtex['journal'])                   # only for notes without a journal
+    table.apply('year', str.strip)
+    table.reorder(['title', 'citation key', 'journal', 'year', 'tags'])
+    table.write()                                              # writes only the notes which changed
+"""
+import os
+import logging
+import itertools
+from collections import Counter
+from collections.abc import Callable, Iterable, Sequence
+
+from . import VaultIndex
+from .obsidian_note import properties_are_article
+from .property_store import PropertyStore, PropertyOrder
+from .yield_functions import yield_note_records
+import constants as c
+
+class Column:
+    """
+    Class holding a single property across every row (note) of a PropertyTable.
+
+    Values are kept in a list with one entry per row, next to a mask of which rows have the property at all, so that a property with no value ('empty', stored as None) can be told apart from a missing one.
+    Each value is either a string ('scalar'), a list of strings ('list') or None ('empty').
+    """
+    __slots__ = ('label', 'values', 'present')
+
+    def __init__(self, label: str, size: int):
+        self.label = label  # spelling of the label when the column was created
+        self.values: list = [None] * size
+        self.present = bytearray(size)
+
+    def __len__(self) -> int: return len(self.values)
+
+    def __repr__(self): return f"Column({self.label!r}, {sum(self.present)} of {len(self)} rows)"
+
+    def kind(self, row: int) -> str:
+        """ Returns the kind of value a row has: 'missing', 'empty', 'list' or 'scalar'. """
+        if not self.present[row]: return 'missing'
+        return _kind(self.values[row])
+
+    def kinds(self) -> Counter:
+        """ Returns the number of rows with each kind of value (see kind), counting missing rows too. """
+        kinds = Counter(_kind(value) for value, present in zip(self.values, self.present) if present)
+        kinds['missing'] = len(self) - sum(self.present)
+        return +kinds
+
+    def rows(self) -> list[int]:
+        """ Returns the rows which have the property. """
+        return [row for row, present in enumerate(self.present) if present]
+
+    def resize(self, size: int) -> None:
+        """ Adds rows without the property up to the given number of rows. """
+        if size <= len(self.values): return
+        self.present.extend(bytes(size - len(self.values)))
+        self.values.extend([None] * (size - len(self.values)))
+
+class PropertyTable:
+    """
+    Class holding the properties of many notes, as one Column per property (see Column), with one row per note.
+
+    Labels are matched case-insensitively, as in Obsidian: a column holds a property however each note spells it, and each note keeps its own spelling (and its own order of properties) when it is written back.
+    Rows are referred to by their position in the table (see filepaths). Methods taking `rows` act on every row if it is not given.
+
+    Load a table with load_property_table, rather than creating one directly.
+    """
+
+    def __init__(self):
+        self.filepaths: list[str] = []
+        self.columns: dict[str, Column] = {}  # casefolded label -> column
+        self._labels: list[list[str]] = []  # the labels of each row, as spelt in the note and in order
+        self._file_states: list[tuple[int, int]] = []  # (mtime_ns, size) of each note when it was loaded
+        self._changed: set[int] = set()
+
+    @classmethod
+    def from_records(cls, records: Iterable[tuple[str, object]]) -> 'PropertyTable':
+        """ Creates a table from (filepath, IndexRecord) pairs, e.g. as yielded by yield_note_records. """
+        table = cls()
+        for filepath, record in records:
+            # A column holds one value per note, so a note with labels differing only in case (e.g. both 'Tags' and 'tags') cannot be held without losing one of them
+            if len({_fold(label) for label in record.properties}) < len(record.properties):
+                logging.warning(f"Warning: '{filepath}' has properties whose names differ only in case... leaving it out of the property table.")
+                continue
+            row = len(table.filepaths)
+            table.filepaths.append(filepath)
+            table._file_states.append((record.mtime_ns, record.size))
+            table._labels.append(list(record.properties))
+            for label, value in record.properties.items():
+                column = table._column(label, create=True)
+                column.resize(row + 1)
+                # Lists are copied, so that changes to the table never reach the (shared) index records
+                column.values[row] = list(value) if isinstance(value, list) else value
+                column.present[row] = 1
+        for column in table.columns.values(): column.resize(len(table))
+        return table
+
+    def __len__(self) -> int: return len(self.filepaths)
+
+    def __contains__(self, label: str) -> bool: return _fold(label) in self.columns
+
+    def __repr__(self): return f"PropertyTable({len(self)} notes, {len(self.columns)} properties, {len(self._changed)} changed)"
+
+    @property
+    def labels(self) -> list[str]:
+        """ The label of each column, as first spelt. """
+        return [column.label for column in self.columns.values()]
+
+    def column(self, label: str) -> Column:
+        """ Returns the column of a property, matching the label case-insensitively. Raises a KeyError if no note has the property. """
+        column = self._column(label)
+        if column is None: raise KeyError(label)
+        return column
+
+    def values(self, label: str, rows: Sequence[int] | None = None) -> list:
+        """ Returns the value of a property for each row (or each of the given rows), with None where the property is missing or empty. """
+        column = self._column(label)
+        if column is None: return [None] * (len(self) if rows is None else len(rows))
+        if rows is None: return list(column.values)
+        return [column.values[row] for row in rows]
+
+    def properties(self, row: int) -> PropertyStore:
+        """ Returns the properties of a single row, in the note's order and spelling, as they would be written. """
+        return PropertyStore((label, self.columns[_fold(label)].values[row]) for label in self._labels[row])
+
+    """ QUERIES. """
+    def rows_with(self, label: str) -> list[int]:
+        """ Returns the rows which have a property (including with an empty value). """
+        column = self._column(label)
+        return [] if column is None else column.rows()
+
+    def rows_without(self, label: str, include_empty: bool = True) -> list[int]:
+        """ Returns the rows which do not have a property, or (if include_empty is True) which have it with no value. """
+        column = self._column(label)
+        if column is None: return list(range(len(self)))
+        return [row for row, (value, present) in enumerate(zip(column.values, column.present)) if not present or (include_empty and _is_empty(value))]
+
+    def rows_where(self, label: str, test: Callable[[str | list[str] | None], bool]) -> list[int]:
+        """ Returns the rows which have a property whose value passes a test. """
+        column = self._column(label)
+        if column is None: return []
+        return [row for row, (value, present) in enumerate(zip(column.values, column.present)) if present and test(value)]
+
+    def counts(self) -> dict[str, int]:
+        """ Returns the number of notes with each property (including with an empty value), most used first. """
+        counts = {column.label: sum(column.present) for column in self.columns.values()}
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def value_counts(self, label: str) -> Counter:
+        """ Returns the number of notes with each value of a property. Each item of a list value is counted separately. """
+        counts = Counter()
+        for value in self.values(label, self.rows_with(label)):
+            if isinstance(value, list): counts.update(value)
+            elif value is not None: counts[value] += 1
+        return counts
+
+    def mixed_kinds(self) -> dict[str, Counter]:
+        """ Returns the properties whose values are lists in some notes and single values in others, with the number of notes of each kind (see Column.kinds). """
+        mixed = {}
+        for column in self.columns.values():
+            kinds = column.kinds()
+            if kinds['list'] and kinds['scalar']: mixed[column.label] = kinds
+        return mixed
+
+    """ BULK UPDATES. """
+    def set(self, label: str, values, rows: Sequence[int] | None = None) -> int:
+        """
+        Sets a property, adding it to the end of the properties of any row which does not have it.
+
+        Args:
+            label (str): The property.
+            values (Sequence | str | None): One value per row (or per given row), or a single string (or None, for an empty property) for every row. A list value for every row must be given once per row.
+            rows (Sequence[int], optional): The rows to set.
+
+        Returns:
+            int: The number of rows which changed.
+        """
+        rows = range(len(self)) if rows is None else rows
+        values = _per_row(values, len(rows))
+        column = self._column(label, create=True)
+        return sum(self._set(column, row, value) for row, value in zip(rows, values))
+
+    def fill(self, label: str, values, rows: Sequence[int] | None = None) -> int:
+        """ As set, but only sets the property in rows where it is missing or empty, and skips rows whose value is None (e.g. the rows with no BibTex entry in a join_bibtex column). Returns the number of rows which changed. """
+        rows = range(len(self)) if rows is None else rows
+        values = _per_row(values, len(rows))
+        column = self._column(label, create=True)
+        return sum(
+            self._set(column, row, value)
+            for row, value in zip(rows, values) if value is not None and (not column.present[row] or _is_empty(column.values[row]))
+        )
+
+    def apply(self, label: str, function: Callable, rows: Sequence[int] | None = None) -> int:
+        """ Replaces the value of a property with the result of a function of it, in every row which has the property (and is among the given rows). The function should return a new value, rather than changing a list in place. Returns the number of rows which changed. """
+        column = self._column(label)
+        if column is None: return 0
+        rows = column.rows() if rows is None else [row for row in rows if column.present[row]]
+        return sum(self._set(column, row, function(column.values[row])) for row in rows)
+
+    def delete(self, label: str, rows: Sequence[int] | None = None) -> int:
+        """ Removes a property from every row (or the given rows). Returns the number of rows which changed. """
+        column = self._column(label)
+        if column is None: return 0
+        rows = column.rows() if rows is None else [row for row in rows if column.present[row]]
+        folded = _fold(label)
+        for row in rows:
+            column.values[row], column.present[row] = None, 0
+            self._labels[row] = [existing for existing in self._labels[row] if _fold(existing) != folded]
+            self._changed.add(row)
+        return len(rows)
+
+    def reorder(self, order: PropertyOrder | Iterable[str], rows: Sequence[int] | None = None) -> int:
+        """ Reorders the properties of every row (or the given rows), as PropertyStore.reorder. Returns the number of rows whose order changed. """
+        if not isinstance(order, PropertyOrder): order = PropertyOrder(order)
+        unlisted = len(order.rank)
+        changed = 0
+        for row in range(len(self)) if rows is None else rows:
+            # Sorting is stable, so properties not in the order keep their order relative to one another
+            labels = sorted(self._labels[row], key=lambda label: order.rank.get(_fold(label), unlisted))
+            if labels == self._labels[row]: continue
+            self._labels[row] = labels
+            self._changed.add(row)
+            changed += 1
+        return changed
+
+    """ JOINS. """
+    def join_bibtex(self, fields: Iterable[str], key_label: str | None = None) -> dict[str, list[str | None]]:
+        """
+        Looks up BibTex fields for every row, by the row's citation key. Each BibTex entry is only looked up once, however many notes share its key.
+
+        Args:
+            fields (Iterable[str]): The BibTex fields, e.g. ['journal', 'year']. 'author' and 'editor' give the names joined by ' and ', as in the .bib file.
+            key_label (str, optional): The property holding the citation key. Defaults to the one set in constants.py.
+
+        Returns:
+            dict[str, list[str | None]]: For each field, its value for each row, or None where the row has no citation key, the key is not in the .bib file, or the entry does not have the field.
+        """
+        fields = list(fields)
+        keys = self.values(key_label or c.citation_key_property_name)
+        found = {}  # citation key -> tuple of field values
+        for key in set(keys):
+            if not isinstance(key, str) or not key: continue
+            entry = c.bibdata_entries[key] if key in c.bibdata_entries else None
+            if entry is not None: found[key] = tuple(_entry_field(entry, field) for field in fields)
+
+        empty = (None,) * len(fields)
+        joined = [found.get(key, empty) if isinstance(key, str) else empty for key in keys]
+        return {field: [values[index] for values in joined] for index, field in enumerate(fields)}
+
+    """ WRITING. """
+    @property
+    def changed_rows(self) -> list[int]:
+        """ The rows which have been changed since the table was loaded (or last written). """
+        return sorted(self._changed)
+
+    def write(self, rows: Sequence[int] | None = None) -> int:
+        """
+        Writes the properties of the changed rows (or of those among the given rows) back to their notes. Only the properties section of each note is rewritten.
+
+        A note which has been modified since the table was loaded is not written (and a warning is logged), so that changes made to it in the meantime are not lost.
+
+        Returns:
+            int: The number of notes which were written.
+        """
+        vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+        written = 0
+        for row in sorted(self._changed if rows is None else self._changed.intersection(rows)):
+            filepath = self.filepaths[row]
+            try:
+                record = vault_index.get(filepath)
+            except OSError:
+                logging.warning(f"Warning: '{filepath}' no longer exists, so its properties were not written.")
+                continue
+            if (record.mtime_ns, record.size) != self._file_states[row]:
+                logging.warning(f"Warning: '{filepath}' was modified after the property table was loaded, so its properties were not written.")
+                continue
+
+            obsidian_note = record.to_note(filepath)
+            obsidian_note.properties = self.properties(row)
+            obsidian_note.has_properties = obsidian_note.has_properties or bool(self._labels[row])
+            if obsidian_note.write_file():
+                written += 1
+                stat = os.stat(filepath)
+                self._file_states[row] = (stat.st_mtime_ns, stat.st_size)
+            self._changed.discard(row)
+
+        print(f"Wrote the properties of {written} notes.")
+        return written
+
+    """ INTERNAL FUNCTIONS. """
+    def _column(self, label: str, create: bool = False) -> Column | None:
+        folded = _fold(label)
+        column = self.columns.get(folded)
+        if column is None and create: column = self.columns[folded] = Column(label, len(self))
+        return column
+
+    def _set(self, column: Column, row: int, value) -> bool:
+        # Sets a single value, returning whether the row changed
+        if isinstance(value, tuple): value = list(value)
+        if column.present[row] and column.values[row] == value and _kind(column.values[row]) == _kind(value): return False
+        if not column.present[row]:
+            self._labels[row].append(column.label)
+            column.present[row] = 1
+        column.values[row] = list(value) if isinstance(value, list) else value
+        self._changed.add(row)
+        return True
+
+def load_property_table(yield_all_files: bool = False, where=None, limit: int = -1) -> PropertyTable:
+    """
+    Loads the properties of every article (or every note) in the vault into a PropertyTable. Only notes which have changed since the vault index was last saved are read.
+
+    Args:
+        yield_all_files (bool, optional): Whether to load every note, rather than only articles.
+        where (Where, optional): Filter restricting the notes loaded (see helpers/filters.py).
+        limit (int, optional): The number of notes to load. If negative, loads every note.
+    """
+    records = yield_note_records(where=where)
+    if not yield_all_files: records = ((filepath, record) for filepath, record in records if properties_are_article(record.properties))
+    if limit > 0: records = itertools.islice(records, limit)
+    return PropertyTable.from_records(records)
+
+def _fold(label: str) -> str:
+    return label.casefold()
+
+def _kind(value) -> str:
+    if value is None: return 'empty'
+    return 'list' if isinstance(value, list) else 'scalar'
+
+def _is_empty(value) -> bool:
+    return value is None or value == '' or value == []
+
+def _per_row(values, count: int) -> Sequence:
+    # A single string (or None) is used for every row; anything else must have one value per row
+    if values is None or isinstance(values, str): return [values] * count
+    if len(values) != count: raise ValueError(f"Expected one value per row ({count} values), got {len(values)}.")
+    return values
+
+def _entry_field(entry, field: str) -> str | None:
+    # Names are kept apart from the other fields by pybtex
+    persons = getattr(entry, 'persons', {})
+    if field.lower() in ('author', 'editor') and field.lower() in persons: return ' and '.join(str(person) for person in persons[field.lower()])
+    value = entry.fields.get(field)
+    return str(value) if value is not None else None
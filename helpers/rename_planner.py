@@ -0,0 +1,223 @@
+""" File for planning and carrying out a batch of note renames. The whole batch is validated before any file is touched, and the files are then moved with os.rename, which only changes the folder entry, rather than being read and written out again under the new name.
+
+Example usage:
+    plan = RenamePlan()
+    plan.add('/vault/Articles/A.md', 'B')
+    plan.add('/vault/Articles/B.md', 'A')     # swaps are moved through temporary names
+    print(plan.report())                       # dry run: what would be renamed, and any problems
+    plan.execute()
+"""
+import os
+import logging
+from dataclasses import dataclass
+
+from .vault_index import VaultIndex
+import constants as c
+
+# Characters which cannot be used in note names, either by the file system (on any platform) or by Obsidian's links
+INVALID_NAME_CHARACTERS = frozenset('*"\\/<>:|?#^[]')
+
+# Names which Windows reserves for devices, whatever the extension
+RESERVED_NAMES = frozenset(['con', 'prn', 'aux', 'nul'] + [f"{device}{number}" for device in ('com', 'lpt') for number in range(1, 10)])
+
+@dataclass
+class PlannedRename:
+    """ Dataclass representing the move of a single note. """
+    source: str
+    target: str
+    problem: str | None = None  # why the rename cannot be carried out, if it cannot
+    via_temporary: bool = False  # whether the note is first moved to a temporary name (for swaps, chains and case-only renames)
+
+    @property
+    def old_name(self) -> str: return os.path.splitext(os.path.basename(self.source))[0]
+
+    @property
+    def new_name(self) -> str:
+        # The name as given, rather than the last part of the target path, so that a name containing a path separator is caught by validate
+        return os.path.splitext(self.target[len(os.path.join(os.path.dirname(self.source), '')):])[0]
+
+class RenamePlan:
+    """
+    Class holding a batch of note renames, which are validated together before any of them is carried out.
+
+    The batch is checked for:
+        - Names which are not safe to use: empty names, names with characters that file systems or Obsidian links do not allow, names ending in a space or dot, and names reserved by Windows.
+        - Collisions: two notes renamed to the same name, or a note renamed to the name of a file which exists and is not itself being renamed. Names are compared case-insensitively, as the file systems of Windows and macOS (and Obsidian's links) do.
+        - Conflicting link updates: notes with the same name (in different folders) renamed to different names, as links to that name could not be updated for both.
+
+    Swaps (A -> B, B -> A), chains (A -> B, B -> C) and case-only renames (note -> Note) are carried out by first moving the notes involved to temporary names.
+    """
+
+    def __init__(self):
+        self.renames: dict[str, PlannedRename] = {}  # source -> planned rename, in the order they were added
+
+    def add(self, filepath: str, new_name: str) -> None:
+        """
+        Plans the rename of a note within its folder.
+
+        Args:
+            filepath (str): The path to the note.
+            new_name (str): The new name of the note, with or without its file extension.
+        """
+        extension = os.path.splitext(filepath)[1]
+        if extension and new_name.lower().endswith(extension.lower()): new_name = new_name[:-len(extension)]
+        target = os.path.join(os.path.dirname(filepath), new_name + extension)
+        if target != filepath: self.renames[filepath] = PlannedRename(filepath, target)
+
+    def __len__(self) -> int: return len(self.renames)
+
+    def validate(self) -> list[PlannedRename]:
+        """ Checks the whole batch, marking each planned rename which cannot be carried out with the problem found, and working out which renames need a temporary name. Returns the renames with problems. """
+        for rename in self.renames.values(): rename.problem, rename.via_temporary = _name_problem(rename.new_name), False
+
+        # Notes renamed to the same target
+        renames_by_target: dict[str, list[PlannedRename]] = {}
+        for rename in self.renames.values(): renames_by_target.setdefault(_fold_path(rename.target), []).append(rename)
+        for renames in renames_by_target.values():
+            if len(renames) < 2: continue
+            for rename in renames: rename.problem = rename.problem or f"{len(renames)} notes would be renamed to '{rename.new_name}'"
+
+        # Targets which already exist, unless the existing file is being renamed away (or is the note itself, for a case-only rename)
+        sources_by_folded_path: dict[str, list[str]] = {}
+        for source in self.renames: sources_by_folded_path.setdefault(_fold_path(source), []).append(source)
+        blocked_by: dict[str, str] = {}  # source -> source of the rename which moves the existing target out of the way
+        for rename in self.renames.values():
+            if rename.problem or not os.path.lexists(rename.target): continue
+            if _is_same_file(rename.source, rename.target):
+                rename.via_temporary = True
+                continue
+            blocking_source = next((source for source in sources_by_folded_path.get(_fold_path(rename.target), ()) if _is_same_file(source, rename.target)), None)
+            if blocking_source is None: rename.problem = f"'{os.path.basename(rename.target)}' already exists"
+            else: blocked_by[rename.source] = blocking_source
+
+        # Links are updated by name, so notes sharing a name must all be renamed to the same new name
+        new_names_by_old_name: dict[str, set[str]] = {}
+        for rename in self.renames.values(): new_names_by_old_name.setdefault(rename.old_name, set()).add(rename.new_name)
+        for rename in self.renames.values():
+            if len(new_names_by_old_name[rename.old_name]) > 1: rename.problem = rename.problem or f"other notes named '{rename.old_name}' are renamed differently, so links to them cannot be updated"
+
+        # A note in the way of another only moves if its own rename is valid, which may in turn depend on another note (in a chain)
+        changed = True
+        while changed:
+            changed = False
+            for source, blocking_source in blocked_by.items():
+                rename = self.renames[source]
+                if rename.problem or not self.renames[blocking_source].problem: continue
+                rename.problem = f"'{os.path.basename(rename.target)}' already exists, and its own rename has a problem"
+                changed = True
+
+        # Notes in the way of another move to a temporary name first, so every target is free when the notes move to their new names (which also handles swaps)
+        for source, blocking_source in blocked_by.items():
+            if not self.renames[source].problem: self.renames[blocking_source].via_temporary = True
+        return [rename for rename in self.renames.values() if rename.problem]
+
+    def report(self) -> str:
+        """ Validates the batch and returns a report of what would be renamed, and any problems found, without touching any files. """
+        problems = self.validate()
+        lines = [f"{len(self.renames) - len(problems)} notes to rename ({sum(rename.via_temporary for rename in self.renames.values() if not rename.problem)} via temporary names), {len(problems)} with problems."]
+        lines += [f"    '{rename.old_name}' -> '{rename.new_name}'" for rename in self.renames.values() if not rename.problem]
+        if problems: lines.append("Problems:")
+        lines += [f"    '{rename.old_name}' -> '{rename.new_name}': {rename.problem}" for rename in problems]
+        return '\n'.join(lines)
+
+    def execute(self, skip_invalid: bool = False, journal=None) -> list[PlannedRename]:
+        """
+        Validates the batch and moves the notes. If any move fails, the moves already made are undone before the error is raised.
+
+        Args:
+            skip_invalid (bool, optional): Whether to carry out the valid renames when some renames have problems (which are logged and skipped). Otherwise nothing is renamed and a ValueError is raised.
+            journal (RunJournal, optional): Journal to record every move in, so that an interrupted batch can be finished with resume_moves. With a journal, the moves already made are kept (rather than undone) if a move fails.
+
+        Returns:
+            list[PlannedRename]: The renames which were carried out.
+        """
+        problems = self.validate()
+        if problems and not skip_invalid:
+            raise ValueError(f"{len(problems)} of {len(self.renames)} renames cannot be carried out, so no notes were renamed:\n" + '\n'.join(f"    '{rename.source}' -> '{rename.new_name}': {rename.problem}" for rename in problems))
+        for rename in problems: logging.warning(f"Warning: skipping rename of '{rename.source}' to '{rename.new_name}' ({rename.problem}).")
+        renames = [rename for rename in self.renames.values() if not rename.problem]
+
+        # Moves are made in two passes: notes which are in the way of another note (or only change case) first move to a temporary name, so that every target is free by the second pass
+        moves, current_paths = [], {}
+        for rename in renames:
+            current_paths[rename.source] = rename.source
+            if not rename.via_temporary: continue
+            temporary_path = os.path.join(os.path.dirname(rename.source), f".rename-{os.urandom(8).hex()}.tmp")
+            moves.append((rename.source, temporary_path))
+            current_paths[rename.source] = temporary_path
+        moves += [(current_paths[rename.source], rename.target) for rename in renames]
+
+        if journal is not None:
+            journal.record_moves(moves)
+            _make_moves(moves, journal)
+        else:
+            moves_made: list[tuple[str, str]] = []
+            try:
+                for source, target in moves:
+                    _move(source, target)
+                    moves_made.append((source, target))
+            except OSError:
+                for moved_from, moved_to in reversed(moves_made):
+                    try:
+                        os.rename(moved_to, moved_from)
+                    except OSError as error:
+                        logging.error(f"Error: could not move '{moved_to}' back to '{moved_from}' ({error}).")
+                raise
+
+        _move_index_records([(rename.source, rename.target) for rename in renames])
+        return renames
+
+def resume_moves(journal) -> list[PlannedRename]:
+    """ Makes the moves of a batch which were still to be made when it was interrupted, as recorded in its journal (see RenamePlan.execute). Returns every rename in the batch, including those made before the interruption. """
+    moves = journal.moves
+    if journal.moves_done < len(moves):
+        # The move after the last one recorded may have been made without being recorded. Every path in the plan is used by one move at a time, so it was made if its source is gone and its target exists.
+        source, target = moves[journal.moves_done]
+        if not os.path.lexists(source) and os.path.lexists(target): journal.record_moved()
+        _make_moves(moves, journal)
+        # The index records are only moved once every note has been (otherwise they were already moved by the interrupted run, or are re-read when out of date)
+        _move_index_records(_composed_moves(moves))
+    return [PlannedRename(source, target) for source, target in _composed_moves(moves)]
+
+def _make_moves(moves: list[tuple[str, str]], journal) -> None:
+    # Makes the moves after the ones already recorded, recording each one as soon as it is made
+    for source, target in moves[journal.moves_done:]:
+        _move(source, target)
+        journal.record_moved()
+
+def _composed_moves(moves: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    # The (source, target) of each note, from a sequence of moves which may go through temporary names
+    sources = {}
+    for source, target in moves: sources[target] = sources.pop(source, source)
+    return [(source, target) for target, source in sources.items()]
+
+def _move(source: str, target: str) -> None:
+    # os.rename silently replaces an existing file on some platforms, so check first (the target may have appeared since the plan was validated)
+    if os.path.lexists(target) and not _is_same_file(source, target): raise FileExistsError(f"'{target}' already exists")
+    os.rename(source, target)
+
+def _move_index_records(moves: list[tuple[str, str]]) -> None:
+    # A move keeps the contents, modification time and size of a note, so its index record (including its links) is still valid under the new path and the note does not need to be read again
+    vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+    for source, target in moves: vault_index.move(source, target)
+    vault_index.save()
+
+def _name_problem(name: str) -> str | None:
+    # Returns why a note name is not safe to use, or None if it is
+    if not name.strip(): return "the new name is empty"
+    invalid_characters = sorted(set(name) & INVALID_NAME_CHARACTERS) + sorted({repr(char) for char in name if ord(char) < 32})
+    if invalid_characters: return f"the new name contains characters which are not allowed ({' '.join(invalid_characters)})"
+    if name.startswith('.'): return "the new name starts with a dot, which would hide the note"
+    if name[-1] in ' .': return "the new name ends with a space or dot, which Windows does not allow"
+    if name.split('.', 1)[0].strip().lower() in RESERVED_NAMES: return f"'{name}' is a reserved file name on Windows"
+    if len(os.fsencode(name + '.md')) > 255: return "the new name is too long"
+    return None
+
+def _fold_path(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path)).casefold()
+
+def _is_same_file(path: str, other_path: str) -> bool:
+    try:
+        return os.path.samefile(path, other_path)
+    except OSError:
+        return False
@@ -0,0 +1,160 @@
+""" File for the progress journals of batch runs, which let an interrupted run (by a crash in the user function, Ctrl+C, or the machine going down) be resumed where it stopped with `resume=True`, rather than redoing everything from the start.
+
+A journal is a small file in the cache folder, named after the run (the function, the vault and the options of the run), to which each step of the run is appended as a line of JSON. Paths are stored relative to the vault. Notes which have been processed are flushed to the file in batches; steps which would not be safe to repeat (moving a note, rewriting the links in a note) are flushed as soon as they are made. The journal is deleted once the run finishes.
+
+Example usage:
+    @process_articles(resume=True)   # skips the notes processed by the previous (interrupted) run of this function, if any
+    def update_journals(obsidian_note: ObsidianNote):
+        ...
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+from .filters import Where, _relative_path
+import constants as c
+
+# Bump this whenever the entries of the journal change, so that journals of older runs are not resumed
+JOURNAL_VERSION = 1
+
+class RunJournal:
+    """
+    Class recording the progress of a single batch run. Use it as a context manager: the journal is deleted if the run finishes, and kept (with everything recorded so far flushed) if it raises or is interrupted.
+
+    Args:
+        kind (str): The kind of run, e.g. 'process' or 'rename'.
+        key (tuple): Everything identifying the run (e.g. the function and the options of the run), so that only an identical run resumes it.
+        resume (bool, optional): Whether to continue from the journal of a previous, interrupted run with the same kind and key. If False (or there is no such journal), the run starts from the beginning and any old journal is discarded.
+        flush_every (int, optional): The number of processed notes recorded before the journal is flushed to the file.
+        flush_seconds (float, optional): The longest time processed notes are kept before being flushed.
+    """
+
+    def __init__(self, kind: str, key: tuple, resume: bool = False, flush_every: int = 100, flush_seconds: float = 2.0):
+        key_hash = hashlib.sha1(repr((JOURNAL_VERSION, kind, os.path.abspath(c.vault_path)) + tuple(key)).encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(c.cache_folder, f"run-journal-{kind}-{key_hash}.jsonl")
+        self.flush_every, self.flush_seconds = flush_every, flush_seconds
+        self.done: set[str] = set()  # notes which have been processed
+        self.renames: list[tuple[str, str, str]] = []  # (filepath, old name, new name) of each rename added while processing
+        self.moves: list[tuple[str, str]] | None = None  # every move of the rename plan, once it has started being carried out
+        self.moves_done = 0
+        self.links: list[str] | None = None  # notes whose links are to be rewritten, once known
+        self.relinked: set[str] = set()  # notes whose links have been rewritten
+        self.resumed = False
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+        self._file = None
+        self._lock = threading.Lock()  # notes can be recorded from the threads of a worker pool
+
+        if resume and os.path.exists(self.path):
+            self._load()
+            self.resumed = True
+        try:
+            os.makedirs(c.cache_folder, exist_ok=True)
+            self._file = open(self.path, 'a' if self.resumed else 'w', encoding='utf-8')
+        except OSError as error:
+            logging.warning(f"Warning: could not open run journal '{self.path}' ({error})... this run cannot be resumed if it is interrupted.")
+
+    def __enter__(self) -> 'RunJournal': return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None: self.finish()
+        else: self.close()
+
+    """ RECORDING. """
+    def record_done(self, filepath: str) -> None:
+        """ Records that a note has been processed. Flushed in batches. """
+        relative_path = _relative_path(filepath)
+        with self._lock:
+            self.done.add(relative_path)
+            self._append(['done', relative_path])
+
+    def record_rename(self, filepath: str, old_name: str, new_name: str) -> None:
+        """ Records a rename added while processing a note (before the note itself is recorded as done, so both are flushed together). """
+        self.renames.append((filepath, old_name, new_name))
+        self._append(['rename', _relative_path(filepath), old_name, new_name])
+
+    def record_moves(self, moves: list[tuple[str, str]]) -> None:
+        """ Records every move of a rename plan, in order, before the first move is made. """
+        self.moves = list(moves)
+        self._append(['moves', [[_relative_path(source), _relative_path(target)] for source, target in moves]], flush=True)
+
+    def record_moved(self) -> None:
+        """ Records that the next move of the plan has been made. """
+        self.moves_done += 1
+        self._append(['moved'], flush=True)
+
+    def record_links(self, filepaths: list[str]) -> None:
+        """ Records the notes whose links are to be rewritten, before the first one is rewritten. """
+        self.links = list(filepaths)
+        self._append(['links', [_relative_path(filepath) for filepath in filepaths]], flush=True)
+
+    def record_relinked(self, filepath: str) -> None:
+        """ Records that the links in a note have been rewritten. """
+        self.relinked.add(_relative_path(filepath))
+        self._append(['relinked', _relative_path(filepath)], flush=True)
+
+    def is_relinked(self, filepath: str) -> bool: return _relative_path(filepath) in self.relinked
+
+    def skip_done(self, where: Where | None) -> Where | None:
+        """ Returns a filter which also skips the notes already processed (without reading them), combined with the given filter. """
+        if not self.done: return where
+        done = self.done
+        skip = Where(lambda path, properties: path not in done, f"not_done({len(done)} notes)", path_only=True)
+        return skip if where is None else where & skip
+
+    def record_result(self, result) -> None:
+        """ Records a note as processed from its NoteResult, unless it failed (notes which failed are retried when the run is resumed). Can be called from worker threads. """
+        if result.error is None: self.record_done(result.filepath)
+
+    """ FILE HANDLING. """
+    def flush(self) -> None:
+        """ Writes any buffered entries to the journal file. """
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._file is None: return
+        try:
+            self._file.write(''.join(self._buffer))
+            self._file.flush()
+        except OSError as error:
+            logging.warning(f"Warning: could not write run journal '{self.path}' ({error}).")
+        self._buffer.clear()
+
+    def close(self) -> None:
+        """ Flushes and closes the journal, keeping the file so that the run can be resumed. """
+        with self._lock: self.flush()
+        if self._file is not None: self._file.close()
+        self._file = None
+
+    def finish(self) -> None:
+        """ Closes and deletes the journal, once the run has finished. """
+        self._buffer.clear()
+        if self._file is not None: self._file.close()
+        self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _append(self, entry: list, flush: bool = False) -> None:
+        self._buffer.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        if flush or len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds: self.flush()
+
+    def _load(self) -> None:
+        # Replays the entries of the previous run. A last line cut short by the interruption is ignored.
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    kind, *values = json.loads(line)
+                except ValueError:
+                    continue
+                if kind == 'done': self.done.add(values[0])
+                elif kind == 'rename': self.renames.append((_absolute_path(values[0]), values[1], values[2]))
+                elif kind == 'moves': self.moves = [(_absolute_path(source), _absolute_path(target)) for source, target in values[0]]
+                elif kind == 'moved': self.moves_done += 1
+                elif kind == 'links': self.links = [_absolute_path(path) for path in values[0]]
+                elif kind == 'relinked': self.relinked.add(values[0])
+
+def _absolute_path(relative_path: str) -> str:
+    return os.path.join(c.vault_path, *relative_path.split('/'))
@@ -0,0 +1,223 @@
+""" File for the tag index of a vault, a tree of the '/'-separated tag hierarchy mapping each tag to the notes which have it. Used to answer questions such as "which notes have a tag under 'document/'" without reading every note, and to rename or merge tags by rewriting only the notes which have them.
+
+Tags are compared as Obsidian compares them: ignoring case, any leading '#' and any surrounding '/' (see normalise_tag).
+
+Example usage:
+    tag_index = get_tag_index()
+    tag_index.notes_with_tag('document')         # notes tagged 'document', 'document/article', 'Document/Book', ...
+    tag_index.tag_counts('topic')                # {'topic': 0, 'topic/biology': 12, ...}
+    tag_index.rename_tag('topic/bio', 'topic/biology')
+    tag_index.merge_tags(['paper', 'document/paper'], 'document/article')
+"""
+from collections.abc import Iterable
+
+from . import VaultIndex
+from .obsidian_note import normalise_tag, note_tags, split_tags
+from .yield_functions import yield_note_records
+import constants as c
+
+class _TagNode:
+    """ A single segment of the tag hierarchy, e.g. 'article' in 'document/article'. """
+    __slots__ = ('children', 'filepaths')
+
+    def __init__(self):
+        self.children: dict[str, _TagNode] = {}
+        self.filepaths: set[str] = set()  # notes with exactly this tag (not a nested one)
+
+class TagIndex:
+    """
+    Class storing the tags of every note in a vault, as a tree over the tag hierarchy.
+
+    The tags of each note are taken from the vault index, so they are only read from notes which have changed since the index was last saved. The tree is built once (on the first call to refresh) and afterwards only updated for notes whose tags have changed.
+    Only the 'tags' property is indexed, not inline #tags in the body of notes.
+    """
+
+    def __init__(self):
+        self._root = _TagNode()
+        self._tags: dict[str, tuple[str, ...]] = {}  # filepath -> normalised tags of the note
+        self.is_built = False
+
+    def refresh(self) -> None:
+        """ Walks the vault and brings the index up to date with the current tags of every note. """
+        vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+        seen_filepaths = set()
+        for filepath, record in yield_note_records(vault_index=vault_index):
+            seen_filepaths.add(filepath)
+            tags = note_tags(record.properties)
+            if self._tags.get(filepath) != tags: self.update_file(filepath, tags)
+
+        # Remove any notes which have been deleted or moved since the last refresh
+        for filepath in [filepath for filepath in self._tags if filepath not in seen_filepaths]:
+            self.remove_file(filepath)
+        self.is_built = True
+
+    def update_file(self, filepath: str, tags: Iterable[str]) -> None:
+        """ Sets the (normalised) tags of a single note. """
+        self.remove_file(filepath)
+        tags = tuple(tags)
+        if not tags: return
+        self._tags[filepath] = tags
+        for tag in tags:
+            node = self._root
+            for segment in tag.split('/'): node = node.children.setdefault(segment, _TagNode())
+            node.filepaths.add(filepath)
+
+    def remove_file(self, filepath: str) -> None:
+        """ Removes a note and its tags from the index, pruning any tags which no note has any more. """
+        for tag in self._tags.pop(filepath, ()):
+            path = [(None, self._root)]
+            for segment in tag.split('/'):
+                node = path[-1][1].children.get(segment)
+                if node is None: break
+                path.append((segment, node))
+            else:
+                path[-1][1].filepaths.discard(filepath)
+                # Walk back up, removing nodes left with neither notes nor nested tags
+                for (segment, node), (_, parent) in zip(reversed(path[1:]), reversed(path[:-1])):
+                    if node.filepaths or node.children: break
+                    del parent.children[segment]
+
+    """ QUERIES. """
+    def notes_with_tag(self, tag: str, descendants: bool = True) -> set[str]:
+        """
+        Returns the filepaths of the notes with a tag.
+
+        Args:
+            tag (str): The tag, e.g. 'document' or '#Document/Article'.
+            descendants (bool, optional): Whether to include notes with a tag nested under the tag (e.g. 'document/article' for 'document').
+        """
+        node = self._find(normalise_tag(tag))
+        if node is None: return set()
+        if not descendants: return set(node.filepaths)
+        return {filepath for _, descendant in _walk(node, '') for filepath in descendant.filepaths}
+
+    def tags_of(self, filepath: str) -> tuple[str, ...]:
+        """ Returns the normalised tags of the note at the given filepath. """
+        return self._tags.get(filepath, ())
+
+    def tags_under(self, tag: str = '') -> list[str]:
+        """ Returns every tag nested under a tag (including the tag itself, if a note has it), sorted. With no tag, returns every tag in the vault. """
+        tag = normalise_tag(tag)
+        node = self._find(tag)
+        if node is None: return []
+        return sorted(descendant_tag for descendant_tag, descendant in _walk(node, tag) if descendant.filepaths)
+
+    def find_tags(self, text: str) -> list[str]:
+        """ Returns every tag starting with a piece of text, where the last segment may be partial (e.g. 'doc' finds 'document' and 'document/article', and 'topic/bi' finds 'topic/biology'), sorted. """
+        text = normalise_tag(text)
+        parent_tag, _, partial = text.rpartition('/')
+        parent = self._find(parent_tag)
+        if parent is None: return []
+        return sorted(
+            tag
+            for segment, child in parent.children.items() if segment.startswith(partial)
+            for tag, descendant in _walk(child, f"{parent_tag}/{segment}" if parent_tag else segment) if descendant.filepaths
+        )
+
+    def tag_counts(self, tag: str = '', descendants: bool = False) -> dict[str, int]:
+        """
+        Returns the number of notes with each tag nested under a tag (including the tag itself). With no tag, counts every tag in the vault.
+
+        Args:
+            tag (str, optional): The tag to count under.
+            descendants (bool, optional): Whether each count includes notes with tags nested under the counted tag (each note counted once), rather than only notes with exactly that tag.
+        """
+        tag = normalise_tag(tag)
+        node = self._find(tag)
+        if node is None: return {}
+        if not descendants: return {descendant_tag: len(descendant.filepaths) for descendant_tag, descendant in _walk(node, tag) if descendant_tag}
+        return {descendant_tag: len(self.notes_with_tag(descendant_tag)) for descendant_tag, _ in _walk(node, tag) if descendant_tag}
+
+    """ BULK EDITS. """
+    def rename_tag(self, old_tag: str, new_tag: str, write: bool = True) -> int:
+        """
+        Renames a tag, and every tag nested under it, in the notes which have them. E.g. renaming 'topic/bio' to 'topic/biology' also turns 'topic/bio/cells' into 'topic/biology/cells'.
+
+        Only the notes which have an affected tag are opened and written, and only their properties section is rewritten. The spelling of nested segments is kept, and a note left with the same tag twice keeps only the first.
+
+        Args:
+            old_tag (str): The tag to rename.
+            new_tag (str): The new name of the tag.
+            write (bool, optional): Whether to write the notes. If False, only report how many notes would be rewritten.
+
+        Returns:
+            int: The number of notes which were (or would be) rewritten.
+        """
+        return self.merge_tags([old_tag], new_tag, write=write)
+
+    def merge_tags(self, old_tags: Iterable[str], new_tag: str, write: bool = True) -> int:
+        """ Renames several tags (and the tags nested under them) to the same tag, merging them. See rename_tag. """
+        if not self.is_built: self.refresh()
+        old_tags = [tag for tag in dict.fromkeys(normalise_tag(tag) for tag in old_tags) if tag]
+        new_tag = new_tag.strip().lstrip('#').strip('/')
+        if not old_tags or not new_tag: raise ValueError("Tags to rename from and to cannot be empty.")
+
+        filepaths = set()
+        for old_tag in old_tags: filepaths |= self.notes_with_tag(old_tag)
+
+        # Open each affected note straight from its index record, so only notes with the tag are read
+        vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+        notes_rewritten, notes_failed = 0, 0
+        for filepath in sorted(filepaths):
+            obsidian_note = vault_index.get(filepath).to_note(filepath)
+            tags = obsidian_note.properties.get('tags')
+            new_tags = _renamed_tags(split_tags(tags), old_tags, new_tag)
+            if new_tags is None: continue
+
+            if write:
+                obsidian_note.properties['tags'] = new_tags[0] if isinstance(tags, str) and len(new_tags) == 1 else new_tags
+                # The index is only updated for notes which were actually written (write_file logs why a note was not)
+                if not obsidian_note.write_file():
+                    notes_failed += 1
+                    continue
+                self.update_file(filepath, note_tags(obsidian_note.properties))
+            notes_rewritten += 1
+
+        print(f"{'Renamed' if write else 'Would rename'} {', '.join(repr(tag) for tag in old_tags)} to {new_tag!r} in {notes_rewritten} notes{f' (and could not write {notes_failed} notes)' if notes_failed else ''}.")
+        return notes_rewritten
+
+    def _find(self, tag: str) -> _TagNode | None:
+        node = self._root
+        for segment in tag.split('/') if tag else ():
+            node = node.children.get(segment)
+            if node is None: return None
+        return node
+
+def _walk(node: _TagNode, tag: str):
+    # Yields (tag, node) for a node and every node nested under it, depth first
+    stack = [(tag, node)]
+    while stack:
+        tag, node = stack.pop()
+        yield tag, node
+        stack.extend((f"{tag}/{segment}" if tag else segment, child) for segment, child in node.children.items())
+
+def _renamed_tags(tags: list[str], old_tags: list[str], new_tag: str) -> list[str] | None:
+    # Returns the tags of a note with the old tags renamed (and duplicates dropped), or None if none of its tags were affected
+    renamed, changed = {}, False
+    for tag in tags:
+        normalised = normalise_tag(tag) if isinstance(tag, str) else None
+        if normalised:
+            for old_tag in old_tags:
+                if normalised != old_tag and not normalised.startswith(f"{old_tag}/"): continue
+                # Keep the spelling of any nested segments, e.g. 'Topic/Bio/Cells' -> 'topic/biology/Cells'
+                nested_segments = tag.strip().lstrip('#').strip('/').split('/')[old_tag.count('/') + 1:]
+                new_spelling = '/'.join([new_tag] + nested_segments)
+                if new_spelling != tag: tag, normalised, changed = new_spelling, normalise_tag(new_spelling), True
+                break
+        key = normalised or object()  # anything which is not a tag is kept as it is
+        if key in renamed: changed = True  # duplicate, e.g. after merging two tags
+        else: renamed[key] = tag
+    return list(renamed.values()) if changed else None
+
+# A single index shared by all notes, built the first time it is needed
+_tag_index = TagIndex()
+
+def get_tag_index(refresh: bool = False) -> TagIndex:
+    """
+    Returns the shared tag index for the vault, building it if it has not been built yet.
+
+    Args:
+        refresh (bool, optional): If True, bring the index up to date with any changes made to the vault since it was built (only changed notes are re-read).
+    """
+    if refresh or not _tag_index.is_built: _tag_index.refresh()
+    return _tag_index
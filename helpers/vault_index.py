@@ -0,0 +1,124 @@
+""" File for the vault index: an on-disk record of the properties (and outgoing links) of every note in a vault, so that repeat runs only need to re-read the notes which have changed since the last run. """
+import os
+import pickle
+import hashlib
+import logging
+from dataclasses import dataclass
+
+from . import ObsidianNote, instrumentation
+from .property_store import PropertyStore
+import constants as c
+
+# Bump this whenever the layout of IndexRecord changes, so that old indexes are rebuilt
+INDEX_VERSION = 3
+
+@dataclass
+class IndexRecord:
+    """ Dataclass representing what is known about a single note, as of its last modification time and size. """
+    mtime_ns: int
+    size: int
+    header_lines: list[str]  # the properties section, including the '---' lines
+    body_offset: int
+    body_after_newline: bool
+    properties: PropertyStore
+    outlinks: list[str] | None = None  # only filled in once the body has been read
+    newline: str = os.linesep  # the line endings of the note
+
+    def to_note(self, filepath: str) -> ObsidianNote:
+        """ Creates a (lazily loaded) ObsidianNote from the record, without opening the file. """
+        return ObsidianNote.from_header(filepath, self.header_lines, self.body_offset, self.body_after_newline, (self.size, self.mtime_ns), self.newline)
+
+class VaultIndex:
+    """
+    Index of the notes in a vault, stored in the cache folder between runs.
+
+    Each note's record is keyed by its filepath, and is only rebuilt if the note's modification time or size changes.
+    If the stored index is missing, corrupted or from an older version of this project, it is silently rebuilt from scratch.
+    """
+
+    def __init__(self, vault_path: str, persistent: bool = True):
+        """
+        Args:
+            vault_path (str): The vault to index.
+            persistent (bool, optional): Whether to load the index from (and save it to) the cache folder. If False, the index only lives in memory.
+        """
+        self.vault_path = vault_path
+        self.persistent = persistent
+        self.records: dict[str, IndexRecord] = self._load() if persistent else {}
+        self._changed = False
+
+    @property
+    def index_path(self) -> str:
+        path_hash = hashlib.sha1(os.path.abspath(self.vault_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(c.cache_folder, f"vault-index-{path_hash}.pickle")
+
+    def get(self, filepath: str, stat: os.stat_result | None = None) -> IndexRecord:
+        """
+        Returns the record for a note, re-reading the note's properties only if it has changed since it was indexed.
+
+        Args:
+            filepath (str): The path to the note.
+            stat (os.stat_result, optional): The result of os.stat for the note, if already known.
+        """
+        if stat is None: stat = os.stat(filepath)
+        record = self.records.get(filepath)
+        if record is not None and record.mtime_ns == stat.st_mtime_ns and record.size == stat.st_size:
+            instrumentation.current().count('index_hits')
+            return record
+        instrumentation.current().count('index_misses')
+
+        # Note is new or has changed, so re-read its properties
+        header_lines, body_offset, body_after_newline, _, _, newline = ObsidianNote._read_file(filepath, lazy_body=True)
+        obsidian_note = ObsidianNote.from_header(filepath, header_lines, body_offset, body_after_newline, newline=newline)
+        record = IndexRecord(stat.st_mtime_ns, stat.st_size, header_lines, body_offset, body_after_newline, PropertyStore(obsidian_note.properties), newline=newline)
+        self.records[filepath] = record
+        self._changed = True
+        return record
+
+    def outlinks(self, filepath: str, record: IndexRecord | None = None) -> list[str]:
+        """ Returns the names of the notes linked to from the body of a note, reading the body only if the links are not already indexed. The note's up-to-date record can be passed in if it is already known. """
+        if record is None: record = self.get(filepath)
+        if record.outlinks is None:
+            from .links import outlinks_from_text
+            record.outlinks = outlinks_from_text('\n'.join(record.to_note(filepath).body_text))
+            self._changed = True
+        return record.outlinks
+
+    def move(self, filepath: str, new_filepath: str) -> None:
+        """ Moves the record of a note which has been renamed or moved (with os.rename, which keeps its modification time and size), so that it is not re-read under its new path. """
+        record = self.records.pop(filepath, None)
+        if record is None: return
+        self.records[new_filepath] = record
+        self._changed = True
+
+    def evict_missing(self, seen_filepaths: set[str]) -> None:
+        """ Removes the records of notes which were not seen during a full walk of the vault (i.e. which have been deleted or moved). """
+        for filepath in [filepath for filepath in self.records if filepath not in seen_filepaths]:
+            del self.records[filepath]
+            self._changed = True
+
+    def save(self) -> None:
+        """ Atomically writes the index to the cache folder (via a temporary file), if anything has changed. """
+        if not self.persistent or not self._changed: return
+        index_path = self.index_path
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            temp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as file:
+                pickle.dump((INDEX_VERSION, self.records), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, index_path)
+            self._changed = False
+        except OSError as error:
+            logging.warning(f"Warning: could not write vault index '{index_path}' ({error}).")
+
+    def _load(self) -> dict[str, IndexRecord]:
+        """ Loads the index from the cache folder, returning an empty index if it is missing, corrupted or outdated. """
+        index_path = self.index_path
+        if not os.path.exists(index_path): return {}
+        try:
+            with open(index_path, 'rb') as file:
+                version, records = pickle.load(file)
+            if version == INDEX_VERSION and isinstance(records, dict): return records
+        except Exception as error:
+            logging.warning(f"Warning: could not read vault index '{index_path}' ({error})... rebuilding.")
+        return {}
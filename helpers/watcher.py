@@ -0,0 +1,270 @@
+""" File for watch mode, which keeps running and applies note functions to notes as soon as they are created or modified (e.g. as Zotero imports new articles), rather than rescanning the whole vault each time.
+
+On Linux, changes are picked up with inotify. Elsewhere (or if inotify cannot be used, e.g. because the limit on watched folders has been reached) the vault is polled, comparing the modification time and size of every note with the previous poll (notes are not read unless they changed).
+Bursts of changes are debounced: a batch of notes is only processed once no new change has been seen for `debounce` seconds (or once the first change in the batch is `max_wait` seconds old), so a note which is saved several times in a row is processed once.
+The notes written by the watcher itself are remembered by their modification time and size, so its own writes never trigger another run.
+If the .bib file changes, the loaded BibTex data is dropped and re-read (lazily) before the next batch of notes is processed.
+
+Example usage:
+    @process_articles(where=property_is_empty('journal'))
+    def update_journals(obsidian_note: ObsidianNote):
+        ...
+
+    watch_vault(update_journals, reorder_properties)   # runs until interrupted with Ctrl+C
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+from collections.abc import Callable
+
+from .pipeline import Pipeline, Stage
+from .yield_functions import walk_vault, yield_note_entries, yield_note_paths, is_note_path, is_excluded_path
+from .bibtex_matcher import reset_bib_matcher
+import constants as c
+
+BACKENDS = ('auto', 'inotify', 'poll')
+
+class VaultWatcher:
+    """
+    Class watching a vault for created and modified notes, and running a pipeline of note functions on them.
+
+    Args:
+        functions (list[Stage | Callable]): The functions to run on each changed note, in order, as for a Pipeline. Functions decorated with @process_articles keep their filters (articles only unless yield_all_files=True, and where=).
+        debounce (float, optional): The number of seconds without a new change to wait before processing a batch of changed notes.
+        max_wait (float, optional): The longest a changed note waits to be processed while changes keep coming.
+        poll_interval (float, optional): The number of seconds between scans of the vault when polling.
+        backend (str, optional): 'inotify', 'poll', or 'auto' to use inotify where it is available and fall back to polling otherwise.
+        write (bool, optional): Whether to write each note after the functions have run (notes which were not changed are not rewritten).
+    """
+
+    def __init__(self, functions: list[Stage | Callable], debounce: float = 1.0, max_wait: float = 30.0, poll_interval: float = 2.0, backend: str = 'auto', write: bool = True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Must be one of {BACKENDS}.")
+        self.pipeline = Pipeline(functions, write=write)
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.bibtex_location = os.path.abspath(c.bibtext_location)
+        self.batches_run = 0
+        self._own_writes: dict[str, tuple[int, int]] = {}  # filepath -> (size, mtime_ns) of the watcher's last write
+        self._stopping = False
+
+    def run(self, timeout: float | None = None) -> None:
+        """
+        Watches the vault until interrupted (with Ctrl+C, or by calling stop from another thread), processing changed notes in debounced batches.
+
+        Args:
+            timeout (float, optional): If given, stop after this many seconds (once any pending batch has been processed).
+        """
+        self._stopping = False
+        source = self._open_source()
+        print(f"Watching '{c.vault_path}' for changes ({source.name})... press Ctrl+C to stop.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending: dict[str, None] = {}  # changed paths, in the order they were first seen
+        first_change = last_change = 0.0
+        try:
+            while not self._stopping and (deadline is None or time.monotonic() < deadline):
+                # Wait for changes for no longer than it takes for the pending batch to be due
+                wait = self.poll_interval if not pending else max(0.0, min(last_change + self.debounce, first_change + self.max_wait) - time.monotonic())
+                if deadline is not None: wait = min(wait, max(0.0, deadline - time.monotonic()))
+                for path in source.changes(wait):
+                    if self._is_own_write(path): continue
+                    if not pending: first_change = time.monotonic()
+                    pending[path] = None
+                    last_change = time.monotonic()
+
+                now = time.monotonic()
+                if pending and (now - last_change >= self.debounce or now - first_change >= self.max_wait):
+                    batch, pending = list(pending), {}
+                    self.process_changes(batch)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pending: self.process_changes(list(pending))
+            source.close()
+        print(f"Stopped watching ({self.batches_run} batches, {self.pipeline.notes_written} notes written, {self.pipeline.notes_failed} failed).")
+
+    def stop(self) -> None:
+        """ Asks a running watcher to stop, from another thread. """
+        self._stopping = True
+
+    def process_changes(self, paths: list[str]) -> list[str]:
+        """
+        Processes a batch of changed paths: reloads the BibTex data if the .bib file is among them, then runs the functions on the notes among them.
+
+        Returns:
+            list[str]: The filepaths of the notes which were written.
+        """
+        if any(os.path.abspath(path) == self.bibtex_location for path in paths): reload_bibdata()
+        filepaths = [path for path in paths if os.path.abspath(path) != self.bibtex_location and is_note_path(path)]
+        if not filepaths: return []
+
+        written_filepaths = self.pipeline.run_files(filepaths)
+        for filepath in written_filepaths:
+            # Remember the state of the note as written, so that the change event it causes is ignored
+            try:
+                stat = os.stat(filepath)
+                self._own_writes[filepath] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+        self.batches_run += 1
+        print(f"Processed {len(filepaths)} changed notes ({len(written_filepaths)} written).")
+        return written_filepaths
+
+    def _is_own_write(self, path: str) -> bool:
+        state = self._own_writes.get(path)
+        if state is None: return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) == state: return True
+        del self._own_writes[path]  # changed again since the watcher wrote it
+        return False
+
+    def _open_source(self):
+        if self.backend in ('auto', 'inotify'):
+            try:
+                return _InotifySource(self.bibtex_location)
+            except OSError as error:
+                if self.backend == 'inotify': raise
+                logging.warning(f"Warning: could not watch the vault with inotify ({error})... polling every {self.poll_interval} seconds instead.")
+        return _PollingSource(self.bibtex_location, self.poll_interval)
+
+def watch_vault(*functions: Stage | Callable, debounce: float = 1.0, backend: str = 'auto', write: bool = True, timeout: float | None = None) -> VaultWatcher:
+    """ Watches the vault, running the given functions on every note which is created or modified until interrupted. See VaultWatcher. """
+    watcher = VaultWatcher(list(functions), debounce=debounce, backend=backend, write=write)
+    watcher.run(timeout)
+    return watcher
+
+def reload_bibdata() -> None:
+    """ Drops the loaded BibTex data (and the matcher built from it), so that the .bib file is read again the next time it is used. """
+    logging.info(f"'{c.bibtext_location}' has changed... reloading BibTex data.")
+    for name in ('bibdata_entries', 'bibdata'): vars(c).pop(name, None)
+    reset_bib_matcher()
+
+""" CHANGE SOURCES. """
+class _PollingSource:
+    """ Finds changed notes by comparing the modification time and size of every note (and of the .bib file) between scans of the vault. """
+    name = 'polling'
+
+    def __init__(self, bibtex_location: str, interval: float):
+        self.bibtex_location = bibtex_location
+        self.interval = interval
+        self._states = self._scan()
+        self._last_scan = time.monotonic()
+
+    def changes(self, timeout: float) -> list[str]:
+        # Scans are never closer together than the interval, however often changes are asked for
+        time.sleep(max(0.0, min(timeout, self._last_scan + self.interval - time.monotonic())))
+        if time.monotonic() < self._last_scan + self.interval: return []
+        states = self._scan()
+        self._last_scan = time.monotonic()
+        changed = [path for path, state in states.items() if self._states.get(path) != state]
+        self._states = states
+        return changed
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        states = {}
+        for entry in yield_note_entries():
+            try:
+                stat = entry.stat()
+                states[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass  # deleted while scanning
+        try:
+            stat = os.stat(self.bibtex_location)
+            states[self.bibtex_location] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return states
+
+    def close(self) -> None: pass
+
+# inotify constants, from <sys/inotify.h>
+_IN_CLOSE_WRITE, _IN_MOVED_TO, _IN_CREATE, _IN_IGNORED, _IN_Q_OVERFLOW, _IN_ISDIR = 0x8, 0x80, 0x100, 0x8000, 0x4000, 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, length of the name which follows
+
+class _InotifySource:
+    """ Finds changed notes with inotify (Linux only), watching every folder of the vault which is not excluded, and the folder of the .bib file. Raises an OSError if inotify cannot be used. """
+    name = 'inotify'
+
+    def __init__(self, bibtex_location: str):
+        if not sys.platform.startswith('linux'): raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        import ctypes, ctypes.util
+        self._get_errno = ctypes.get_errno
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0: raise OSError(self._get_errno(), os.strerror(self._get_errno()))
+        self.bibtex_location = bibtex_location
+        self._folders: dict[int, str] = {}  # watch descriptor -> folder
+        try:
+            self._watch_tree(c.vault_path)
+            bibtex_folder = os.path.dirname(bibtex_location)
+            self._watch(bibtex_folder)  # no-op if it is in the vault
+        except OSError:
+            self.close()
+            raise
+
+    def changes(self, timeout: float) -> list[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable: return []
+        changed = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0'))
+                offset += _EVENT_HEADER.size + length
+                changed.extend(self._handle_event(wd, mask, name))
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0: os.close(self._fd)
+        self._fd = -1
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> list[str]:
+        if mask & _IN_Q_OVERFLOW:
+            # Events were dropped, so every note may have changed (unchanged notes are not rewritten)
+            logging.warning("Warning: too many changes at once for inotify to keep up with... re-checking every note.")
+            return list(yield_note_paths()) + [self.bibtex_location]
+        if mask & _IN_IGNORED:
+            self._folders.pop(wd, None)  # the folder was deleted
+            return []
+        folder = self._folders.get(wd)
+        if folder is None: return []
+
+        path = os.path.join(folder, name)
+        if mask & _IN_ISDIR:
+            # A new folder (or one moved into the vault) may already contain notes by the time it is watched
+            if not mask & (_IN_CREATE | _IN_MOVED_TO) or is_excluded_path(path, is_folder=True): return []
+            try:
+                self._watch_tree(path)
+            except OSError as error:
+                logging.warning(f"Warning: could not watch new folder '{path}' ({error}).")
+            return [entry.path for entry in walk_vault(path, 'md')]
+        # Files are only reported once they have been fully written (or moved into place), not when they are created
+        return [] if mask & _IN_CREATE else [path]
+
+    def _watch_tree(self, folder: str) -> None:
+        self._watch(folder)
+        for current_folder, subfolders, _ in os.walk(folder):
+            subfolders[:] = [subfolder for subfolder in subfolders if not is_excluded_path(os.path.join(current_folder, subfolder), is_folder=True)]
+            for subfolder in subfolders: self._watch(os.path.join(current_folder, subfolder))
+
+    def _watch(self, folder: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), _WATCH_MASK)
+        if wd < 0:
+            error = self._get_errno()
+            raise OSError(error, f"{os.strerror(error)} (watching '{folder}')")
+        self._folders.setdefault(wd, folder)  # a folder which is already watched keeps its first path
@@ -1,57 +1,181 @@
-""" Function to yield all files with a given extension within a given folder, including subfolders."""
+""" Functions to yield all files with a given extension within a given folder, including subfolders, and the notes and articles of a vault."""
 
 import os
 import fnmatch
 
 from helpers import ObsidianNote
+from .obsidian_note import properties_are_article
+from .vault_index import VaultIndex, IndexRecord
+from .filters import Where
+from . import instrumentation
 import constants as c
 
+# Folders which never contain notes: Obsidian's own configuration folder and its trash folder
+ALWAYS_EXCLUDED_PATTERNS = ['.obsidian', '.trash']
+
+def walk_vault(folder_path: str, extension: str, exclude_subfolders: bool = False, excluded_folders: list[str] = (), exclude_patterns: list[str] = ()):
+    """
+    Streams the files with a given extension within a given folder, as os.DirEntry objects.
+
+    Unlike os.walk, each folder's files are yielded as soon as that folder has been read (with os.scandir), so the first files are yielded immediately rather than after the whole vault has been listed. Excluded folders are pruned before they are entered, so none of the files inside them are ever listed.
+    The DirEntry objects carry the results of the directory listing, so entry.stat() can be used to get e.g. the modification time and size of each file cheaply (for free on Windows).
+
+    Args:
+        folder_path (str): The folder to search.
+        extension (str): The file extension to match, without the dot (e.g. 'md').
+        exclude_subfolders (bool, optional): If True, only search the top level of the folder.
+        excluded_folders (list[str], optional): Folders to skip, relative to folder_path. Either separator ('/' or '\\') can be used.
+        exclude_patterns (list[str], optional): Glob-style patterns (e.g. '*.excalidraw.md', 'Attachments/*'). Folders and files are skipped if either their name or their path relative to folder_path matches.
+
+    Yields:
+        os.DirEntry: An entry for each matching file.
+    """
+    suffix = os.path.normcase(f'.{extension}')
+    excluded_folders = {_normalise_relative_path(folder) for folder in excluded_folders}
+    exclude_patterns = list(exclude_patterns)
+
+    def is_excluded(entry: os.DirEntry, relative_path: str) -> bool:
+        return any(fnmatch.fnmatch(entry.name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in exclude_patterns)
+
+    # Folders are visited depth first, in the same order as os.walk, by keeping a stack of (path, relative path) pairs
+    folders = [(folder_path, '')]
+    while folders:
+        current_folder, relative_folder = folders.pop()
+        subfolders = []
+        # Each folder is listed in full before any of its files are yielded (as in os.walk), so that callers can safely rename or create files while walking
+        try:
+            with os.scandir(current_folder) as entries: entries = list(entries)
+        except OSError:
+            continue  # unreadable folders are skipped, as in os.walk
+
+        for entry in entries:
+            relative_path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            # Prune excluded folders here, rather than discarding their files later
+            if is_dir:
+                if exclude_subfolders or entry.is_symlink(): continue
+                if relative_path in excluded_folders or is_excluded(entry, relative_path):
+                    instrumentation.current().count('folders_pruned')
+                    continue
+                subfolders.append((entry.path, relative_path))
+            elif os.path.normcase(entry.name).endswith(suffix):
+                if is_excluded(entry, relative_path):
+                    instrumentation.current().count('files_excluded')
+                    continue
+                instrumentation.current().count('files_seen')
+                yield entry
+        folders.extend(reversed(subfolders))
+
 def yield_files(folder_path: str, extension: str, exclude_subfolders: bool = False):
     """ Yield all files with a given extension within a given folder."""
-    # Assign single root directory and list of files manually if excluding subfolders else calc with os.walk
-    if exclude_subfolders: directories = [(folder_path, os.listdir(folder_path))]
-    else: directories = [(root, files) for root, _, files in os.walk(folder_path)]
-
-    # Iterate through each root and set of files in directory and yield files with given extension
-    for root, files in directories:
-        for file_name in fnmatch.filter(files, f'*.{extension}'):
-            file_path = os.path.join(root, file_name)
-            yield file_path
-
-def yield_notes(limit: int = -1, exclude_subfolders: bool = False):
-    """ Yields each note in a vault as ObsidianNote object. """
+    for entry in walk_vault(folder_path, extension, exclude_subfolders):
+        yield entry.path
+
+def yield_note_entries(limit: int = -1, exclude_subfolders: bool = False):
+    """ Yields an os.DirEntry for each note in a vault, skipping Obsidian's own folders and the folders and patterns excluded in constants.py. """
     # Check if folder exists
     if not os.path.exists(c.vault_path):
         raise FileNotFoundError(f"Folder {c.vault_path} does not exist.")
 
     idx = 0
-    for filepath in yield_files(c.vault_path, 'md', exclude_subfolders):
-        
-        # Ignore files in excluded folders
-        should_continue = False
-        for excluded_folder in c.excluded_folders:
-            folderpath = os.path.join(c.vault_path, excluded_folder)
-            if filepath.startswith(folderpath):
-                should_continue = True
-                break
-        if should_continue: continue
+    exclude_patterns = ALWAYS_EXCLUDED_PATTERNS + list(c.excluded_patterns)
+    entries = walk_vault(c.vault_path, 'md', exclude_subfolders, c.excluded_folders, exclude_patterns)
+    while True:
+        # Time spent walking is only the time spent fetching the next file, not the time spent by the caller on each file
+        with instrumentation.current().phase('walk'):
+            entry = next(entries, None)
+        if entry is None: break
 
         # Limit number of files
         if limit > 0 and idx >= limit: break
         idx += 1
 
-        obsidian_note: ObsidianNote = ObsidianNote(filepath)
+        yield entry
+
+def yield_note_paths(limit: int = -1, exclude_subfolders: bool = False, where: Where | None = None):
+    """ Yields the filepath of each note in a vault, skipping notes in excluded folders (and, if a filter is given, notes which fail it). """
+    if where is not None:
+        for filepath, _ in yield_note_records(limit, exclude_subfolders, where=where): yield filepath
+        return
+    for entry in yield_note_entries(limit, exclude_subfolders):
+        yield entry.path
+
+def is_note_path(filepath: str) -> bool:
+    """ Returns whether a file is a note which would be yielded when walking the vault: a .md file inside the vault, and not inside Obsidian's own folders or the folders and patterns excluded in constants.py. Used to check single files (e.g. ones which have just changed) without walking the vault. """
+    return os.path.normcase(filepath).endswith(os.path.normcase('.md')) and not is_excluded_path(filepath)
+
+def is_excluded_path(path: str, is_folder: bool = False) -> bool:
+    """ Returns whether a file (or, if is_folder is True, a folder) is skipped when walking the vault, applying the same rules as walk_vault to each folder on its path. Paths outside the vault are always excluded. """
+    relative_path = os.path.relpath(path, c.vault_path)
+    if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep): return True
+    excluded_folders = {_normalise_relative_path(folder) for folder in c.excluded_folders}
+    exclude_patterns = ALWAYS_EXCLUDED_PATTERNS + list(c.excluded_patterns)
+
+    parts = _normalise_relative_path(relative_path).split('/')
+    for depth, name in enumerate(parts, start=1):
+        partial_path = '/'.join(parts[:depth])
+        if (depth < len(parts) or is_folder) and partial_path in excluded_folders: return True
+        if any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(partial_path, pattern) for pattern in exclude_patterns): return True
+    return False
+
+def _normalise_relative_path(path: str) -> str:
+    # Converts e.g. r"\first\folder" or "first/folder/" into "first/folder", to match the relative paths built while walking
+    return '/'.join(part for part in path.replace('\\', '/').split('/') if part)
+
+def yield_note_records(limit: int = -1, exclude_subfolders: bool = False, vault_index: VaultIndex | None = None, where: Where | None = None):
+    """
+    Yields the filepath and vault index record of each note in a vault.
+    Notes are only read if they have changed since the index was last saved (or not read at all, if the vault index is disabled in constants.py).
+    After a full walk of the vault, notes which no longer exist are removed from the index.
+
+    A VaultIndex can be passed in to make further use of it (e.g. to read outgoing links) while walking the vault. Otherwise one is loaded from the cache folder.
+    If a filter is given (see helpers/filters.py), only notes passing it are yielded (and counted towards the limit). Notes failing a filter on their path alone are not read at all.
+    """
+    if vault_index is None: vault_index = VaultIndex(c.vault_path, persistent=c.use_vault_index)
+    seen_filepaths = set()
+    walked_whole_vault = False
+    idx = 0
+    try:
+        for entry in yield_note_entries(limit if where is None else -1, exclude_subfolders):
+            seen_filepaths.add(entry.path)
+            if where is not None and not where.prefilter(entry.path): continue
+            record: IndexRecord = vault_index.get(entry.path, entry.stat())
+            if where is not None and not where(entry.path, record.properties): continue
+
+            # Limit number of matching files
+            if where is not None and 0 < limit <= idx: break
+            idx += 1
+            yield entry.path, record
+        else:
+            walked_whole_vault = (limit <= 0 or where is not None) and not exclude_subfolders
+    finally:
+        # Save even if the caller stops early, so that the work done so far is not lost
+        if walked_whole_vault: vault_index.evict_missing(seen_filepaths)
+        vault_index.save()
+
+def yield_notes(limit: int = -1, exclude_subfolders: bool = False, where: Where | None = None):
+    """
+    Yields each note in a vault as ObsidianNote object. Only the properties are read up front: the body text of each note is read when it is first accessed.
+    If a filter is given (see helpers/filters.py), it is tested on the (indexed) properties of each note, so notes which fail it are never loaded.
+    """
+    for filepath, record in yield_note_records(limit, exclude_subfolders, where=where):
+        obsidian_note: ObsidianNote = record.to_note(filepath)
         yield obsidian_note
 
-def yield_articles(limit: int = -1, exclude_subfolders: bool = False):
-    """ Yields only articles in a vault as ObsidianNote objects. """
+def yield_articles(limit: int = -1, exclude_subfolders: bool = False, where: Where | None = None):
+    """ Yields only articles in a vault as ObsidianNote objects. Articles (and notes passing the filter, if one is given) are identified from the (indexed) properties alone, so other notes are never loaded. """
 
     idx = 0
-    for obsidian_note in yield_notes(-1, exclude_subfolders):
-        if not any([obsidian_note.property_contains_value('tags', tag) for tag in c.article_tags]): continue
+    for filepath, record in yield_note_records(-1, exclude_subfolders, where=where):
+        if not properties_are_article(record.properties): continue
 
         # Limit number of files
         if limit > 0 and idx >= limit: break
         idx += 1
 
-        yield obsidian_note
\ No newline at end of file
+        instrumentation.current().count('articles')
+        yield record.to_note(filepath)
@@ -0,0 +1,51 @@
+""" Shared fixtures: every test runs against a small vault of its own in a temporary folder, with constants.py pointed at it. """
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants as c
+import helpers.link_graph
+import helpers.tag_index
+from helpers.bibtex_matcher import reset_bib_matcher
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    """ Returns the path of an empty vault (with a 'notes' folder), which constants.py points at for the test. """
+    vault_path = tmp_path / 'vault'
+    (vault_path / 'notes').mkdir(parents=True)
+    monkeypatch.setattr(c, 'vault_path', str(vault_path))
+    monkeypatch.setattr(c, 'excluded_folders', [])
+    monkeypatch.setattr(c, 'excluded_patterns', [])
+    monkeypatch.setattr(c, 'cache_folder', str(tmp_path / 'cache'))
+    monkeypatch.setattr(c, 'bibtext_location', str(vault_path / 'library.bib'))
+    monkeypatch.setattr(c, 'article_tags', ['document/article'])
+    monkeypatch.setattr(c, 'use_vault_index', True)
+
+    # Shared state left over from other tests
+    monkeypatch.setattr(helpers.link_graph, '_link_graph', helpers.link_graph.LinkGraph())
+    monkeypatch.setattr(helpers.tag_index, '_tag_index', helpers.tag_index.TagIndex())
+    _drop_bibdata()
+    yield vault_path
+    _drop_bibdata()
+
+def _drop_bibdata():
+    # Popped from the module rather than deleted with monkeypatch, whose check for the attribute would load the .bib file
+    for name in ('bibdata_entries', 'bibdata'): vars(c).pop(name, None)
+    reset_bib_matcher()
+
+@pytest.fixture
+def make_note(vault):
+    """ Returns a function writing a note (by name, in the 'notes' folder) and returning its path. """
+    def make_note(name: str, text: str) -> str:
+        filepath = os.path.join(vault, 'notes', f"{name}.md")
+        with open(filepath, 'w', encoding='utf-8', newline='') as file: file.write(text)
+        return filepath
+    return make_note
+
+def article(title: str, body: str = '', **properties) -> str:
+    """ Returns the text of an article note with the given title, properties and body. """
+    lines = ['---', f"title: {title}"] + [f"{label.replace('_', ' ')}: {value}" for label, value in properties.items()] + ['tags:', '  - document/article', '---']
+    return '\n'.join(lines) + '\n' + body
@@ -0,0 +1,84 @@
+import os
+import asyncio
+
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote, process_articles
+from helpers.batch_runner import run_parallel, run_pipelined
+
+# Note functions are defined at the top level, so that process workers can import them
+def count_words(note: ObsidianNote):
+    if note.properties['title'] == 'Unchanged': return
+    note.properties['words'] = str(sum(len(line.split()) for line in note.body_text))
+
+def fail_on_bad(note: ObsidianNote):
+    if note.properties['title'] == 'Bad': raise ValueError('bad note')
+    count_words(note)
+
+@pytest.fixture
+def notes(make_note):
+    names = [f"Note {number}" for number in range(12)] + ['Unchanged']
+    paths = [make_note(name, article(name, ' '.join(['word'] * (index + 1)) + '\n')) for index, name in enumerate(names)]
+    make_note('Not an article', '---\ntitle: Not an article\n---\nSome text\n')
+    return paths
+
+def read_vault(vault) -> dict[str, str]:
+    folder = os.path.join(vault, 'notes')
+    return {name: open(os.path.join(folder, name), encoding='utf-8').read() for name in sorted(os.listdir(folder))}
+
+def run(vault, capsys, func=count_words, **options) -> tuple[dict[str, str], str]:
+    process_articles(**options)(func)()
+    return read_vault(vault), capsys.readouterr().out.strip().splitlines()[-1]
+
+EXECUTORS = [dict(workers=4, executor='thread'), dict(workers=2, executor='process'), dict(workers=3, executor='async')]
+
+@pytest.mark.parametrize('options', EXECUTORS, ids=lambda options: options['executor'])
+def test_executor_gives_same_result_as_serial_run(vault, notes, capsys, options):
+    original = read_vault(vault)
+    serial, serial_summary = run(vault, capsys)
+    assert serial_summary == 'Finished processing articles! (13 processed, 12 written, 1 unchanged)'
+    assert ObsidianNote(notes[2]).properties['words'] == '3'
+
+    # The same run from the original vault
+    for name, text in original.items():
+        with open(os.path.join(vault, 'notes', name), 'w', encoding='utf-8') as file: file.write(text)
+    assert run(vault, capsys, **options) == (serial, serial_summary)
+
+@pytest.mark.parametrize('options', EXECUTORS, ids=lambda options: options['executor'])
+def test_executor_reports_failing_note_and_finishes_run(vault, notes, make_note, capsys, options):
+    make_note('Bad', article('Bad', 'Text\n'))
+    vault_after, summary = run(vault, capsys, fail_on_bad, **options)
+    assert summary == 'Finished processing articles! (13 processed, 12 written, 1 unchanged, 1 failed)'
+    assert 'words' not in vault_after['Bad.md'] and 'words: 12' in vault_after['Note 11.md']
+
+def test_serial_run_stops_at_failing_note(vault, make_note):
+    make_note('Bad', article('Bad', 'Text\n'))
+    with pytest.raises(ValueError): process_articles()(fail_on_bad)()
+
+def test_results_keep_order_of_notes(notes):
+    results = list(run_parallel(count_words, notes, write=False, workers=3))
+    assert [result.filepath for result in results] == notes
+    assert not any(result.written or result.error for result in results)
+
+def test_process_workers_reject_nested_functions(notes):
+    def nested(note: ObsidianNote): pass
+    with pytest.raises(ValueError, match='top level'): list(run_parallel(nested, notes, write=False, workers=2, executor='process'))
+
+def test_pipeline_runs_function_one_note_at_a_time(notes):
+    running, overlaps = [], []
+    def track(note: ObsidianNote):
+        overlaps.append(len(running))
+        running.append(note.filepath)
+        count_words(note)
+        running.remove(note.filepath)
+
+    results = run_pipelined(track, notes, write=True, workers=4)
+    assert [result.filepath for result in results] == notes
+    assert set(overlaps) == {0}
+    assert sum(result.written for result in results) == 12
+
+def test_pipeline_runs_inside_event_loop(notes):
+    async def main(): return run_pipelined(count_words, notes, write=False)
+    results = asyncio.run(main())
+    assert len(results) == 13 and not any(result.error for result in results)
@@ -0,0 +1,44 @@
+import os
+
+import constants as c
+from benchmarks.generate_vault import VaultSpec, generate_vault
+from benchmarks.run_benchmarks import BenchmarkRunner, compare_results
+from helpers import ObsidianNote, yield_articles, yield_note_paths
+
+def vault_files(vault_path: str) -> dict[str, bytes]:
+    files = {}
+    for folder, _, names in os.walk(vault_path):
+        for name in names:
+            with open(os.path.join(folder, name), 'rb') as file: files[os.path.relpath(os.path.join(folder, name), vault_path)] = file.read()
+    return files
+
+def test_generated_vault_has_shape_of_spec(vault, tmp_path):
+    spec = VaultSpec(notes=20, article_ratio=0.25, excluded_files=3, body_lines=5, links_per_note=2)
+    generated = generate_vault(str(tmp_path / 'generated'), spec)
+    c.vault_path, c.excluded_folders = generated.vault_path, [generated.excluded_folder]
+
+    assert len(generated.note_names) == 20 and len(generated.article_names) == 5
+    assert len(list(yield_note_paths())) == 20  # the templates are excluded
+    assert sorted(note.filename[:-3] for note in yield_articles()) == sorted(generated.article_names)
+    note = ObsidianNote(os.path.join(generated.vault_path, 'Articles', f"{generated.article_names[0]}.md"))
+    assert note.properties['citation key'] == generated.citation_keys[0] and len(note.body_text) == 6
+
+def test_same_spec_generates_same_vault(tmp_path):
+    spec = VaultSpec(notes=10, seed=3)
+    generate_vault(str(tmp_path / 'first'), spec)
+    generate_vault(str(tmp_path / 'second'), spec)
+    generate_vault(str(tmp_path / 'other'), VaultSpec(notes=10, seed=4))
+    assert vault_files(tmp_path / 'first') == vault_files(tmp_path / 'second') != vault_files(tmp_path / 'other')
+
+def test_benchmarks_run_on_small_vault(vault, tmp_path, capsys):
+    results = BenchmarkRunner(VaultSpec(notes=12, body_lines=4), repeats=1, workdir=str(tmp_path / 'bench')).run()
+    assert {'note_parse', 'yield_articles_warm', 'bibtex_lookup', 'process_articles_write', 'rename_files'} <= set(results['results'])
+    assert all(result['best_s'] >= 0 for result in results['results'].values())
+    assert results['meta']['spec']['notes'] == 12
+
+def test_compare_results_flags_regressions(capsys):
+    meta = {'spec': {'notes': 10}}
+    old = {'meta': meta, 'results': {'fast': {'best_s': 1.0}, 'slow': {'best_s': 1.0}, 'removed': {'best_s': 1.0}}}
+    new = {'meta': meta, 'results': {'fast': {'best_s': 0.5}, 'slow': {'best_s': 1.5}, 'added': {'best_s': 1.0}}}
+    assert compare_results(new, old) == ['slow']
+    assert 'REGRESSION' in capsys.readouterr().out
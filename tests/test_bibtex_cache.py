@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from helpers.bibtex_cache import CachedBibEntries, load_bibdata_entries, cache_path_for
+
+LIBRARY = """@article{Smith2020Cells,
+  title = {Cells},
+  author = {Smith, Jane and Doe, John},
+  year = {2020}
+}
+
+@book{doe2019,
+  title = {A Book},
+  year = {2019}
+}
+"""
+
+@pytest.fixture
+def bibtex_location(vault):
+    bibtex_location = vault / 'library.bib'
+    bibtex_location.write_text(LIBRARY, encoding='utf-8')
+    return str(bibtex_location)
+
+def test_lookups_ignore_case(bibtex_location, tmp_path):
+    entries = load_bibdata_entries(bibtex_location, str(tmp_path / 'cache'))
+    assert 'smith2020cells' in entries and 'DOE2019' in entries and 42 not in entries
+    assert entries['SMITH2020CELLS'] is entries['Smith2020Cells']
+    assert [str(person) for person in entries['smith2020cells'].persons['author']] == ['Smith, Jane', 'Doe, John']
+    with pytest.raises(KeyError): entries['smith2021']
+
+def test_iteration_keeps_spelling_of_keys(bibtex_location, tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    load_bibdata_entries(bibtex_location, cache_folder)
+    assert os.path.exists(cache_path_for(bibtex_location, cache_folder))
+
+    # Loaded from the cache this time
+    entries = load_bibdata_entries(bibtex_location, cache_folder)
+    assert list(entries) == ['Smith2020Cells', 'doe2019']
+    assert entries['Doe2019'].fields['title'] == 'A Book'
+
+def test_raw_entries_round_trip(bibtex_location, tmp_path):
+    # The form sent to process workers, which rebuild the entries from it
+    entries = load_bibdata_entries(bibtex_location, str(tmp_path / 'cache'))
+    copy = CachedBibEntries(entries.raw_entries())
+    assert list(copy) == list(entries)
+    assert copy['smith2020cells'].fields['year'] == '2020'
+
+def test_changed_file_is_parsed_again(bibtex_location, tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    load_bibdata_entries(bibtex_location, cache_folder)
+    with open(bibtex_location, 'a', encoding='utf-8') as file: file.write("\n@misc{added2021,\n  title = {Added}\n}\n")
+    assert 'Added2021' in load_bibdata_entries(bibtex_location, cache_folder)
+
+def test_unreadable_cache_is_rebuilt(bibtex_location, tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    load_bibdata_entries(bibtex_location, cache_folder)
+    with open(cache_path_for(bibtex_location, cache_folder), 'wb') as file: file.write(b'not a pickle')
+    assert len(load_bibdata_entries(bibtex_location, cache_folder)) == 2
@@ -0,0 +1,66 @@
+import pytest
+
+from helpers.bibtex_index import MappedBibEntries
+
+LIBRARY = """@string{nat = "Nature"}
+
+@article{Smith2020Cells,
+  title = {Cells},
+  journal = nat,
+  author = {Smith, Jane},
+  year = {2020}
+}
+
+@book{doe2019,
+  title = {A Book},
+  year = {2019}
+}
+"""
+
+@pytest.fixture
+def entries(vault, tmp_path):
+    bibtex_location = vault / 'library.bib'
+    bibtex_location.write_text(LIBRARY, encoding='utf-8')
+    return MappedBibEntries(str(bibtex_location), str(tmp_path / 'cache'))
+
+def test_lookups_ignore_case(entries):
+    assert 'smith2020cells' in entries and 'SMITH2020CELLS' in entries and 'DOE2019' in entries
+    assert entries['smith2020cells'].fields['title'] == 'Cells'
+    assert entries['smith2020cells'] is entries['Smith2020Cells']  # parsed once
+    assert entries['Doe2019'].fields['year'] == '2019'
+    assert 'smith2021' not in entries and 42 not in entries
+    with pytest.raises(KeyError): entries['smith2021']
+
+def test_iteration_keeps_spelling_of_keys(entries):
+    assert list(entries) == ['Smith2020Cells', 'doe2019']
+    assert len(entries) == 2
+
+def test_string_macros_are_expanded(entries):
+    assert entries['SMITH2020CELLS'].fields['journal'] == 'Nature'
+    assert str(entries['SMITH2020CELLS'].persons['author'][0]) == 'Smith, Jane'
+
+def test_keys_differing_only_in_case_are_duplicates(vault, tmp_path):
+    bibtex_location = vault / 'library.bib'
+    bibtex_location.write_text(LIBRARY + "\n@misc{SMITH2020cells,\n  title = {Other}\n}\n", encoding='utf-8')
+    entries = MappedBibEntries(str(bibtex_location), str(tmp_path / 'cache'))
+    assert list(entries) == ['Smith2020Cells', 'doe2019']
+    assert entries['SMITH2020cells'].fields['title'] == 'Cells'
+
+def test_changed_file_is_reindexed_for_every_access(vault, entries):
+    assert 'added2021' not in entries
+    with open(vault / 'library.bib', 'a', encoding='utf-8') as file: file.write("\n@misc{Added2021,\n  title = {Added}\n}\n")
+    assert 'added2021' in entries
+    assert len(entries) == 3 and list(entries)[-1] == 'Added2021'
+    assert entries['ADDED2021'].fields['title'] == 'Added'
+
+@pytest.mark.parametrize('opening, closing', [('{', '}'), ('(', ')')])
+def test_field_line_starting_with_at_does_not_end_entry(vault, tmp_path, opening, closing):
+    bibtex_location = vault / 'library.bib'
+    bibtex_location.write_text(
+        f"@article{opening}Jones2021,\n  abstract = {{First line\n@misc{{quoted}} on the second line}},\n  year = {{2021}}\n{closing}\n\n"
+        "@misc{after2022,\n  title = {After}\n}\n", encoding='utf-8')
+    entries = MappedBibEntries(str(bibtex_location), str(tmp_path / 'cache'))
+    assert list(entries) == ['Jones2021', 'after2022']
+    assert entries['Jones2021'].fields['year'] == '2021'
+    assert entries['Jones2021'].fields['abstract'] == 'First line @misc{quoted} on the second line'
+    assert entries['after2022'].fields['title'] == 'After'
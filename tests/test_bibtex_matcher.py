@@ -0,0 +1,41 @@
+import pytest
+
+from helpers import bibtex_index
+from helpers.bibtex_matcher import BibMatcher, get_bib_matcher
+
+LIBRARY = """@string{nat = "Nature"}
+
+@article{Smith2020Cells,
+  title = {The Structure of {Living} Cells},
+  journal = nat,
+  author = {Smith, Jane and Doe, John},
+  doi = {10.1000/ABC.123},
+  year = {2020}
+}
+
+@book{doe2019,
+  title = {A Book about Proteins},
+  author = {Doe, John},
+  date = {2019-05-01}
+}
+"""
+
+@pytest.fixture
+def library(vault):
+    (vault / 'library.bib').write_text(LIBRARY, encoding='utf-8')
+
+def test_cold_cache_parses_library_once(library, monkeypatch):
+    # Building the keys must not go through the entry-by-entry parse of the mmap backend
+    def parse_entry(*args): raise AssertionError("entry parsed on its own")
+    monkeypatch.setattr(bibtex_index.MappedBibEntries, '_parse_entry', parse_entry)
+    matcher = get_bib_matcher()
+    assert matcher.match(doi='https://doi.org/10.1000/abc.123').citation_key == 'Smith2020Cells'
+    match = matcher.match(title='A book about proteins', author='John Doe', year='2019')
+    assert match.citation_key == 'doe2019' and match.confidence > 0.9
+
+def test_warm_cache_is_used(library, monkeypatch):
+    import constants as c
+    get_bib_matcher()
+    monkeypatch.setattr('helpers.bibtex_matcher.entry_keys_from_entries', lambda entries: pytest.fail("keys rebuilt"))
+    matcher = BibMatcher.from_bibtex(c.bibtext_location, c.cache_folder)
+    assert matcher.match(title='The structure of living cells').citation_key == 'Smith2020Cells'
@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote
+from helpers.bulk_replace import BulkReplacer, bulk_replace, trie_pattern
+from helpers.decorators import _run_key
+
+def test_longest_overlapping_term_wins():
+    replacer = BulkReplacer({'J': 'X', 'J. Biol.': 'Journal of Biology', 'J. Biol. Chem.': 'Journal of Biological Chemistry'})
+    text, hits = replacer.replace('J. Biol. Chem. and J. Biol. and J')
+    assert text == 'Journal of Biological Chemistry and Journal of Biology and X'
+    assert hits == {'J. Biol. Chem.': 1, 'J. Biol.': 1, 'J': 1}
+
+def test_replacements_are_not_replaced_again():
+    replacer = BulkReplacer({'a': 'b', 'b': 'a'})
+    assert replacer.replace('a b ab')[0] == 'b a ab'
+
+def test_whole_words():
+    replacer = BulkReplacer({'Nat': 'Nature', 'C++': 'CPP'})
+    assert replacer.replace('Nat, Nature, Nat.Commun (Nat) C++ xC++')[0] == 'Nature, Nature, Nature.Commun (Nature) CPP xC++'
+    assert BulkReplacer({'Nat': 'Nature'}, whole_words=False).replace('Nat, Nation')[0] == 'Nature, Natureion'
+
+def test_ignore_case():
+    replacer = BulkReplacer({'nat. commun.': 'Nature Communications'}, ignore_case=True)
+    assert replacer.replace('NAT. COMMUN. and Nat. Commun.')[0] == 'Nature Communications and Nature Communications'
+    assert BulkReplacer({'nat': 'Nature'}).replace('Nat')[0] == 'Nat'
+
+def test_code_and_links_are_skipped():
+    replacer = BulkReplacer({'Nat': 'Nature'})
+    text = '\n'.join(['Nat `Nat` [[Nat]] [[Nat|Nat]] [Nat](Nat.md) https://nat.org/Nat', '```', 'Nat', '```', 'Nat'])
+    expected = '\n'.join(['Nature `Nat` [[Nat]] [[Nat|Nature]] [Nature](Nat.md) https://nat.org/Nat', '```', 'Nat', '```', 'Nature'])
+    assert replacer.replace(text)[0] == expected
+    assert BulkReplacer({'Nat': 'Nature'}, skip_code=False, skip_links=False).replace('`Nat` [[Nat]]')[0] == '`Nature` [[Nature]]'
+
+@pytest.mark.parametrize('terms', [['cat', 'car', 'cart'], ['a', 'ab', 'abc', 'b'], ['x.y', 'x*y', '[', ']'], []])
+def test_trie_pattern_matches_exactly_the_terms(terms):
+    pattern = re.compile(f"(?:{trie_pattern(terms)})\\Z")
+    for term in terms: assert pattern.match(term)
+    for other in ('', 'ca', 'carts', 'x', 'xzy', 'abcd'):
+        if other not in terms: assert not pattern.match(other)
+
+def test_bulk_replace_rewrites_only_notes_with_terms(make_note, capsys):
+    a = make_note('A', article('A', 'Published in Nat\n', journal='Nat'))
+    b = make_note('B', article('B', 'Nothing here\n'))
+    mtime = ObsidianNote(b)._file_state
+    replacer = bulk_replace({'Nat': 'Nature'})
+    assert ObsidianNote(a).body_text[0] == 'Published in Nature'
+    assert ObsidianNote(a).properties['journal'] == 'Nat'  # properties are never rewritten
+    assert ObsidianNote(b)._file_state == mtime
+    assert replacer.notes_changed == 1 and '1 replacements of 1 of 1 terms, in 1 notes.' in capsys.readouterr().out
+
+def test_run_key_depends_on_replacements_and_options():
+    keys = {
+        _run_key(BulkReplacer({'a': 'b'})),
+        _run_key(BulkReplacer({'a': 'c'})),
+        _run_key(BulkReplacer({'a': 'b'}, ignore_case=True)),
+    }
+    assert len(keys) == 3
+    assert _run_key(BulkReplacer({'a': 'b', 'c': 'd'})) == _run_key(BulkReplacer({'c': 'd', 'a': 'b'}))
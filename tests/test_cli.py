@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import article
+import constants as c
+from helpers import ObsidianNote
+from helpers.cli import main, load_function
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = """from helpers import ObsidianNote, process_articles, has_property
+
+def add_journal(note: ObsidianNote):
+    note.properties['journal'] = 'J'
+
+@process_articles(where=has_property('year'))
+def add_decade(note: ObsidianNote):
+    note.properties['decade'] = note.properties['year'][:3] + '0s'
+"""
+
+@pytest.fixture
+def cli(vault, tmp_path, monkeypatch):
+    """ Returns a function running the command line on the test vault with the given arguments, returning the exit code. """
+    monkeypatch.setattr(c, 'relative_bibtex_location', c.relative_bibtex_location)
+    (tmp_path / 'functions.py').write_text(FUNCTIONS, encoding='utf-8')
+    def cli(*args: str, vault_options: bool = True) -> int:
+        options = ['--vault', str(vault), '--cache-folder', str(tmp_path / 'cache')] if vault_options else []
+        return main(options + list(args))
+    return cli
+
+@pytest.fixture
+def functions(tmp_path) -> str:
+    return str(tmp_path / 'functions.py')
+
+def test_run_function_from_file(cli, functions, make_note, capsys):
+    a = make_note('A', article('A'))
+    other = make_note('Other', '---\ntitle: Other\n---\n')
+    assert cli('run', f"{functions}:add_journal") == 0
+    assert ObsidianNote(a).properties['journal'] == 'J' and 'journal' not in ObsidianNote(other).properties
+    assert 'Finished processing articles! (1 processed, 1 written, 0 unchanged)' in capsys.readouterr().out
+
+    assert cli('run', f"{functions}:add_journal", '--all-notes', '--workers', '2') == 0
+    assert ObsidianNote(other).properties['journal'] == 'J'
+
+def test_run_keeps_filters_of_decorated_function(cli, functions, make_note, capsys):
+    a, b = make_note('A', article('A', year='1994')), make_note('B', article('B'))
+    assert cli('run', f"{functions}:add_decade") == 0
+    assert ObsidianNote(a).properties['decade'] == '1990s' and 'decade' not in ObsidianNote(b).properties
+
+def test_dry_run_writes_nothing(cli, functions, make_note, capsys):
+    a = make_note('A', article('A'))
+    assert cli('run', f"{functions}:add_journal", '--dry-run') == 0
+    assert 'journal' not in ObsidianNote(a).properties
+
+def test_bad_function_exits_with_message(cli, functions, make_note):
+    with pytest.raises(SystemExit, match="could not load function 'no_colon'"): cli('run', 'no_colon')
+    with pytest.raises(SystemExit, match='missing'): cli('run', f"{functions}:missing")
+    with pytest.raises(ValueError): load_function('module:')
+
+def test_settings_from_config_file(cli, vault, tmp_path, make_note, capsys):
+    make_note('A', '---\ntitle: A\ntags:\n  - document/book\n  - topic/bio\n---\n')
+    config = tmp_path / 'vault.toml'
+    config.write_text(f"vault_path = {json.dumps(str(vault))}\narticle_tags = ['document/book']\ncache_folder = {json.dumps(str(tmp_path / 'cache'))}\n", encoding='utf-8')
+    assert cli('--config', str(config), 'tags', 'topic', vault_options=False) == 0
+    assert c.article_tags == ['document/book'] and c.bibtext_location == os.path.join(str(vault), c.relative_bibtex_location)
+    assert capsys.readouterr().out.split() == ['topic/bio', '1']
+
+    # Options on the command line take precedence over the config file
+    assert cli('--config', str(config), '--article-tag', 'document/article', 'tags', vault_options=False) == 0
+    assert c.article_tags == ['document/article']
+
+def test_bad_settings_are_usage_errors(cli, tmp_path, capsys):
+    config = tmp_path / 'vault.json'
+    config.write_text(json.dumps({'not_a_setting': 1}), encoding='utf-8')
+    with pytest.raises(SystemExit) as exit_info: cli('--config', str(config), 'tags')
+    assert exit_info.value.code == 2 and 'unknown settings' in capsys.readouterr().err
+    with pytest.raises(SystemExit): cli('--vault', str(tmp_path / 'missing'), 'tags', vault_options=False)
+    assert 'does not exist' in capsys.readouterr().err
+
+def test_tags_and_properties(cli, make_note, capsys):
+    make_note('A', article('A', journal='J'))
+    make_note('B', '---\ntitle: B\njournal:\n  - J\n  - K\ntags:\n  - document/article\n  - topic/bio\n---\n')
+    assert cli('tags', 'document') == 0
+    assert capsys.readouterr().out.split() == ['document/article', '2']
+    assert cli('tags', 'missing') == 1
+    assert capsys.readouterr().out == "No tags under 'missing'.\n"
+
+    assert cli('properties') == 0
+    counts = [line.split(maxsplit=2) for line in capsys.readouterr().out.splitlines()]
+    assert counts == [['title', '2'], ['journal', '2', '(a list in 1 notes, a single value in 1)'], ['tags', '2']]
+
+def test_replace_from_csv(cli, make_note, tmp_path, capsys):
+    a = make_note('A', article('A', 'The Fourier transform of Fourier.\n'))
+    mapping = tmp_path / 'terms.csv'
+    mapping.write_text('Fourier transform,[[Fourier transform]]\nFourier,[[Joseph Fourier]]\n', encoding='utf-8')
+    assert cli('replace', str(mapping)) == 0
+    assert ObsidianNote(a).body_text[0] == 'The [[Fourier transform]] of [[Joseph Fourier]].'
+
+    mapping.write_text('one,two,three\n', encoding='utf-8')
+    assert cli('replace', str(mapping)) == 2
+    assert 'do not have exactly two columns' in capsys.readouterr().err
+
+def test_commands_only_import_what_they_use(vault, make_note, tmp_path):
+    make_note('A', article('A'))
+    code = ("import sys; from helpers.cli import main; "
+            f"main(['--vault', {str(vault)!r}, '--cache-folder', {str(tmp_path / 'cache')!r}, 'tags']); "
+            "print(sorted(name for name in ('pybtex', 'regex', 'asyncio') if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == '[]'
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from conftest import article
+import constants as c
+from helpers import ObsidianNote, process_articles, yield_notes, yield_articles
+from helpers import has_property, property_equals, property_is_empty, tag_prefix, path_glob, is_article
+
+def check(where, properties: dict, relative_path: str = 'notes/A.md') -> bool:
+    return where(os.path.join(c.vault_path, relative_path), properties)
+
+@pytest.mark.parametrize('where, properties, expected', [
+    (has_property('journal'), {'journal': None}, True),
+    (has_property('journal'), {'title': 'A'}, False),
+    (property_equals('status', 'read'), {'status': 'read'}, True),
+    (property_equals('status', 'read'), {'status': ['unread', 'read']}, True),
+    (property_equals('status', 'read'), {'status': 'unread'}, False),
+    (property_is_empty('journal'), {'journal': ''}, True),
+    (property_is_empty('journal'), {'journal': []}, True),
+    (property_is_empty('journal'), {}, True),
+    (property_is_empty('journal'), {'journal': 'J'}, False),
+    (tag_prefix('#Document'), {'tags': ['document/article']}, True),
+    (tag_prefix('document'), {'tags': ['document']}, True),
+    (tag_prefix('document'), {'tags': ['documents']}, False),
+    (is_article(), {'tags': ['#Document/Article']}, True),
+    (is_article(), {'tags': ['document']}, False),
+])
+def test_filters(vault, where, properties, expected):
+    assert check(where, properties) is expected
+
+def test_filters_combine(vault):
+    where = has_property('journal') & ~property_equals('status', 'read') | path_glob('Inbox/*')
+    assert check(where, {'journal': 'J'})
+    assert not check(where, {'journal': 'J', 'status': 'read'})
+    assert check(where, {'status': 'read'}, 'Inbox/deep/B.md')
+    assert repr(where) == "((has_property('journal') & ~property_equals('status', 'read')) | path_glob('Inbox/*'))"
+
+def test_path_filters_are_tested_before_note_is_read(vault):
+    filepath = os.path.join(vault, 'notes', 'A.md')
+    assert not path_glob('Inbox/*').prefilter(filepath)
+    assert not (path_glob('Inbox/*') & has_property('journal')).prefilter(filepath)
+    assert (path_glob('Inbox/*') | has_property('journal')).prefilter(filepath)
+    assert not (~path_glob('notes/*')).prefilter(filepath)
+    assert has_property('journal').prefilter(filepath)
+
+def test_notes_failing_filter_are_never_loaded(vault, make_note, monkeypatch):
+    make_note('A', article('A', journal='J'))
+    make_note('B', article('B'))
+    make_note('C', '---\ntitle: C\njournal: K\n---\n')
+    assert sorted(note.filename for note in yield_notes(where=has_property('journal'))) == ['A.md', 'C.md']
+
+    # Every note is indexed now, so the filters only use the index
+    monkeypatch.setattr(ObsidianNote, '_read_file', staticmethod(lambda *args, **kwargs: pytest.fail('note was read')))
+    assert [note.filename for note in yield_articles(where=has_property('journal'))] == ['A.md']
+    assert list(yield_notes(where=path_glob('Inbox/*'))) == []
+
+def test_limit_counts_only_notes_passing_filter(vault, make_note):
+    for name in ('A', 'B', 'C', 'D'): make_note(name, article(name, **({'journal': 'J'} if name in 'BD' else {})))
+    seen = []
+    process_articles(limit=2, write=False, where=has_property('journal'))(lambda note: seen.append(note.filename))()
+    assert sorted(seen) == ['B.md', 'D.md']
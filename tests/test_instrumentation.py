@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote, process_articles, instrumentation
+from helpers.instrumentation import Instrumentation, instrumented
+
+def add_journal(note: ObsidianNote):
+    note.properties['journal'] = 'J'
+
+@pytest.fixture
+def articles(make_note):
+    return [make_note(f"Note {number}", article(f"Note {number}", 'Body\n')) for number in range(5)]
+
+def test_instrumented_run_writes_stats(vault, articles, tmp_path, capsys):
+    stats_path = tmp_path / 'stats.json'
+    process_articles(stats_path=str(stats_path))(add_journal)()
+    stats = json.loads(stats_path.read_text(encoding='utf-8'))
+
+    assert {'walk', 'user_function', 'write'} <= set(stats['phases'])
+    assert stats['phases']['user_function']['calls'] == 5
+    assert stats['counters']['notes_processed'] == 5 and stats['counters']['written'] == 5 and stats['counters']['files_seen'] == 5
+    assert sorted(note['filepath'] for note in stats['slowest_notes']) == sorted(articles)
+    assert 'Phase' in capsys.readouterr().out
+    assert instrumentation.current() is instrumentation.DISABLED  # restored once the run is over
+
+def test_runs_are_not_instrumented_by_default(vault, articles, capsys):
+    seen = []
+    process_articles()(lambda note: seen.append(instrumentation.current()))()
+    assert seen == [instrumentation.DISABLED] * 5
+    assert 'Phase' not in capsys.readouterr().out
+
+def test_only_slowest_notes_are_kept():
+    stats = Instrumentation(slowest_n=2)
+    for number, seconds in enumerate([0.3, 0.1, 0.5, 0.2]): stats.note_finished(f"note {number}", seconds)
+    assert stats.slowest_notes == [('note 2', 0.5), ('note 0', 0.3)]
+
+def test_phases_and_counters_add_up():
+    stats = Instrumentation()
+    with instrumented(stats):
+        for _ in range(3):
+            with instrumentation.current().phase('read'): pass
+        instrumentation.current().count('bytes_read', 10)
+        instrumentation.current().count('bytes_read', 5)
+    assert stats.phase_calls == {'read': 3} and stats.counters == {'bytes_read': 15}
+    assert stats.total_seconds >= stats.phase_seconds['read'] >= 0
+
+def test_cprofile_profiles_user_function(vault, articles, capsys):
+    process_articles(profile='cprofile')(add_journal)()
+    assert 'Profile of the user function:' in capsys.readouterr().out
+
+def test_unknown_profiler_is_rejected():
+    with pytest.raises(ValueError, match='Unknown profiler'): Instrumentation(profile='perf')
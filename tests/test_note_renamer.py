@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote, get_link_graph
+from helpers.note_renamer import NoteRenamer
+from helpers.run_journal import RunJournal
+
+@pytest.mark.parametrize('text, expected, links_replaced', [
+    ('[[A]] and [[B]]', '[[Z]] and [[B]]', 1),
+    ('[[A#Heading]] [[A#^block]] ![[A]]', '[[Z#Heading]] [[Z#^block]] ![[Z]]', 3),
+    ('[[A|an a/b alias]] [[B|A]]', '[[Z|an a/b alias]] [[B|A]]', 1),  # only the link name is replaced, never the alias
+    ('| [[A\\|alias]] |', '| [[Z\\|alias]] |', 1),  # a link in a table
+    ('[[folder/A]] [[Another]] [[a]]', '[[folder/Z]] [[Another]] [[a]]', 1),
+    ('No links to A', 'No links to A', 0),
+])
+def test_replace_links_replaces_only_link_names(text, expected, links_replaced):
+    renamer = NoteRenamer()
+    renamer.notes_to_rename = {'A': 'Z'}
+    assert renamer.replace_links(text) == (expected, links_replaced)
+
+def test_link_graph_finds_every_form_of_link(vault, make_note):
+    a = make_note('A', article('A', '[[B]] [[B#Heading]] [[B|alias]] [[B#^block]] [[folder/C]] | [[C\\|alias]] |\n'))
+    make_note('B', article('B', 'No links\n'))
+    graph = get_link_graph()
+    assert graph.outlinks_from(a) == ['B', 'C']
+    assert graph.backlinks_to('B') == {a} and graph.backlinks_to('C') == {a} and graph.backlinks_to('A') == set()
+
+def test_link_graph_refresh_follows_changes(vault, make_note):
+    a = make_note('A', article('A', '[[B]]\n'))
+    graph = get_link_graph()
+    make_note('A', article('A', '[[C]] and more\n'))
+    d = make_note('D', article('D', '[[C]]\n'))
+    get_link_graph(refresh=True)
+    assert graph.backlinks_to('B') == set() and graph.backlinks_to('C') == {a, d}
+    os.remove(a)
+    get_link_graph(refresh=True)
+    assert graph.backlinks_to('C') == {d}
+
+def test_rename_rewrites_only_linking_notes(vault, make_note, monkeypatch):
+    a = make_note('A', article('A', 'Body\n'))
+    b = make_note('B', article('B', 'See [[A]], [[A#Part|the part]] and [[Another]]\n'))
+    c = make_note('C', article('C', 'No links to A\n'))
+    get_link_graph()
+
+    opened = []
+    init = ObsidianNote.__init__
+    def recording_init(note, filepath, *args, **kwargs):
+        opened.append(filepath)
+        init(note, filepath, *args, **kwargs)
+    monkeypatch.setattr(ObsidianNote, '__init__', recording_init)
+
+    renamer = NoteRenamer()
+    renamer.add(a, 'A', 'Z')
+    assert renamer.rename_files() == 1
+    assert opened == [b]
+    assert ObsidianNote(b).body_text[0] == 'See [[Z]], [[Z#Part|the part]] and [[Another]]'
+    assert os.path.exists(os.path.join(vault, 'notes', 'Z.md')) and ObsidianNote(c).body_text[0] == 'No links to A'
+    assert get_link_graph().backlinks_to('Z') == {b}
+
+def test_note_which_cannot_be_written_is_reported(vault, make_note, monkeypatch):
+    a = make_note('A', article('A', 'Body\n'))
+    b = make_note('B', article('B', '[[A]]\n'))
+    c = make_note('C', article('C', '[[A]]\n'))
+    get_link_graph()
+
+    # As if B were modified while the links were being rewritten
+    write_file = ObsidianNote.write_file
+    monkeypatch.setattr(ObsidianNote, 'write_file', lambda note, *args, **kwargs: False if note.filepath == b else write_file(note, *args, **kwargs))
+    renamer = NoteRenamer()
+    renamer.add(a, 'A', 'Z')
+    with RunJournal('rename', ('test',)) as journal:
+        assert renamer.rename_files(journal) == 1
+        assert renamer.relinks_failed == [b]
+        assert not journal.is_relinked(b) and journal.is_relinked(c)
+
+    # B still links to the old name, in the file and in the link graph
+    assert ObsidianNote(b).body_text[0] == '[[A]]'
+    assert get_link_graph().outlinks_from(b) == ['A'] and get_link_graph().outlinks_from(c) == ['Z']
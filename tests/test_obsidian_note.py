@@ -0,0 +1,171 @@
+import os
+import pickle
+
+from conftest import article
+from helpers import ObsidianNote, yield_notes
+
+def test_replace_file_moves_lazily_loaded_note(vault, make_note):
+    make_note('A', article('A', 'Body line\n'))
+    obsidian_note = next(note for note in yield_notes() if note.filename == 'A.md')
+    new_filepath = os.path.join(vault, 'notes', 'B.md')
+
+    obsidian_note.replace_file(new_filepath)
+
+    assert not os.path.exists(os.path.join(vault, 'notes', 'A.md'))
+    with open(new_filepath, encoding='utf-8') as file: assert file.read() == article('A', 'Body line\n')
+    assert obsidian_note.filepath == new_filepath
+
+def test_replace_file_then_write_again(vault, make_note):
+    filepath = make_note('A', article('A', 'Body line\n'))
+    obsidian_note = ObsidianNote(filepath, lazy_body=True)
+    new_filepath = os.path.join(vault, 'notes', 'B.md')
+    obsidian_note.replace_file(new_filepath)
+
+    obsidian_note.properties['journal'] = 'J'
+    assert obsidian_note.write_file()
+    assert ObsidianNote(new_filepath).properties['journal'] == 'J'
+    assert ObsidianNote(new_filepath).body_text == ['Body line', '']
+
+def read(filepath: str) -> str:
+    with open(filepath, encoding='utf-8', newline='') as file: return file.read()
+
+def edit_externally(filepath: str, text: str) -> None:
+    # As another editor would: the new contents, with a modification time which is certainly different
+    with open(filepath, 'w', encoding='utf-8', newline='') as file: file.write(text)
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def crlf(text: str) -> str: return text.replace('\n', '\r\n')
+
+def test_write_file_splices_properties_onto_unread_body(make_note):
+    filepath = make_note('A', crlf(article('A', 'Body line\nSecond line\n')))
+    obsidian_note = ObsidianNote(filepath, lazy_body=True)
+    obsidian_note.properties['journal'] = 'J'
+
+    # The properties section is written with the line endings of the file
+    assert obsidian_note.write_file()
+    assert read(filepath) == crlf('---\ntitle: A\ntags:\n  - document/article\njournal: J\n---\nBody line\nSecond line\n')
+    assert obsidian_note._body_string is None  # the body was copied through without being read
+    assert not obsidian_note.write_file()  # unchanged since the last write
+    obsidian_note.properties['journal'] = 'K'
+    assert obsidian_note.write_file(in_place=True)
+    assert ObsidianNote(filepath).body_text == ['Body line', 'Second line', '']
+
+def test_write_file_keeps_line_endings_of_file(make_note):
+    for newline in ('\n', '\r\n'):
+        filepath = make_note('A', article('A', 'Body line\n').replace('\n', newline))
+        obsidian_note = ObsidianNote(filepath)
+        obsidian_note.body_text = ['Body line', 'Added line', '']
+        obsidian_note.properties['journal'] = 'J'
+
+        assert obsidian_note.write_file()
+        expected = '---\ntitle: A\ntags:\n  - document/article\njournal: J\n---\nBody line\nAdded line\n'
+        assert read(filepath) == expected.replace('\n', newline)
+
+def test_indexed_note_keeps_line_endings_of_file(make_note):
+    filepath = make_note('A', crlf(article('A', 'Body line\n')))
+    list(yield_notes())  # indexes the note
+    obsidian_note = next(note for note in yield_notes() if note.filename == 'A.md')
+    obsidian_note.properties['journal'] = 'J'
+
+    assert obsidian_note.write_file()
+    assert read(filepath) == crlf('---\ntitle: A\ntags:\n  - document/article\njournal: J\n---\nBody line\n')
+
+def test_write_file_in_place_keeps_body(make_note):
+    filepath = make_note('A', article('A', 'Body line\n', journal='Old'))
+    obsidian_note = ObsidianNote(filepath, lazy_body=True)
+    obsidian_note.properties['journal'] = 'New'  # same length, so the properties section is overwritten in place
+
+    assert obsidian_note.write_file(in_place=True)
+    assert read(filepath) == article('A', 'Body line\n', journal='New')
+    obsidian_note.properties['journal'] = 'Longer'  # no longer the same length, so the file is rewritten
+    assert obsidian_note.write_file(in_place=True)
+    assert read(filepath) == article('A', 'Body line\n', journal='Longer')
+
+def test_write_file_does_not_overwrite_externally_modified_file(make_note):
+    filepath = make_note('A', article('A', 'Body line\n'))
+    obsidian_note = ObsidianNote(filepath, lazy_body=True)
+    edited = article('A', 'Edited body line\n', year='2020')
+    edit_externally(filepath, edited)
+
+    obsidian_note.properties['journal'] = 'J'
+    assert not obsidian_note.write_file()
+    assert read(filepath) == edited
+
+def test_write_file_does_not_overwrite_externally_modified_file_with_new_body(make_note):
+    filepath = make_note('A', article('A', 'Body line\n'))
+    obsidian_note = ObsidianNote(filepath)
+    edited = article('A', 'Edited body line\n')
+    edit_externally(filepath, edited)
+
+    obsidian_note.body_text = ['New body line', '']
+    assert not obsidian_note.write_file()
+    assert read(filepath) == edited
+
+def test_lazy_body_is_read_from_modified_file(make_note):
+    filepath = make_note('A', article('A', 'Body line\n'))
+    obsidian_note = ObsidianNote(filepath, lazy_body=True)
+    edit_externally(filepath, article('A', 'Edited body line\n', year='2020'))
+
+    # The body no longer starts where it did when the properties were read
+    assert obsidian_note.body_text == ['Edited body line', '']
+    assert not obsidian_note.write_file(filepath=filepath, force=True)
+
+def test_write_file_skips_unchanged_note(make_note):
+    filepath = make_note('A', article('A', 'Body line\n', journal='J'))
+    os.utime(filepath, ns=(0, 0))
+    obsidian_note = ObsidianNote(filepath)
+    obsidian_note.properties['journal'] = 'J'
+    obsidian_note.body_text = list(obsidian_note.body_text)
+
+    assert not obsidian_note.write_file()
+    assert os.stat(filepath).st_mtime_ns == 0
+
+    assert obsidian_note.write_file(force=True)
+    assert os.stat(filepath).st_mtime_ns != 0 and read(filepath) == article('A', 'Body line\n', journal='J')
+
+def test_write_file_writes_unchanged_note_to_other_path(make_note):
+    filepath = make_note('A', article('A', 'Body line\n'))
+    assert ObsidianNote(filepath).write_file(copy=True)
+    assert read(filepath.replace('.md', '_copy.md')) == read(filepath)
+
+def test_properties_and_body_are_parsed_when_first_used(make_note, monkeypatch):
+    filepath = make_note('A', article('A', 'First\nSecond\n', journal='J'))
+    parse = ObsidianNote._properties_dict_from_flat
+    parses = []
+    monkeypatch.setattr(ObsidianNote, '_properties_dict_from_flat', lambda note, lines: parses.append(lines) or parse(note, lines))
+
+    obsidian_note = ObsidianNote(filepath)
+    assert not hasattr(obsidian_note, '__dict__')
+    assert obsidian_note.body_text == ['First', 'Second', ''] and parses == []
+    assert obsidian_note.properties['journal'] == 'J' and obsidian_note.properties['title'] == 'A'
+    assert len(parses) == 1
+
+def test_serialised_contents_follow_changes(make_note):
+    obsidian_note = ObsidianNote(make_note('A', article('A', 'Body\n')))
+    assert obsidian_note.file_contents_string is obsidian_note.file_contents_string  # cached
+
+    obsidian_note.properties['tags'].append('extra')
+    assert '  - extra' in obsidian_note.file_contents_string
+    obsidian_note.body_text[0] = 'New body'
+    assert obsidian_note.file_contents_string.endswith('---\nNew body\n')
+    del obsidian_note.properties['title']
+    assert 'title' not in obsidian_note.file_contents_string
+
+def test_containers_from_elsewhere_are_not_cached(make_note):
+    obsidian_note = ObsidianNote(make_note('A', article('A', 'Body\n')))
+    tags = ['one']
+    obsidian_note.properties['tags'] = tags
+    assert '  - one' in obsidian_note.file_contents_string
+    tags.append('two')  # the note cannot know about this change
+    assert '  - two' in obsidian_note.file_contents_string
+
+def test_pickled_note_keeps_tracking_changes(make_note):
+    obsidian_note = ObsidianNote(make_note('A', article('A', 'Body\n')))
+    obsidian_note.properties['journal'] = 'J'
+    copy = pickle.loads(pickle.dumps(obsidian_note))
+    assert copy.file_contents_string == obsidian_note.file_contents_string
+    copy.properties['tags'].append('extra')
+    copy.body_text.append('More')
+    assert '  - extra' in copy.file_contents_string and copy.file_contents_string.endswith('\nMore')
+    assert copy.write_file() and ObsidianNote(copy.filepath).properties['journal'] == 'J'
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote, Pipeline, Stage, process_articles, has_property
+
+def add_journal(note: ObsidianNote):
+    note.properties['journal'] = 'J'
+
+def mark_journal(note: ObsidianNote):
+    note.properties['marked'] = note.properties.get('journal', 'none')
+
+def mark_note(note: ObsidianNote):
+    note.properties['seen'] = 'yes'
+
+@process_articles(where=has_property('year'))
+def add_decade(note: ObsidianNote):
+    note.properties['decade'] = note.properties['year'][:3] + '0s'
+
+@pytest.fixture
+def writes(monkeypatch):
+    """ Records the filepath of every note which is written. """
+    write_file = ObsidianNote.write_file
+    writes = []
+    def recording_write(note, *args, **kwargs):
+        written = write_file(note, *args, **kwargs)
+        if written: writes.append(note.filepath)
+        return written
+    monkeypatch.setattr(ObsidianNote, 'write_file', recording_write)
+    return writes
+
+def test_stages_run_in_order_and_each_note_is_written_once(vault, make_note, writes, capsys):
+    a, b = make_note('A', article('A')), make_note('B', article('B'))
+    Pipeline([add_journal, mark_journal]).run()
+    assert ObsidianNote(a).properties['marked'] == 'J' and ObsidianNote(b).properties['marked'] == 'J'
+    assert sorted(writes) == sorted([a, b])
+    assert 'Finished pipeline! (2 written, 0 unchanged)' in capsys.readouterr().out
+
+def test_stages_run_only_on_notes_they_apply_to(vault, make_note, capsys):
+    a = make_note('A', article('A', year='1994'))
+    b = make_note('B', article('B'))
+    other = make_note('Other', '---\ntitle: Other\n---\n')
+    pipeline = Pipeline([add_decade, Stage(mark_note, articles_only=False), Stage(add_journal, where=has_property('year'))])
+    pipeline.run()
+
+    assert ObsidianNote(a).properties['decade'] == '1990s' and 'decade' not in ObsidianNote(b).properties
+    assert ObsidianNote(other).properties['seen'] == 'yes' and 'journal' not in ObsidianNote(other).properties
+    assert [stage.notes_run for stage in pipeline.stages] == [1, 3, 1]
+    assert pipeline.stages[0].name == 'add_decade'
+
+def test_failing_stage_leaves_note_unwritten(vault, make_note, writes, capsys):
+    a, b = make_note('A', article('A')), make_note('B', article('B'))
+    def fail_on_a(note: ObsidianNote):
+        if note.properties['title'] == 'A': raise ValueError('bad note')
+    pipeline = Pipeline([add_journal, fail_on_a, mark_journal])
+    pipeline.run()
+
+    assert writes == [b] and 'journal' not in ObsidianNote(a).properties
+    assert [len(stage.errors) for stage in pipeline.stages] == [0, 1, 0]
+    assert pipeline.stages[1].errors[0][0] == a and pipeline.stages[2].notes_run == 1
+    assert 'Finished pipeline! (1 written, 0 unchanged, 1 failed)' in capsys.readouterr().out
+
+def test_limit_counts_only_notes_with_stages(vault, make_note, capsys):
+    make_note('Other', '---\ntitle: Other\n---\n')
+    for name in ('A', 'B', 'C'): make_note(name, article(name))
+    pipeline = Pipeline([add_journal], limit=2)
+    pipeline.run()
+    assert pipeline.notes_written == 2
+
+def test_run_files_runs_only_given_notes(vault, make_note):
+    a, b = make_note('A', article('A')), make_note('B', article('B'))
+    pipeline = Pipeline([add_journal])
+    assert pipeline.run_files([a, str(vault / 'notes' / 'Deleted.md')]) == [a]
+    assert 'journal' not in ObsidianNote(b).properties
+    assert pipeline.run_files([a]) == []  # unchanged the second time
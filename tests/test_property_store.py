@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote
+from helpers.property_store import PropertyStore, PropertyOrder
+
+def test_behaves_like_ordered_dict():
+    properties = PropertyStore([('title', 'A'), ('year', '2020'), ('tags', ['x'])])
+    assert properties == {'title': 'A', 'year': '2020', 'tags': ['x']}
+    assert list(properties) == ['title', 'year', 'tags'] and list(reversed(properties)) == ['tags', 'year', 'title']
+    del properties['year']
+    properties['journal'] = 'J'
+    assert list(properties.items()) == [('title', 'A'), ('tags', ['x']), ('journal', 'J')]
+    assert PropertyStore(properties) == properties and properties.copy() is not properties
+
+def test_lookup_falls_back_to_case_insensitive():
+    properties = PropertyStore({'Title': 'A'})
+    assert properties['title'] == 'A' and 'TITLE' in properties and properties.get('tItLe') == 'A'
+    properties['title'] = 'B'  # sets the existing property, keeping its spelling
+    assert list(properties.items()) == [('Title', 'B')]
+    with pytest.raises(KeyError): properties['year']
+
+def test_labels_differing_only_in_case_are_kept():
+    properties = PropertyStore([('Tags', 'x'), ('title', 'A'), ('tags', ['y'])])
+    assert list(properties.items()) == [('Tags', 'x'), ('title', 'A'), ('tags', ['y'])]
+    assert properties['tags'] == ['y'] and properties['Tags'] == 'x' and properties['TAGS'] == 'x'  # exact matches first, then the first spelling
+
+    # Once one is removed, the other is found case-insensitively
+    del properties['Tags']
+    assert properties['TAGS'] == ['y']
+
+    properties.reorder(['tags', 'title'])
+    assert list(properties) == ['tags', 'title']
+
+def test_note_with_labels_differing_only_in_case_keeps_both(make_note):
+    filepath = make_note('A', '---\nTags: x\ntitle: A\ntags:\n  - document/article\n---\nBody\n')
+    obsidian_note = ObsidianNote(filepath)
+    obsidian_note.properties['journal'] = 'J'
+    obsidian_note.write_file()
+    assert ObsidianNote(filepath).properties == {'Tags': 'x', 'title': 'A', 'tags': ['document/article'], 'journal': 'J'}
+
+def test_insert_and_move():
+    properties = PropertyStore([('a', 1), ('b', 2), ('c', 3), ('d', 4)])
+    properties.insert_at('e', 5, 1)
+    properties.insert_after('f', 6, 'C')
+    properties.insert_before('a', 0, 'd')  # existing properties are moved, with their new value
+    properties.move_to_end('b', last=False)
+    assert list(properties.items()) == [('b', 2), ('e', 5), ('c', 3), ('f', 6), ('a', 0), ('d', 4)]
+    assert properties.index('F') == 3
+
+def test_reorder_keeps_unlisted_labels_in_order():
+    properties = PropertyStore([('x', 1), ('title', 'A'), ('y', 2), ('Tags', [])])
+    order = PropertyOrder(['tags', 'title', 'missing'])
+    properties.reorder(order)
+    assert list(properties) == ['Tags', 'title', 'x', 'y']
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote
+from helpers.property_table import load_property_table
+
+def read(filepath: str) -> str:
+    with open(filepath, encoding='utf-8', newline='') as file: return file.read()
+
+@pytest.fixture
+def notes(make_note):
+    return {
+        'A': make_note('A', article('A', 'Body of A\n', citation_key='smith2020', authors='Smith')),
+        'B': make_note('B', article('B', 'Body of B\n', journal='Nature', citation_key='doe2019')),
+        'C': make_note('C', '---\ntitle: C\nAuthors:\n  - Doe\n  - Smith\ntags:\n  - document/article\n---\n'),
+        'D': make_note('D', '---\ntitle: D\ntags:\n  - other\n---\nNot an article\n'),
+    }
+
+def row_of(table, filepath: str) -> int: return table.filepaths.index(filepath)
+
+def test_load_articles_only(notes):
+    table = load_property_table()
+    assert sorted(table.filepaths) == sorted(notes[name] for name in 'ABC')
+    assert len(load_property_table(yield_all_files=True)) == 4
+    assert table.counts() == {'title': 3, 'tags': 3, 'citation key': 2, 'authors': 2, 'journal': 1}
+
+def test_queries(notes):
+    table = load_property_table()
+    assert table.mixed_kinds() == {'authors': {'scalar': 1, 'list': 1, 'missing': 1}}
+    assert 'AUTHORS' in table and table.values('authors', [row_of(table, notes['C'])]) == [['Doe', 'Smith']]
+    assert table.value_counts('authors') == {'Smith': 2, 'Doe': 1}
+    assert sorted(table.rows_without('journal')) == sorted(row_of(table, notes[name]) for name in 'AC')
+    assert table.rows_where('journal', lambda value: value == 'Nature') == [row_of(table, notes['B'])]
+
+def test_write_only_changed_notes(notes):
+    table = load_property_table()
+    assert table.fill('journal', ['Science'] * len(table)) == 2  # B already has a journal
+    assert table.apply('journal', str.upper) == 3
+    assert table.delete('Authors', [row_of(table, notes['C'])]) == 1
+    assert table.reorder(['journal', 'title']) == 3
+    b = row_of(table, notes['B'])
+    table.set('journal', ['NATURE'], rows=[b])  # unchanged from the apply above
+    assert len(table.changed_rows) == 3
+
+    assert table.write() == 3
+    assert read(notes['C']) == '---\njournal: SCIENCE\ntitle: C\ntags:\n  - document/article\n---\n'
+    assert list(ObsidianNote(notes['A']).properties) == ['journal', 'title', 'citation key', 'authors', 'tags']
+    assert ObsidianNote(notes['A']).body_text == ['Body of A', '']
+    assert table.changed_rows == [] and table.write() == 0
+
+def test_modified_note_is_not_written(notes):
+    table = load_property_table()
+    table.set('journal', 'Science')
+    with open(notes['A'], 'a', encoding='utf-8') as file: file.write('Added in Obsidian\n')
+    assert table.write() == 2
+    assert 'journal' not in ObsidianNote(notes['A']).properties
+    assert ObsidianNote(notes['A']).body_text[-2] == 'Added in Obsidian'
+
+def test_note_with_labels_differing_only_in_case_is_left_out(notes, make_note):
+    duplicate = make_note('E', '---\ntitle: E\nJournal: x\njournal: y\ntags:\n  - document/article\n---\n')
+    table = load_property_table()
+    assert duplicate not in table.filepaths
+    table.set('journal', 'Science')
+    table.write()
+    assert ObsidianNote(duplicate).properties['Journal'] == 'x'
+
+def test_join_bibtex(vault, notes):
+    (vault / 'library.bib').write_text('@article{smith2020,\n  title = {Cells},\n  author = {Smith, Jane and Doe, John},\n  year = {2020}\n}\n', encoding='utf-8')
+    table = load_property_table()
+    joined = table.join_bibtex(['year', 'author'])
+    a, b, c = (row_of(table, notes[name]) for name in 'ABC')
+    assert (joined['year'][a], joined['year'][b], joined['year'][c]) == ('2020', None, None)
+    assert joined['author'][a] == 'Smith, Jane and Doe, John'
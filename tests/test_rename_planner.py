@@ -0,0 +1,143 @@
+import os
+
+import pytest
+
+from helpers import rename_planner
+from helpers.rename_planner import RenamePlan
+
+@pytest.fixture
+def notes(vault):
+    """ Returns a function creating notes (whose text is their name) in the 'notes' folder, returning their paths. """
+    folder = os.path.join(vault, 'notes')
+    def notes(*names: str) -> list[str]:
+        filepaths = [os.path.join(folder, f"{name}.md") for name in names]
+        for name, filepath in zip(names, filepaths):
+            with open(filepath, 'w', encoding='utf-8') as file: file.write(name)
+        return filepaths
+    return notes
+
+def contents(vault) -> dict[str, str]:
+    """ Returns the text of every file in the 'notes' folder, by file name. """
+    folder = os.path.join(vault, 'notes')
+    result = {}
+    for filename in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, filename), encoding='utf-8') as file: result[filename] = file.read()
+    return result
+
+def plan(renames: dict[str, str]) -> RenamePlan:
+    rename_plan = RenamePlan()
+    for filepath, new_name in renames.items(): rename_plan.add(filepath, new_name)
+    return rename_plan
+
+def test_plain_rename(vault, notes):
+    a, = notes('A')
+    renames = plan({a: 'B.md'}).execute()  # the extension is optional
+    assert [(rename.old_name, rename.new_name, rename.via_temporary) for rename in renames] == [('A', 'B', False)]
+    assert contents(vault) == {'B.md': 'A'}
+
+def test_renaming_to_the_same_name_is_not_planned(notes):
+    a, = notes('A')
+    assert len(plan({a: 'A'})) == 0
+
+def test_swap_goes_through_temporary_name(vault, notes):
+    a, b = notes('A', 'B')
+    rename_plan = plan({a: 'B', b: 'A'})
+    assert rename_plan.validate() == []
+    assert all(rename.via_temporary for rename in rename_plan.renames.values())
+    rename_plan.execute()
+    assert contents(vault) == {'A.md': 'B', 'B.md': 'A'}
+
+def test_chain(vault, notes):
+    a, b = notes('A', 'B')
+    rename_plan = plan({a: 'B', b: 'C'})
+    assert rename_plan.validate() == []
+    assert rename_plan.renames[b].via_temporary and not rename_plan.renames[a].via_temporary
+    rename_plan.execute()
+    assert contents(vault) == {'B.md': 'A', 'C.md': 'B'}
+
+def test_cycle_of_three(vault, notes):
+    a, b, c = notes('A', 'B', 'C')
+    plan({a: 'B', b: 'C', c: 'A'}).execute()
+    assert contents(vault) == {'A.md': 'C', 'B.md': 'A', 'C.md': 'B'}
+
+def test_case_only_rename(vault, notes):
+    a, = notes('note')
+    plan({a: 'Note'}).execute()
+    assert contents(vault) == {'Note.md': 'note'}
+
+def test_collision_between_renames(vault, notes):
+    a, b = notes('A', 'B')
+    problems = plan({a: 'C', b: 'c'}).validate()  # names are compared case-insensitively
+    assert len(problems) == 2 and all("2 notes would be renamed to" in rename.problem for rename in problems)
+
+def test_existing_target(notes):
+    a, b = notes('A', 'B')
+    problems = plan({a: 'B'}).validate()
+    assert [rename.problem for rename in problems] == ["'B.md' already exists"]
+
+@pytest.mark.parametrize('new_name', ['', '  ', 'a/b', 'what?', '[[link]]', 'tag#', '.hidden', 'ends with dot.', 'ends with space ', 'CON', 'lpt1.backup', 'x' * 300, 'tab\there'])
+def test_unsafe_names(notes, new_name):
+    a, = notes('A')
+    problems = plan({a: new_name}).validate()
+    assert len(problems) == 1 and problems[0].problem
+
+def test_notes_sharing_a_name_must_be_renamed_alike(vault, notes):
+    a, = notes('A')
+    os.makedirs(os.path.join(vault, 'other'))
+    other_a = os.path.join(vault, 'other', 'A.md')
+    with open(other_a, 'w', encoding='utf-8') as file: file.write('other A')
+    assert len(plan({a: 'B', other_a: 'C'}).validate()) == 2
+    assert plan({a: 'B', other_a: 'B'}).validate() == []
+
+def test_invalid_rename_blocks_the_notes_waiting_on_it(notes):
+    # C cannot move out of the way of B, so B cannot move out of the way of A
+    a, b, c = notes('A', 'B', 'C')
+    rename_plan = plan({a: 'B', b: 'C', c: 'bad:name'})
+    problems = rename_plan.validate()
+    assert [rename.source for rename in problems] == [a, b, c]
+    assert all("its own rename has a problem" in rename.problem for rename in problems[:2])
+    assert not any(rename.via_temporary for rename in rename_plan.renames.values())
+
+def test_invalid_batch_is_not_carried_out(vault, notes):
+    a, b = notes('A', 'B')
+    with pytest.raises(ValueError): plan({a: 'C', b: 'bad?'}).execute()
+    assert contents(vault) == {'A.md': 'A', 'B.md': 'B'}
+
+def test_skip_invalid_carries_out_the_rest(vault, notes):
+    a, b = notes('A', 'B')
+    renames = plan({a: 'C', b: 'bad?'}).execute(skip_invalid=True)
+    assert [rename.source for rename in renames] == [a]
+    assert contents(vault) == {'B.md': 'B', 'C.md': 'A'}
+
+def test_report_does_not_touch_files(vault, notes):
+    a, b = notes('A', 'B')
+    report = plan({a: 'B', b: 'A'}).report()
+    assert report.startswith("2 notes to rename (2 via temporary names), 0 with problems.")
+    assert contents(vault) == {'A.md': 'A', 'B.md': 'B'}
+
+@pytest.mark.parametrize('failing_move', [1, 2, 3, 4, 5])
+def test_failed_move_is_rolled_back(vault, notes, monkeypatch, failing_move):
+    # A and B swap (4 moves, starting with the temporary ones) and C moves to D
+    a, b, c = notes('A', 'B', 'C')
+    move = rename_planner._move
+    moves = []
+    def failing(source, target):
+        moves.append((source, target))
+        if len(moves) == failing_move: raise OSError('disk full')
+        move(source, target)
+
+    monkeypatch.setattr(rename_planner, '_move', failing)
+    with pytest.raises(OSError): plan({a: 'B', b: 'A', c: 'D'}).execute()
+    assert contents(vault) == {'A.md': 'A', 'B.md': 'B', 'C.md': 'C'}  # no temporary files left either
+
+def test_move_does_not_replace_existing_file(vault, notes):
+    # The target may appear after the plan was validated
+    a, b = notes('A', 'B')
+    with pytest.raises(FileExistsError): rename_planner._move(a, b)
+    assert contents(vault) == {'A.md': 'A', 'B.md': 'B'}
+
+def test_name_with_folder_is_not_moved_out_of_its_folder(vault, notes):
+    a, = notes('A')
+    rename_plan = plan({a: 'sub/B'})
+    assert [rename.new_name for rename in rename_plan.validate()] == ['sub/B']
+    assert "not allowed" in rename_plan.renames[a].problem
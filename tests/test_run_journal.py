@@ -0,0 +1,150 @@
+import os
+import glob
+
+import pytest
+
+from conftest import article
+import constants as c
+from helpers import ObsidianNote, process_articles, rename_articles, rename_planner
+from helpers.run_journal import RunJournal
+
+class Interrupted(BaseException):
+    """ Stands in for Ctrl+C, which is not caught as an Exception either. """
+
+def journals() -> list[str]:
+    return glob.glob(os.path.join(c.cache_folder, 'run-journal-*'))
+
+def read(filepath: str) -> str:
+    with open(filepath, encoding='utf-8') as file: return file.read()
+
+@pytest.fixture
+def articles(make_note):
+    return [make_note(f"Note {number}", article(f"Note {number}", 'Body\n')) for number in range(10)]
+
+def test_interrupted_serial_run_resumes_where_it_stopped(articles):
+    calls = []
+    def count_runs(note: ObsidianNote):
+        calls.append(note.filepath)
+        if len(calls) == 4 and interrupt: raise Interrupted()
+        note.properties['runs'] = str(int(note.properties.get('runs') or 0) + 1)
+
+    interrupt = True
+    with pytest.raises(Interrupted): process_articles(checkpoint=True)(count_runs)()
+    assert len(journals()) == 1
+
+    interrupt, calls = False, []
+    process_articles(resume=True)(count_runs)()
+    assert len(calls) == 7  # the 3 notes finished before the interruption are skipped
+    assert [ObsidianNote(filepath).properties['runs'] for filepath in articles] == ['1'] * 10
+    assert journals() == []
+
+def test_run_without_resume_starts_over(articles):
+    calls = []
+    def interrupt_once(note: ObsidianNote):
+        calls.append(note.filepath)
+        if len(calls) == 4: raise Interrupted()
+
+    with pytest.raises(Interrupted): process_articles(write=False, checkpoint=True)(interrupt_once)()
+    calls.clear()
+    process_articles(write=False, checkpoint=True)(lambda note: calls.append(note.filepath))()
+    assert len(calls) == 10
+
+def test_runs_are_not_journaled_by_default(articles):
+    calls = []
+    def interrupt_once(note: ObsidianNote):
+        calls.append(note.filepath)
+        if len(calls) == 4: raise Interrupted()
+
+    with pytest.raises(Interrupted): process_articles(write=False)(interrupt_once)()
+    assert journals() == []
+    calls.clear()
+    process_articles(write=False, resume=True)(lambda note: calls.append(note.filepath))()
+    assert len(calls) == 10
+
+@pytest.fixture
+def swap_vault(make_note):
+    # A and B swap names, C moves to a new name, and D links to all three
+    contents = {name: article(name, f"Body of {name}\n") for name in ('A', 'B', 'C')}
+    for name, text in contents.items(): make_note(name, text)
+    make_note('D', article('D', '[[A]] [[B|alias]] [[C#heading]]\n'))
+    return contents
+
+def swap_names(note: ObsidianNote):
+    return {'A': 'B', 'B': 'A', 'C': 'E'}.get(note.filename[:-3])
+
+def assert_swapped(vault, contents):
+    notes = os.path.join(vault, 'notes')
+    assert read(os.path.join(notes, 'B.md')) == contents['A']
+    assert read(os.path.join(notes, 'A.md')) == contents['B']
+    assert read(os.path.join(notes, 'E.md')) == contents['C']
+    assert not os.path.exists(os.path.join(notes, 'C.md'))
+    assert [name for name in os.listdir(notes) if name.startswith('.')] == []  # no temporary files left
+    assert ObsidianNote(os.path.join(notes, 'D.md')).body_text[0] == '[[B]] [[A|alias]] [[E#heading]]'
+    assert journals() == []
+
+def test_rename_interrupted_mid_swap_resumes(vault, swap_vault, monkeypatch):
+    move = rename_planner._move
+    moves = []
+    def interrupted_move(source, target):
+        if len(moves) == 2: raise Interrupted()  # after moving one of the swapped notes to its temporary name, and one more
+        move(source, target)
+        moves.append((source, target))
+
+    monkeypatch.setattr(rename_planner, '_move', interrupted_move)
+    with pytest.raises(Interrupted): rename_articles()(swap_names)()
+    monkeypatch.setattr(rename_planner, '_move', move)
+
+    # The journal replays the two moves recorded as made, and makes the rest
+    journal = RunJournal('rename', _rename_key(), resume=True)
+    assert journal.moves is not None and journal.moves_done == 2
+    journal.close()
+    rename_articles(resume=True)(swap_names)()
+    assert_swapped(vault, swap_vault)
+
+def test_rename_resumes_after_move_made_but_not_recorded(vault, swap_vault, monkeypatch):
+    record_moved = RunJournal.record_moved
+    def interrupted_record(journal):
+        if journal.moves_done == 1: raise Interrupted()  # the second move has been made, but is not recorded
+        record_moved(journal)
+
+    monkeypatch.setattr(RunJournal, 'record_moved', interrupted_record)
+    with pytest.raises(Interrupted): rename_articles()(swap_names)()
+    monkeypatch.setattr(RunJournal, 'record_moved', record_moved)
+
+    rename_articles(resume=True)(swap_names)()
+    assert_swapped(vault, swap_vault)
+
+def test_rename_interrupted_while_rewriting_links_resumes(vault, swap_vault, make_note, monkeypatch):
+    # A second linking note, so that the interruption comes after one note has been rewritten
+    make_note('F', article('F', '[[A]] and [[B]]\n'))
+    write_file = ObsidianNote.write_file
+    writes = []
+    def interrupted_write(note, *args, **kwargs):
+        if writes: raise Interrupted()
+        writes.append(note.filepath)
+        return write_file(note, *args, **kwargs)
+
+    monkeypatch.setattr(ObsidianNote, 'write_file', interrupted_write)
+    with pytest.raises(Interrupted): rename_articles()(swap_names)()
+    monkeypatch.setattr(ObsidianNote, 'write_file', write_file)
+
+    # The note rewritten before the interruption is not rewritten again (which would swap its links back)
+    rename_articles(resume=True)(swap_names)()
+    assert_swapped(vault, swap_vault)
+    assert ObsidianNote(os.path.join(vault, 'notes', 'F.md')).body_text[0] == '[[B]] and [[A]]'
+
+def test_journal_ignores_line_cut_short(vault):
+    with RunJournal('process', ('test',)) as journal:
+        journal.record_done(os.path.join(vault, 'notes', 'A.md'))
+        journal.record_done(os.path.join(vault, 'notes', 'B.md'))
+        journal.close()
+        with open(journal.path, 'a', encoding='utf-8') as file: file.write('["done", "notes/C')
+
+        resumed = RunJournal('process', ('test',), resume=True)
+        assert resumed.resumed and resumed.done == {'notes/A.md', 'notes/B.md'}
+        resumed.finish()
+
+def _rename_key() -> tuple:
+    # The key rename_articles() gives the journal of swap_names, with the default options
+    from helpers.decorators import _run_key
+    return _run_key(swap_names, -1, False, False, False)
@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import article
+from helpers import ObsidianNote
+from helpers.obsidian_note import split_tags, note_tags, properties_are_article
+from helpers.tag_index import get_tag_index
+
+def tagged(title: str, tags: list[str] | str) -> str:
+    tag_lines = f"tags: {tags}" if isinstance(tags, str) else 'tags:\n' + '\n'.join(f"  - {tag}" for tag in tags)
+    return f"---\ntitle: {title}\n{tag_lines}\n---\nBody\n"
+
+@pytest.fixture
+def notes(make_note):
+    return {
+        'A': make_note('A', tagged('A', ['document/article', 'topic/bio'])),
+        'B': make_note('B', tagged('B', ['#Document/Book', 'topic/bio/cells'])),
+        'C': make_note('C', tagged('C', 'topic/chemistry paper')),
+        'D': make_note('D', 'No properties\n'),
+    }
+
+def test_queries(notes):
+    tag_index = get_tag_index()
+    assert tag_index.notes_with_tag('document') == {notes['A'], notes['B']}
+    assert tag_index.notes_with_tag('Document', descendants=False) == set()
+    assert tag_index.notes_with_tag('#topic/BIO/') == {notes['A'], notes['B']}
+    assert tag_index.tags_of(notes['C']) == ('topic/chemistry', 'paper')  # a string of tags is split
+    assert tag_index.tags_under('topic') == ['topic/bio', 'topic/bio/cells', 'topic/chemistry']
+    assert tag_index.find_tags('topic/b') == ['topic/bio', 'topic/bio/cells']
+    assert tag_index.find_tags('doc') == ['document/article', 'document/book']
+    assert tag_index.tag_counts('topic') == {'topic': 0, 'topic/bio': 1, 'topic/bio/cells': 1, 'topic/chemistry': 1}
+    assert tag_index.tag_counts('topic', descendants=True)['topic/bio'] == 2
+
+def test_refresh_follows_changes(notes, make_note):
+    tag_index = get_tag_index()
+    make_note('A', tagged('A', ['document/article']))
+    get_tag_index(refresh=True)
+    assert tag_index.tags_under('topic/bio') == ['topic/bio/cells']
+    assert tag_index.tags_of(notes['A']) == ('document/article',)
+
+def test_rename_tag_rewrites_only_tagged_notes(notes):
+    tag_index = get_tag_index()
+    assert tag_index.rename_tag('topic/bio', 'topic/biology', write=False) == 2
+    assert ObsidianNote(notes['A']).properties['tags'] == ['document/article', 'topic/bio']
+
+    assert tag_index.rename_tag('topic/bio', 'topic/biology') == 2
+    assert ObsidianNote(notes['A']).properties['tags'] == ['document/article', 'topic/biology']
+    assert ObsidianNote(notes['B']).properties['tags'] == ['#Document/Book', 'topic/biology/cells']
+    assert tag_index.notes_with_tag('topic/bio') == set() and tag_index.notes_with_tag('topic/biology') == {notes['A'], notes['B']}
+
+def test_merge_tags_drops_duplicates(notes, make_note):
+    e = make_note('E', tagged('E', ['paper', 'document/article']))
+    assert get_tag_index().merge_tags(['paper', 'document/book'], 'document/article') == 3
+    assert ObsidianNote(e).properties['tags'] == ['document/article']
+    assert ObsidianNote(notes['B']).properties['tags'] == ['document/article', 'topic/bio/cells']
+
+def test_note_which_cannot_be_written_is_not_counted(notes, monkeypatch, capsys):
+    tag_index = get_tag_index()
+    write_file = ObsidianNote.write_file
+    monkeypatch.setattr(ObsidianNote, 'write_file', lambda note, *args, **kwargs: False if note.filepath == notes['A'] else write_file(note, *args, **kwargs))
+    assert tag_index.rename_tag('topic/bio', 'topic/biology') == 1
+    assert "in 1 notes (and could not write 1 notes)" in capsys.readouterr().out
+
+    # The index still has the tag the note has in its file
+    assert tag_index.tags_of(notes['A']) == ('document/article', 'topic/bio')
+    assert ObsidianNote(notes['A']).properties['tags'] == ['document/article', 'topic/bio']
+
+@pytest.mark.parametrize('tags, expected', [
+    ('document/article', ['document/article']),
+    ('[document/article, topic/bio]', ['document/article', 'topic/bio']),
+    ('#document/article,  #topic/bio', ['#document/article', '#topic/bio']),
+    (['document/article', 'topic/bio'], ['document/article', 'topic/bio']),
+    ('', []),
+    (None, []),
+])
+def test_string_of_tags_is_split(tags, expected):
+    assert split_tags(tags) == expected
+
+def test_article_tagged_with_string_of_tags(vault, make_note):
+    make_note('A', tagged('A', '[Document/Article, topic/bio, document/article]'))
+    properties = ObsidianNote(str(vault / 'notes' / 'A.md')).properties
+    assert note_tags(properties) == ('document/article', 'topic/bio')
+    assert properties_are_article(properties)
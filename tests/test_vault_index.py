@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from conftest import article
+import constants as c
+from helpers import ObsidianNote, VaultIndex
+from helpers.yield_functions import yield_note_records
+
+@pytest.fixture
+def reads(monkeypatch):
+    """ Records the filepath of every note whose file is read. """
+    read_file = ObsidianNote._read_file
+    reads = []
+    def recording_read_file(filepath, *args, **kwargs):
+        reads.append(os.path.basename(filepath))
+        return read_file(filepath, *args, **kwargs)
+    monkeypatch.setattr(ObsidianNote, '_read_file', staticmethod(recording_read_file))
+    return reads
+
+def rewrite(filepath: str, text: str, mtime_ns: int | None = None) -> None:
+    # Rewrites a note, keeping its modification time if one is given
+    with open(filepath, 'w', encoding='utf-8', newline='') as file: file.write(text)
+    if mtime_ns is not None: os.utime(filepath, ns=(mtime_ns, mtime_ns))
+
+def test_saved_index_is_used_by_next_run(vault, make_note, reads):
+    filepath = make_note('A', article('A', journal='J'))
+    vault_index = VaultIndex(c.vault_path)
+    assert vault_index.get(filepath).properties['journal'] == 'J'
+    vault_index.save()
+
+    reads.clear()
+    record = VaultIndex(c.vault_path).get(filepath)
+    assert reads == [] and record.properties['journal'] == 'J'
+    assert record.to_note(filepath).properties['title'] == 'A'
+
+def test_note_with_new_mtime_is_reread(vault, make_note, reads):
+    filepath = make_note('A', article('A', journal='J'))
+    vault_index = VaultIndex(c.vault_path)
+    vault_index.get(filepath)
+
+    # Same size, new modification time
+    rewrite(filepath, article('A', journal='K'), os.stat(filepath).st_mtime_ns + 1_000_000_000)
+    assert vault_index.get(filepath).properties['journal'] == 'K'
+    assert reads == ['A.md', 'A.md']
+
+def test_note_with_new_size_is_reread(vault, make_note, reads):
+    filepath = make_note('A', article('A', journal='J'))
+    vault_index = VaultIndex(c.vault_path)
+    vault_index.get(filepath)
+
+    # Same modification time, new size
+    rewrite(filepath, article('A', journal='Longer'), os.stat(filepath).st_mtime_ns)
+    assert vault_index.get(filepath).properties['journal'] == 'Longer'
+    assert reads == ['A.md', 'A.md']
+
+def test_moved_note_is_not_reread(vault, make_note, reads):
+    filepath = make_note('A', article('A'))
+    vault_index = VaultIndex(c.vault_path)
+    vault_index.get(filepath)
+
+    new_filepath = os.path.join(vault, 'notes', 'B.md')
+    os.rename(filepath, new_filepath)
+    vault_index.move(filepath, new_filepath)
+    assert vault_index.get(new_filepath).properties['title'] == 'A'
+    assert filepath not in vault_index.records and reads == ['A.md']
+
+def test_full_walk_evicts_deleted_notes(vault, make_note):
+    first, second = make_note('A', article('A')), make_note('B', article('B'))
+    list(yield_note_records())
+    os.remove(second)
+
+    list(yield_note_records(limit=1))  # a partial walk does not know which notes are gone
+    assert set(VaultIndex(c.vault_path).records) == {first, second}
+    list(yield_note_records())
+    assert set(VaultIndex(c.vault_path).records) == {first}
+
+def test_corrupted_index_is_rebuilt(vault, make_note):
+    filepath = make_note('A', article('A'))
+    vault_index = VaultIndex(c.vault_path)
+    os.makedirs(c.cache_folder)
+    with open(vault_index.index_path, 'wb') as file: file.write(b'not a pickle')
+
+    vault_index = VaultIndex(c.vault_path)
+    assert vault_index.records == {} and vault_index.get(filepath).properties['title'] == 'A'
+
+def test_outlinks_are_kept_until_note_changes(vault, make_note, reads):
+    filepath = make_note('A', article('A', '[[B]] and [[C|alias]]\n'))
+    vault_index = VaultIndex(c.vault_path)
+    assert vault_index.outlinks(filepath) == ['B', 'C']
+    assert vault_index.outlinks(filepath) == ['B', 'C'] and reads == ['A.md']
+
+    rewrite(filepath, article('A', '[[D]]\n'))
+    assert vault_index.outlinks(filepath) == ['D']
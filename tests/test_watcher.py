@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+
+import pytest
+
+from conftest import article
+import constants as c
+from helpers import ObsidianNote
+from helpers.watcher import VaultWatcher, _PollingSource, _InotifySource
+
+def add_journal(note: ObsidianNote):
+    note.properties['journal'] = 'J'
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: return False
+        time.sleep(0.02)
+    return True
+
+def test_changed_notes_are_processed(vault, make_note, capsys):
+    a = make_note('A', article('A'))
+    other = os.path.join(vault, 'notes', 'image.png')
+    watcher = VaultWatcher([add_journal])
+    assert watcher.process_changes([a, other, str(vault / '.obsidian' / 'B.md')]) == [a]
+    assert ObsidianNote(a).properties['journal'] == 'J' and watcher.batches_run == 1
+
+def test_own_writes_are_ignored_until_note_changes_again(vault, make_note, capsys):
+    a = make_note('A', article('A'))
+    watcher = VaultWatcher([add_journal])
+    watcher.process_changes([a])
+    assert watcher._is_own_write(a)
+
+    make_note('A', article('A', 'Edited in Obsidian\n', journal='J'))
+    assert not watcher._is_own_write(a)
+
+def test_changed_bib_file_reloads_bibtex_data(vault, make_note, capsys):
+    c.bibdata_entries = {'stale': None}
+    VaultWatcher([add_journal]).process_changes([c.bibtext_location])
+    assert 'bibdata_entries' not in vars(c)
+
+def test_polling_finds_changed_notes(vault, make_note):
+    a = make_note('A', article('A'))
+    source = _PollingSource(c.bibtext_location, interval=0)
+    assert source.changes(0) == []
+
+    b = make_note('B', article('B'))
+    make_note('A', article('A', 'Longer body\n'))
+    (vault / 'library.bib').write_text('@misc{key,\n}\n', encoding='utf-8')
+    assert sorted(source.changes(0)) == sorted([a, b, c.bibtext_location])
+    assert source.changes(0) == []
+
+@pytest.fixture
+def inotify_source(vault):
+    try:
+        source = _InotifySource(c.bibtext_location)
+    except OSError as error:
+        pytest.skip(f"inotify is not available ({error})")
+    yield source
+    source.close()
+
+def test_inotify_finds_written_notes_and_new_folders(vault, inotify_source):
+    folder = vault / 'new folder'
+    folder.mkdir()
+    (folder / 'C.md').write_text(article('C'), encoding='utf-8')
+    filepath = (vault / 'notes' / 'A.md')
+    filepath.write_text(article('A'), encoding='utf-8')
+
+    changed = set()
+    assert wait_for(lambda: changed.update(inotify_source.changes(0.1)) or {str(filepath), str(folder / 'C.md')} <= changed)
+
+def test_inotify_skips_excluded_folders(vault, inotify_source):
+    (vault / '.obsidian').mkdir()
+    (vault / '.obsidian' / 'workspace.md').write_text('text', encoding='utf-8')
+    assert inotify_source.changes(0.2) == []
+
+@pytest.mark.parametrize('backend', ['poll', 'auto'])
+def test_watcher_runs_until_stopped(vault, make_note, capsys, backend):
+    watcher = VaultWatcher([add_journal], debounce=0.05, poll_interval=0.05, backend=backend)
+    thread = threading.Thread(target=watcher.run, kwargs={'timeout': 10})
+    thread.start()
+    try:
+        time.sleep(0.2)
+        a = make_note('A', article('A'))
+        assert wait_for(lambda: 'journal' in ObsidianNote(a).properties)
+        time.sleep(0.2)  # the watcher's own write does not start another batch
+    finally:
+        watcher.stop()
+        thread.join()
+    assert watcher.batches_run == 1 and watcher.pipeline.notes_written == 1
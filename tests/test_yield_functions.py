@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import constants as c
+from helpers.yield_functions import walk_vault, yield_files, yield_note_paths, is_note_path, is_excluded_path
+
+@pytest.fixture
+def tree(vault):
+    """ A vault with notes at several depths, in folders which are excluded in different ways. """
+    for relative_path in ('top.md', 'notes/a.md', 'notes/b.txt', 'notes/deep/c.md', 'Attachments/d.md', 'Archive/old/e.md',
+                          'drawing.excalidraw.md', '.obsidian/plugins/f.md', '.trash/g.md'):
+        path = vault / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('text', encoding='utf-8')
+    return vault
+
+def relative(vault, paths) -> list[str]:
+    return [os.path.relpath(path, vault).replace(os.sep, '/') for path in paths]
+
+def test_walk_matches_os_walk(tree):
+    walked = relative(tree, yield_files(str(tree), 'md'))
+    expected = [os.path.join(folder, name) for folder, _, names in os.walk(tree) for name in names if name.endswith('.md')]
+    assert sorted(walked) == sorted(relative(tree, expected))
+    assert len(walked) == len(set(walked))
+
+def test_walk_prunes_excluded_folders_and_patterns(tree):
+    entries = walk_vault(str(tree), 'md', excluded_folders=['\\Archive\\old\\'], exclude_patterns=['*.excalidraw.md', 'Attachments/*', '.obsidian'])
+    assert sorted(relative(tree, (entry.path for entry in entries))) == ['.trash/g.md', 'notes/a.md', 'notes/deep/c.md', 'top.md']
+
+def test_walk_can_exclude_subfolders(tree):
+    assert sorted(relative(tree, yield_files(str(tree), 'md', exclude_subfolders=True))) == ['drawing.excalidraw.md', 'top.md']
+
+def test_walk_skips_folder_it_cannot_read(tree, monkeypatch):
+    scandir = os.scandir
+    def failing_scandir(path):
+        if os.path.basename(path) == 'deep': raise PermissionError(path)
+        return scandir(path)
+    monkeypatch.setattr(os, 'scandir', failing_scandir)
+    assert 'notes/deep/c.md' not in relative(tree, yield_files(str(tree), 'md'))
+
+def test_note_paths_skip_obsidian_folders_and_constants_exclusions(tree, monkeypatch):
+    monkeypatch.setattr(c, 'excluded_folders', ['Archive'])
+    monkeypatch.setattr(c, 'excluded_patterns', ['*.excalidraw.md'])
+    assert sorted(relative(tree, yield_note_paths())) == ['Attachments/d.md', 'notes/a.md', 'notes/deep/c.md', 'top.md']
+    assert len(list(yield_note_paths(limit=2))) == 2
+
+def test_single_paths_follow_walk_rules(tree, monkeypatch):
+    monkeypatch.setattr(c, 'excluded_folders', ['Archive'])
+    assert is_note_path(str(tree / 'notes' / 'deep' / 'c.md'))
+    assert not is_note_path(str(tree / 'notes' / 'b.txt'))
+    assert not is_note_path(str(tree / 'Archive' / 'old' / 'e.md'))
+    assert not is_note_path(str(tree / '.obsidian' / 'plugins' / 'f.md'))
+    assert is_excluded_path(str(tree / 'Archive'), is_folder=True) and not is_excluded_path(str(tree / 'notes'), is_folder=True)
+    assert is_excluded_path(str(tree.parent / 'outside.md'))